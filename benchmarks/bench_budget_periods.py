@@ -0,0 +1,69 @@
+"""
+Замер подсчета трат за периоды бюджета (день, неделя, месяц, год):
+просмотр всех расходов для каждого периода против BudgetTotals, через
+который бюджет отображается в приложении. BudgetTotals строится
+агрегирующими запросами к репозиторию, после чего сумма за любой период
+берется из словаря.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_budget_periods --rows 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter.budget_totals import BudgetTotals
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+from bookkeeper.utils import GROUP_PERIODS, period_start, to_date
+
+
+def scan_periods(expenses: list[Expense], today: date) -> list[int]:
+    """ Просмотреть все расходы для каждого периода, содержащего today """
+    res = []
+    for period in GROUP_PERIODS:
+        start = period_start(today, period)
+        res.append(sum(expense.amount for expense in expenses
+                       if period_start(to_date(expense.expense_date), period) == start))
+    return res
+
+
+def main() -> None:
+    """ Заполнить временную БД и сравнить оба способа подсчета """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with SqliteRepository(os.path.join(tmp, 'bench'), Expense) as repo:
+            start = datetime(2020, 1, 1)
+            repo.add_many(Expense(i % 5000, i % 50 + 1, start + timedelta(minutes=i))
+                          for i in range(args.rows))
+            today = (start + timedelta(minutes=args.rows // 2)).date()
+
+            began = time.perf_counter()
+            scanned = scan_periods(repo.get_all(), today)
+            scan_time = time.perf_counter() - began
+
+            began = time.perf_counter()
+            totals = BudgetTotals.from_repository(repo)
+            batched = [totals.get(period, today) for period in GROUP_PERIODS]
+            batched_time = time.perf_counter() - began
+
+            began = time.perf_counter()
+            totals.add(Expense(1, 1, today))
+            update_time = time.perf_counter() - began
+
+    assert scanned == batched
+    assert all(isinstance(total, int) for total in batched)
+    print(f'{args.rows} expenses x {len(GROUP_PERIODS)} periods')
+    print(f'         scan: {scan_time:.2f} s')
+    print(f' BudgetTotals: {batched_time:.2f} s')
+    print(f'   add update: {update_time * 1e6:.0f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Замер скорости одиночных добавлений расходов в SqliteRepository:
+фиксация каждой записи против режима группировки записей.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_group_commit --rows 20000 --synchronous FULL
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection import ConnectionManager
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+
+
+def run(path: str, rows: int, synchronous: str, **grouping: int) -> float:
+    """ Добавить rows расходов по одному и вернуть число записей в секунду """
+    with ConnectionManager(path, synchronous=synchronous, **grouping) as manager:
+        repo = SqliteRepository(path, Expense, manager)
+        began = time.perf_counter()
+        for i in range(rows):
+            repo.add(Expense(i % 5000, i % 50 + 1, datetime(2023, 1, 1), comment='c'))
+        repo.flush()
+        return rows / (time.perf_counter() - began)
+
+
+def main() -> None:
+    """ Сравнить режимы фиксации на временных БД """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--synchronous', default='NORMAL')
+    args = parser.parse_args()
+
+    modes: list[tuple[str, dict[str, int]]] = [
+        ('commit per row', {}),
+        ('group 100 rows', {'commit_every_rows': 100}),
+        ('group 1000 rows', {'commit_every_rows': 1000}),
+        ('group 50 ms', {'commit_every_ms': 50}),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, grouping) in enumerate(modes):
+            speed = run(os.path.join(tmp, f'bench{i}'), args.rows, args.synchronous,
+                        **grouping)
+            print(f'{name:>16}: {speed:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
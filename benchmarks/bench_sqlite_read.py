@@ -0,0 +1,42 @@
+"""
+Замер скорости чтения расходов из SqliteRepository (строк в секунду).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sqlite_read --rows 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+
+
+def main() -> None:
+    """ Заполнить временную БД и замерить get_all и iter_all """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with SqliteRepository(os.path.join(tmp, 'bench'), Expense) as repo:
+            start = datetime(2020, 1, 1)
+            repo.add_many(Expense(i % 5000, i % 50 + 1, start + timedelta(minutes=i),
+                                  start, 'comment')
+                          for i in range(args.rows))
+
+            for name, read in [('get_all', repo.get_all),
+                               ('iter_all', lambda: list(repo.iter_all()))]:
+                began = time.perf_counter()
+                objs = read()
+                elapsed = time.perf_counter() - began
+                assert len(objs) == args.rows
+                print(f'{name:>8}: {args.rows} rows in {elapsed:.2f} s, '
+                      f'{args.rows / elapsed:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Замер скорости импорта и экспорта расходов в файлы CSV и JSON Lines.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_transfer --rows 200000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bookkeeper import transfer
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection import ConnectionManager
+from bookkeeper.repository.migrations import migrate
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+
+
+def make_file(path: str, fmt: str, rows: int) -> None:
+    """ Записать файл со случайными расходами по 50 категориям """
+    rnd = random.Random(1)
+    start = datetime(2023, 1, 1)
+    data = ((rnd.randint(1, 10_000), f'category {rnd.randrange(50)}',
+             (start + timedelta(minutes=rnd.randrange(525_600))).isoformat(' '),
+             start.isoformat(' '), 'comment')
+            for _ in range(rows))
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        transfer.write_rows(data, file, fmt, transfer.FIELDS['expense'])
+
+
+def run(tmp: str, fmt: str, rows: int) -> tuple[float, float]:
+    """ Импортировать и экспортировать rows расходов, вернуть записей в секунду """
+    source = os.path.join(tmp, f'source.{fmt}')
+    make_file(source, fmt, rows)
+    database = os.path.join(tmp, f'bench_{fmt}')
+    with ConnectionManager(database) as manager:
+        migrate(manager)
+        cat_repo = SqliteRepository(database, Category, manager, ensure_schema=False)
+        exp_repo = SqliteRepository(database, Expense, manager, ensure_schema=False)
+        began = time.perf_counter()
+        with open(source, encoding='utf-8', newline='') as file:
+            transfer.import_expenses(exp_repo, cat_repo, file, fmt)
+        imported = rows / (time.perf_counter() - began)
+        began = time.perf_counter()
+        with open(os.path.join(tmp, f'export.{fmt}'), 'w',
+                  encoding='utf-8', newline='') as file:
+            transfer.export_expenses(exp_repo, cat_repo, file, fmt)
+        exported = rows / (time.perf_counter() - began)
+    return imported, exported
+
+
+def main() -> None:
+    """ Сравнить форматы на временных файлах и БД """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in transfer.FORMATS:
+            imported, exported = run(tmp, fmt, args.rows)
+            print(f'{fmt:>6}: import {imported:,.0f} rows/s, '
+                  f'export {exported:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Команды импорта и экспорта данных
+
+    python -m bookkeeper export expenses.csv
+    python -m bookkeeper import categories.jsonl --entity category
+"""
+
+import argparse
+import sys
+import time
+from functools import partial
+from typing import Any, Callable, TextIO
+
+from bookkeeper import transfer
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.connection import ConnectionManager
+from bookkeeper.repository.migrations import migrate
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """ Создать разборщик аргументов командной строки """
+    parser = argparse.ArgumentParser(prog='bookkeeper', description=__doc__)
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('file', help='файл CSV или JSON Lines')
+    parser.add_argument('--entity', choices=list(transfer.FIELDS), default='expense',
+                        help='тип записей (по умолчанию expense)')
+    parser.add_argument('--format', choices=transfer.FORMATS,
+                        help='формат файла (по умолчанию - по расширению)')
+    parser.add_argument('--database', default='bookkeeper',
+                        help='файл БД (по умолчанию тот же, что у приложения)')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='число записей в одной порции')
+    return parser
+
+
+def report_progress(entity: str) -> Callable[[int], None]:
+    """ Функция вывода числа обработанных записей в stderr """
+    def progress(count: int) -> None:
+        print(f'\r{entity}: {count}', end='', file=sys.stderr, flush=True)
+    return progress
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Выполнить команду импорта или экспорта """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error('--batch-size must be positive')
+    try:
+        fmt = args.format or transfer.guess_format(args.file)
+    except ValueError as error:
+        parser.error(str(error))
+
+    with ConnectionManager(args.database) as manager:
+        migrate(manager)
+        repos: dict[str, Any] = {
+            name: SqliteRepository(args.database, cls, manager, ensure_schema=False)
+            for name, cls in (('category', Category), ('expense', Expense),
+                              ('budget', Budget))
+        }
+        actions = transfer.IMPORTERS if args.command == 'import' else transfer.EXPORTERS
+        action = partial(actions[args.entity], repos[args.entity])
+        if args.entity == 'expense':
+            action = partial(action, repos['category'])
+        mode = 'r' if args.command == 'import' else 'w'
+        start = time.perf_counter()
+        file: TextIO
+        with open(args.file, mode, encoding='utf-8', newline='') as file:
+            count = action(file, fmt, args.batch_size,
+                           report_progress(args.entity))
+        seconds = time.perf_counter() - start
+    print(f'\r{args.entity}: {count} записей за {seconds:.2f} с '
+          f'({count / seconds if seconds else 0:.0f} в секунду)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,8 @@ from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.budget import Budget
 from bookkeeper.repository.sqlite_repository import SqliteRepository
+from bookkeeper.repository.connection import ConnectionManager
+from bookkeeper.repository.migrations import migrate
 
 
 if __name__ == '__main__':
@@ -18,9 +20,14 @@ if __name__ == '__main__':
     view = MainWindow()
     view.show()
 
-    category_repository = SqliteRepository[Category]("bookkeeper", Category)
-    expense_repository = SqliteRepository[Expense]("bookkeeper", Expense)
-    budget_repository = SqliteRepository[Budget]("bookkeeper", Budget)
+    manager = ConnectionManager("bookkeeper")
+    migrate(manager)
+    category_repository = SqliteRepository[Category](
+        "bookkeeper", Category, manager, ensure_schema=False)
+    expense_repository = SqliteRepository[Expense](
+        "bookkeeper", Expense, manager, ensure_schema=False)
+    budget_repository = SqliteRepository[Budget](
+        "bookkeeper", Budget, manager, ensure_schema=False)
 
     window = Presenter(
         view,
@@ -30,4 +37,7 @@ if __name__ == '__main__':
     )
     window.show()
 
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    window.close()
+    manager.close()
+    sys.exit(exit_code)
@@ -5,6 +5,8 @@
 from dataclasses import dataclass
 
 ALLOWED_PERIODS = ['День', 'Неделя', 'Месяц']
+# соответствие периодов бюджета периодам группировки расходов
+PERIOD_KEYS = {'День': 'day', 'Неделя': 'week', 'Месяц': 'month', 'Год': 'year'}
 
 
 @dataclass(slots=True)
@@ -3,9 +3,12 @@
 """
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import Iterator
+from itertools import islice
+from typing import Callable, Iterable, Iterator
 
 from ..repository.abstract_repository import AbstractRepository
+from ..repository.query import startswith
+from ..utils import index_children
 
 
 @dataclass
@@ -52,10 +55,9 @@ class Category:
         Объекты Category от родителя и выше до категории верхнего уровня
         """
         parent = self.get_parent(repo)
-        if parent is None:
-            return
-        yield parent
-        yield from parent.get_all_parents(repo)
+        while parent is not None:
+            yield parent
+            parent = parent.get_parent(repo)
 
     def get_subcategories(self,
                           repo: AbstractRepository['Category']
@@ -76,20 +78,67 @@ class Category:
         def get_children(graph: dict[int | None, list['Category']],
                          root: int) -> Iterator['Category']:
             """ dfs in graph from root """
-            for x in graph[root]:
+            stack = list(reversed(graph[root]))
+            while stack:
+                x = stack.pop()
                 yield x
-                yield from get_children(graph, x.pk)
+                stack.extend(reversed(graph[x.pk]))
 
         subcats = defaultdict(list)
         for cat in repo.get_all():
             subcats[cat.parent].append(cat)
         return get_children(subcats, self.pk)
 
+    @staticmethod
+    def get_by_name(name: str,
+                    repo: AbstractRepository['Category']) -> 'Category | None':
+        """
+        Найти категорию по названию. Поиск идет по индексу на поле name
+        (в SQLite - уникальный индекс по названию и родителю, см.
+        migrations.unique_category_names, в памяти - репозиторий
+        с indexes=('name',)).
+
+        Parameters
+        ----------
+        name - название категории
+        repo - репозиторий для получения объектов
+
+        Returns
+        -------
+        Объект класса Category или None. Если категорий с таким названием
+        несколько (у разных родителей), возвращается первая по id.
+        """
+        found = repo.get_all({'name': name}, order_by='pk', limit=1)
+        return found[0] if found else None
+
+    @staticmethod
+    def find_by_prefix(prefix: str,
+                       repo: AbstractRepository['Category'],
+                       limit: int | None = None) -> list['Category']:
+        """
+        Найти категории, названия которых начинаются с prefix,
+        например для автодополнения.
+
+        Parameters
+        ----------
+        prefix - начало названия
+        repo - репозиторий для получения объектов
+        limit - вернуть не более limit категорий
+
+        Returns
+        -------
+        Список объектов Category, упорядоченный по названию
+        """
+        return repo.get_all({'name': startswith(prefix)}, order_by='name', limit=limit)
+
     @classmethod
     def create_from_tree(
             cls,
-            tree: list[tuple[str, str | None]],
-            repo: AbstractRepository['Category']) -> list['Category']:
+            tree: Iterable[tuple[str, str | None]],
+            repo: AbstractRepository['Category'],
+            batch_size: int = 1000,
+            pks: dict[str, int] | None = None,
+            name: Callable[[str], str] | None = None) -> int:
         """
         Создать дерево категорий из списка пар "потомок-родитель".
         Список должен быть топологически отсортирован, т.е. потомки
@@ -101,18 +150,165 @@ class Category:
         данные корректны за исключением сортировки. Если нет, то нет.
         "Мусор на входе, мусор на выходе".
 
+        Пары читаются порциями по batch_size (подходит генератор iter_tree).
+        Порция записывается по уровням: сначала категории, чьи родители
+        уже сохранены, затем их потомки и т.д., каждый уровень - одним
+        вызовом add_many. Между порциями хранится только соответствие
+        ключей и id, сами объекты Category после записи порции не держатся.
+
         Parameters
         ----------
-        tree - список пар "потомок-родитель"
+        tree - итерируемый объект с парами "потомок-родитель"
         repo - репозиторий для сохранения объектов
+        batch_size - количество пар в порции
+        pks - id уже сохраненных родителей по ключу; дополняется id созданных
+        категорий
+        name - функция, получающая название категории по ключу из пары
+        (например, по пути категории); по умолчанию ключ и есть название
 
         Returns
         -------
-        Список созданных объектов Category
-        """
-        created: dict[str, Category] = {}
-        for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
-            created[child] = cat
-        return list(created.values())
+        Число созданных категорий
+        """
+        if pks is None:
+            pks = {}
+        count = 0
+        pairs = iter(tree)
+        while batch := list(islice(pairs, batch_size)):
+            # уровень категории внутри порции: 0, если родитель уже сохранен
+            pending: dict[str, tuple[int, Category]] = {}
+            levels: list[list[tuple[Category, str | None]]] = []
+            for child, parent in batch:
+                level = pending[parent][0] + 1 if parent in pending else 0
+                if level == 0 and parent is not None and parent not in pks:
+                    raise KeyError(parent)
+                cat = cls(child if name is None else name(child))
+                if level == len(levels):
+                    levels.append([])
+                levels[level].append((cat, parent))
+                pending[child] = (level, cat)
+            for level_cats in levels:
+                for cat, parent in level_cats:
+                    cat.parent = None if parent is None else \
+                        pending[parent][1].pk if parent in pending else pks[parent]
+                repo.add_many(cat for cat, _ in level_cats)
+            pks.update((name, cat.pk) for name, (_, cat) in pending.items())
+            count += len(batch)
+        return count
+
+class CategoryIndex:
+    """
+    Индекс иерархии категорий. Строится по репозиторию одним проходом при
+    первом обращении и хранится до вызова invalidate(), который нужно
+    делать после каждой записи в репозиторий категорий.
+
+    Категории нумеруются в порядке обхода в глубину (эйлеров обход):
+    поддерево категории занимает непрерывный отрезок order[start:end],
+    поэтому проверка "является потомком" выполняется за O(1), а перечисление
+    поддерева - за O(k), где k - его размер. Категории с несуществующим
+    родителем или входящие в цикл считаются категориями верхнего уровня.
+    """
+
+    def __init__(self, repo: AbstractRepository[Category]) -> None:
+        self.repo = repo
+        self._built = False
+        self._categories: dict[int, Category] = {}
+        self._parents: dict[int, int | None] = {}
+        self._children: dict[int | None, list[int]] = {}
+        self._depth: dict[int, int] = {}
+        self._start: dict[int, int] = {}
+        self._end: dict[int, int] = {}
+        self._order: list[int] = []
+
+    def invalidate(self) -> None:
+        """ Сбросить индекс; он будет перестроен при следующем обращении """
+        self._built = False
+
+    def _ensure(self) -> None:
+        if self._built:
+            return
+        self._categories = {cat.pk: cat for cat in self.repo.iter_all()}
+        self._children, _ = index_children(
+            ((cat.pk, cat.parent) for cat in self._categories.values()), None)
+        self._parents = {}
+        self._depth = {}
+        self._start = {}
+        self._end = {}
+        self._order = []
+        # итеративный обход в глубину: (pk, глубина, вход/выход)
+        stack: list[tuple[int, int, bool]] = [
+            (pk, 0, True) for pk in reversed(self._children[None])]
+        for pk in self._children[None]:
+            self._parents[pk] = None
+        while stack:
+            pk, depth, enter = stack.pop()
+            if not enter:
+                self._end[pk] = len(self._order)
+                continue
+            self._start[pk] = len(self._order)
+            self._depth[pk] = depth
+            self._order.append(pk)
+            stack.append((pk, depth, False))
+            for child in reversed(self._children[pk]):
+                self._parents[child] = pk
+                stack.append((child, depth + 1, True))
+        self._built = True
+
+    def __len__(self) -> int:
+        self._ensure()
+        return len(self._order)
+
+    def __contains__(self, pk: object) -> bool:
+        self._ensure()
+        return pk in self._categories
+
+    def get(self, pk: int) -> Category:
+        """ Получить категорию по id """
+        self._ensure()
+        return self._categories[pk]
+
+    def parent(self, pk: int) -> int | None:
+        """ Получить id родителя (None для категорий верхнего уровня) """
+        self._ensure()
+        return self._parents[pk]
+
+    def children(self, pk: int | None) -> list[int]:
+        """ Получить id непосредственных подкатегорий (None - верхний уровень) """
+        self._ensure()
+        return list(self._children[pk])
+
+    def depth(self, pk: int) -> int:
+        """ Получить глубину категории; у категорий верхнего уровня 0 """
+        self._ensure()
+        return self._depth[pk]
+
+    def ancestors(self, pk: int) -> Iterator[int]:
+        """ Перечислить id предков от родителя до категории верхнего уровня """
+        self._ensure()
+        parent = self._parents[pk]
+        while parent is not None:
+            yield parent
+            parent = self._parents[parent]
+
+    def is_descendant(self, pk: int, ancestor: int) -> bool:
+        """ Является ли категория pk подкатегорией (любого уровня) ancestor """
+        self._ensure()
+        start = self._start[pk]
+        return self._start[ancestor] < start < self._end[ancestor]
+
+    def preorder(self) -> list[int]:
+        """
+        Получить id всех категорий в порядке обхода в глубину: каждая
+        категория идет раньше своих подкатегорий.
+        """
+        self._ensure()
+        return list(self._order)
+
+    def subtree(self, pk: int, include_self: bool = False) -> list[int]:
+        """
+        Получить id всех подкатегорий разного уровня в порядке обхода
+        в глубину; с include_self=True первым идет сама категория.
+        """
+        self._ensure()
+        start = self._start[pk] + (0 if include_self else 1)
+        return self._order[start:self._end[pk]]
@@ -0,0 +1,67 @@
+"""
+Модуль содержит накопительные суммы расходов для бюджета.
+"""
+
+from collections import defaultdict
+from datetime import date
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.utils import GROUP_PERIODS, period_start
+
+
+class BudgetTotals:
+    """
+    Суммы расходов по периодам (день/неделя/месяц/год), ключ - дата начала
+    периода. Строятся из репозитория один раз при запуске, а затем
+    поддерживаются за O(1) на каждое добавление, изменение и удаление расхода,
+    так что обновление бюджета не зависит от размера истории.
+    Суммы целые и для всех периодов бюджета берутся из одних агрегатов,
+    поэтому отдельный подсчет трат за период просмотром расходов
+    (бывший calculate_expenses_in_period) не нужен.
+    """
+
+    def __init__(self) -> None:
+        self._sums: dict[str, defaultdict[date, int]] = {
+            period: defaultdict(int) for period in GROUP_PERIODS
+        }
+
+    @classmethod
+    def from_repository(cls,
+                        repo: AbstractRepository[Expense]) -> 'BudgetTotals':
+        """ Построить суммы по всем расходам репозитория """
+        totals = cls()
+        totals.rebuild(repo)
+        return totals
+
+    def rebuild(self, repo: AbstractRepository[Expense]) -> None:
+        """ Пересчитать суммы заново агрегирующими запросами к репозиторию """
+        for period in GROUP_PERIODS:
+            sums = self._sums[period]
+            sums.clear()
+            sums.update(repo.sum_amount(group_by=period))
+
+    def _apply(self, expense: Expense, sign: int) -> None:
+        amount = sign * expense.amount
+        for period in GROUP_PERIODS:
+            self._sums[period][period_start(expense.expense_date, period)] += amount
+
+    def add(self, expense: Expense) -> None:
+        """ Учесть добавленный расход """
+        self._apply(expense, 1)
+
+    def remove(self, expense: Expense) -> None:
+        """ Учесть удаленный расход """
+        self._apply(expense, -1)
+
+    def replace(self, old: Expense, new: Expense) -> None:
+        """ Учесть изменение расхода old на new """
+        self._apply(old, -1)
+        self._apply(new, 1)
+
+    def get(self, period: str, day: date) -> int:
+        """
+        Получить сумму расходов за период ('day', 'week', 'month' или 'year'),
+        содержащий дату day.
+        """
+        return self._sums[period].get(period_start(day, period), 0)
@@ -0,0 +1,53 @@
+"""
+Модуль содержит постраничную загрузку расходов для таблицы.
+"""
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import gt
+
+
+class ExpensePages:
+    """
+    Загруженные страницы расходов. Страницы выбираются по pk больше
+    последнего загруженного, так что добавленные за время работы расходы
+    не сдвигают границы страниц. Новый расход получает pk больше всех
+    загруженных, поэтому, пока загружены не все страницы, он придет
+    со следующей страницей и сразу в список не добавляется.
+    """
+
+    def __init__(self, repo: AbstractRepository[Expense], page_size: int) -> None:
+        self.repo = repo
+        self.page_size = page_size
+        self.items: list[Expense] = []
+        self.last_pk = 0
+        self.has_more = False
+
+    def load(self, after_pk: int = 0) -> list[Expense]:
+        """ Прочитать страницу расходов с pk больше after_pk """
+        return self.repo.get_all({'pk': gt(after_pk)}, order_by='pk',
+                                 limit=self.page_size)
+
+    def reset(self, page: list[Expense]) -> None:
+        """ Начать заново с первой страницы page """
+        self.items = []
+        self.last_pk = 0
+        self.extend(page)
+
+    def extend(self, page: list[Expense]) -> None:
+        """ Принять следующую страницу; неполная означает, что расходы закончились """
+        if page:
+            self.last_pk = page[-1].pk
+        self.has_more = len(page) >= self.page_size > 0
+        self.items.extend(page)
+
+    def add(self, expense: Expense) -> bool:
+        """
+        Учесть добавленный в репозиторий расход. Вернуть True, если он
+        добавлен в список, и False, если он придет со следующей страницей.
+        """
+        if self.has_more:
+            return False
+        self.items.append(expense)
+        self.last_pk = max(self.last_pk, expense.pk)
+        return True
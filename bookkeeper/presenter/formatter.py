@@ -2,99 +2,92 @@
 Модуль содержит функцию форматирования данных в требуемый формат для view.
 """
 
-from datetime import date, timedelta, datetime
-from bookkeeper.models.category import Category
+from datetime import date
+from typing import Iterable
+from bookkeeper.models.category import Category, CategoryIndex
 from bookkeeper.models.expense import Expense
-from bookkeeper.models.budget import Budget
+from bookkeeper.models.budget import Budget, PERIOD_KEYS
+from bookkeeper.presenter.budget_totals import BudgetTotals
+from bookkeeper.presenter.report import CategoryTotal
+from bookkeeper.utils import to_date
+
+
+def format_expense(expense: Expense, category_id_to_name: dict[int, str]) -> list[str]:
+    """Форматирует один расход"""
+    category = ''
+    if expense.category is not None \
+            and expense.category in category_id_to_name:
+        category = category_id_to_name[expense.category]
+
+    return [
+        to_date(expense.expense_date).isoformat(),
+        str(expense.amount),
+        category,
+        expense.comment,
+    ]
 
 
 def format_expense_data(
-        expenses: list[Expense],
+        expenses: Iterable[Expense],
         category_id_to_name: dict[int, str]
 ) -> list[list[str]]:
     """Форматирует данные о расходах"""
-    res = []
-    for expense in expenses:
-        category = ''
-        if expense.category is not None \
-                and expense.category in category_id_to_name:
-            category = category_id_to_name[expense.category]
+    return [format_expense(expense, category_id_to_name) for expense in expenses]
 
-        res.append([
-            str(expense.expense_date),
-            str(expense.amount),
-            category,
-            expense.comment,
-        ])
 
-    return res
+def format_category(category: Category) -> list[str]:
+    """Форматирует одну категорию"""
+    parent = 0
+    if category.parent is not None:
+        parent = category.parent
+    return [
+        str(category.pk),
+        str(category.name),
+        str(parent),
+    ]
 
 
 def format_category_data(categories: list[Category]) -> list[list[str]]:
     """Форматирует данные о категориях"""
     res = [['0', '', '0']]
-    for category in categories:
-        parent = 0
-        if category.parent is not None:
-            parent = category.parent
-        res.append([
-            str(category.pk),
-            str(category.name),
-            str(parent),
-        ])
-
+    res.extend(format_category(category) for category in categories)
     return res
 
 
-def format_budget_data(budgets: list[Budget], expenses: list[Expense]) -> list[list[str]]:
-    """Форматирует данные о бюджете"""
-    res = []
-    current_date = date.today()
-    start_date = current_date
-    finish_date = current_date
-    for budget in budgets:
-        if budget.period == 'День':
-            start_date = current_date
-            finish_date = start_date + timedelta(days=1)
-        elif budget.period == 'Неделя':
-            start_date = current_date - timedelta(days=current_date.weekday())
-            finish_date = start_date + timedelta(weeks=1)
-        elif budget.period == 'Месяц':
-            start_date = current_date.replace(day=1)
-            finish_date = \
-                start_date.replace(month=current_date.month + 1) - timedelta(days=1)
-        elif budget.period == 'Год':
-            start_date = current_date.replace(day=1, month=1)
-            finish_date = start_date.replace(year=current_date.year + 1)
+def format_budget(budget: Budget, totals: BudgetTotals) -> list[str]:
+    """Форматирует один бюджет; траты за период берутся из BudgetTotals"""
+    general_expense = 0
+    if budget.period in PERIOD_KEYS:
+        general_expense = totals.get(PERIOD_KEYS[budget.period], date.today())
+    return [
+        str(budget.period),
+        str(budget.amount),
+        str(general_expense),
+    ]
 
-        general_expense = calculate_expenses_in_period(
-            expenses,
-            start_date,
-            finish_date
-        )
-        res.append([
-            str(budget.period),
-            str(budget.amount),
-            str(general_expense),
-        ])
-
-    return res
 
-
-def calculate_expenses_in_period(
-        expenses: list[Expense],
-        start_date: date,
-        finish_date: date
-) -> float:
+def format_report_data(
+        index: CategoryIndex,
+        totals: dict[int | None, CategoryTotal]
+) -> list[list[str]]:
     """
-    Функция подсчитывает суммарные траты за заданный промежуток:
-    start_date - включительно, finish_date - исключая.
+    Форматирует отчет по категориям: строки [id, название, id родителя,
+    собственные расходы, расходы с подкатегориями] в порядке обхода
+    в глубину, так что родитель всегда идет раньше подкатегорий.
+    Расходы без категории идут последней строкой с пустым id.
     """
-
-    general_expense = 0.0
-    for expense in expenses:
-        print(expense.expense_date)
-        if (start_date < datetime.strptime(expense.expense_date, "%Y-%m-%d").date()) and (expense.expense_date < finish_date):
-            general_expense += expense.amount
-
-    return round(general_expense, 2)
\ No newline at end of file
+    res = []
+    for pk in index.preorder():
+        parent = index.parent(pk)
+        total = totals.get(pk, CategoryTotal())
+        res.append([
+            str(pk),
+            index.get(pk).name,
+            str(parent if parent is not None else 0),
+            str(total.own),
+            str(total.total),
+        ])
+    if None in totals:
+        total = totals[None]
+        res.append(['', 'Без категории', '0', str(total.own), str(total.total)])
+    return res
@@ -1,21 +1,54 @@
 """
 Модуль содержит в себе основую бизнес логику приложения.
+
+Работа с БД (загрузка данных, отчет, запись изменений) выполняется
+в фоновом потоке через Executor, результаты применяются к данным и view
+в потоке GUI. Записи выполняются по одной в порядке нажатий, поэтому
+данные в presenter меняются в том же порядке, что и в БД.
 """
 
+from datetime import date
+from typing import Any, Callable, TypeVar
+
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.budget import Budget
-from bookkeeper.models.category import Category
+from bookkeeper.models.category import Category, CategoryIndex
 from bookkeeper.presenter import formatter
+from bookkeeper.presenter.budget_totals import BudgetTotals
+from bookkeeper.presenter.expense_pages import ExpensePages
+from bookkeeper.presenter.report import category_report
 from bookkeeper.repository.sqlite_repository import SqliteRepository
 from bookkeeper.view.main import MainWindow
+from bookkeeper.view.widgets import EditWindow
+from bookkeeper.view.worker import Executor
+
+
+EXPENSES_PAGE_SIZE = 500
+
+Item = TypeVar('Item')
+
+
+def find_row(items: list[Item], item: Item) -> int | None:
+    """
+    Номер строки объекта в списке (сравнение по идентичности) или None.
+    Номер ищется при получении результата записи: за время записи
+    строки могли сдвинуться.
+    """
+    for row_id, other in enumerate(items):
+        if other is item:
+            return row_id
+    return None
 
 
 class Presenter:
     """
     Отвественный за бизнес логику и передачу данных во view.
+    Расходы загружаются страницами по EXPENSES_PAGE_SIZE по мере прокрутки
+    таблицы (см. ExpensePages); expenses содержит только загруженные расходы.
+    Таблицы view показывают сами списки expenses и budgets, поэтому объекты
+    в них вставляются и удаляются в блоках inserting_*/removing_* view.
     """
     categories: list[Category]
-    expenses: list[Expense]
     budgets: list[Budget]
     category_id_to_name: dict[int, str] = {}
 
@@ -31,7 +64,19 @@ class Presenter:
         self.expense_repository = expense_repository
         self.budget_repository = budget_repository
 
-        self.get_data()
+        self.categories = []
+        self.category_id_to_name = {}
+        self.budgets = []
+        self.expense_pages = ExpensePages(expense_repository, EXPENSES_PAGE_SIZE)
+        self.budget_totals = BudgetTotals()
+        # индекс дерева категорий для отчета; строится, используется
+        # и сбрасывается только в потоке Executor
+        self.category_index = CategoryIndex(self.category_repository)
+
+        self.executor = Executor()
+        self.executor.busy_changed.connect(  # type: ignore[attr-defined]
+            self.view.set_loading
+        )
 
         # Add handlers
 
@@ -56,77 +101,205 @@ class Presenter:
         self.view.budget_view.edit_windows.delete. \
             on_action_button_clicked(self.handle_delete_budget_clicked)
 
-    def get_categories(self) -> None:
+        self.view.report_view. \
+            on_action_button_clicked(self.handle_show_report_clicked)
+
+    def load_data(self) -> tuple[list[Category], list[Budget], list[Expense],
+                                 BudgetTotals]:
         """
-        Получает данных из бд о категориях.
+        Читает из бд данные для приложения: категории, бюджеты, первую
+        страницу расходов и суммы расходов по периодам. Выполняется
+        в фоновом потоке, поэтому только возвращает данные.
         """
-        self.categories = self.category_repository.get_all()
-        self.category_id_to_name.clear()
-        for i in range(len(self.categories)):
-            print(i)
-            print("get_categories")
-            print(self.categories[i].name)
-            print(self.categories[i].pk)
-            self.category_id_to_name[self.categories[i].pk] = self.categories[i].name
-
-    def get_data(self) -> None:
+        self.category_index.invalidate()
+        categories = self.category_repository.get_all()
+        budgets = self.budget_repository.get_all()
+        expenses = self.expense_pages.load()
+        totals = BudgetTotals.from_repository(self.expense_repository)
+        return categories, budgets, expenses, totals
+
+    def refresh(self) -> None:
         """
-        Получает данные из бд для приложения.
+        Перезагружает данные в фоне. Незавершенная перезагрузка
+        отменяется: применяются данные только последней. Подгружаемая
+        страница расходов тоже отменяется: таблица заполнится заново.
         """
-        self.get_categories()
-        self.budgets = self.budget_repository.get_all()
-        self.expenses = self.expense_repository.get_all()
+        self.executor.cancel('page')
+        self.executor.submit(self.load_data, self.on_data_loaded, key='load')
 
-    def show(self) -> None:
+    def on_data_loaded(self, data: tuple[list[Category], list[Budget], list[Expense],
+                                         BudgetTotals]) -> None:
         """
-        Наполняет данными view и запускает показ.
+        Заменяет данные загруженными и наполняет ими view.
         """
+        self.categories, self.budgets, expenses, self.budget_totals = data
+        self.category_id_to_name = {cat.pk: cat.name for cat in self.categories}
+        self.expense_pages.reset(expenses)
         self.view.category_view.set_up(
             formatter.format_category_data(self.categories)
         )
         self.view.expense_view.set_up(
-            formatter.format_expense_data(self.expenses, self.category_id_to_name),
-            formatter.format_category_data(self.categories)
-        )
-        self.view.budget_view.set_up(
-            formatter.format_budget_data(self.budgets, self.expenses)
+            self.expenses,
+            formatter.format_category_data(self.categories),
+            self.format_expense,
+            self.fetch_expenses,
+            self.expense_pages.has_more,
         )
+        self.view.budget_view.set_up(self.budgets, self.format_budget)
+        self.handle_show_report_clicked()
+
+    @property
+    def expenses(self) -> list[Expense]:
+        """ Загруженные расходы в порядке строк таблицы """
+        return self.expense_pages.items
+
+    def fetch_expenses(self, done: Callable[[bool], None]) -> None:
+        """
+        Загружает следующую страницу расходов в фоне, дописывает ее
+        в список таблицы и передает done, есть ли следующие страницы.
+        Страница читается после уже поставленных в очередь записей, поэтому
+        расход, добавленный до ее загрузки, придет с ней или со следующей.
+        """
+        after_pk = self.expense_pages.last_pk
+
+        def on_done(page: list[Expense]) -> None:
+            with self.view.expense_view.inserting_expenses(len(self.expenses),
+                                                           len(page)):
+                self.expense_pages.extend(page)
+            done(self.expense_pages.has_more)
+
+        def on_error(error: BaseException) -> None:
+            Executor.log_error(error)
+            on_done([])
+
+        self.executor.submit(lambda: self.expense_pages.load(after_pk), on_done,
+                             key='page', on_error=on_error)
+
+    def format_expense(self, expense: Expense) -> list[str]:
+        """
+        Форматирует расход для таблицы.
+        """
+        return formatter.format_expense(expense, self.category_id_to_name)
+
+    def format_budget(self, budget: Budget) -> list[str]:
+        """
+        Форматирует бюджет для таблицы.
+        """
+        return formatter.format_budget(budget, self.budget_totals)
+
+    def show(self) -> None:
+        """
+        Запускает показ и загрузку данных для view.
+        """
         self.view.show()
+        self.refresh()
 
-    def on_categories_updated(self) -> None:
+    def close(self) -> None:
         """
-        Обновляет данные при изменении категорий.
+        Дожидается завершения фоновой работы с бд.
         """
-        self.get_categories()
-        self.view.category_view.set_up(
-            formatter.format_category_data(self.categories)
-        )
-        self.view.expense_view.set_up(
-            formatter.format_expense_data(self.expenses, self.category_id_to_name),
-            formatter.format_category_data(self.categories)
-        )
+        self.executor.shutdown()
 
-    def on_expenses_updated(self) -> None:
+    def submit_write(self, window: EditWindow, job: Callable[[], Any],
+                     on_done: Callable[[Any], None]) -> None:
         """
-        Обновдяет данные при изменении расходов
+        Выполняет запись в бд в фоне. Окно редактирования скрывается, когда
+        запись прошла, и on_done применяет ее результат. При ошибке окно
+        остается открытым с введенными данными, а view показывает сообщение.
+        Пока запись выполняется, кнопка окна заблокирована.
         """
-        self.expenses = self.expense_repository.get_all()
-        self.view.expense_view.set_up(
-            formatter.format_expense_data(self.expenses, self.category_id_to_name),
-            formatter.format_category_data(self.categories)
-        )
-        self.view.budget_view.set_up(
-            formatter.format_budget_data(self.budgets, self.expenses)
-        )
+        def done(result: Any) -> None:
+            window.set_busy(False)
+            window.hide()
+            on_done(result)
+
+        def failed(error: BaseException) -> None:
+            window.set_busy(False)
+            Executor.log_error(error)
+            self.view.show_error(f'Не удалось сохранить изменения: {error}')
+
+        window.set_busy(True)
+        self.executor.submit(job, done, on_error=failed)
 
-    def on_budgets_updated(self) -> None:
+    def on_category_added(self, category: Category) -> None:
         """
-        Обновляет данные при изменении расходов
+        Добавляет новую категорию в данные и во view.
         """
-        self.budgets = self.budget_repository.get_all()
-        self.view.budget_view.set_up(
-            formatter.format_budget_data(self.budgets, self.expenses)
-        )
+        self.categories.append(category)
+        self.category_id_to_name[category.pk] = category.name
+        row = formatter.format_category(category)
+        self.view.category_view.add_category(row)
+        self.view.expense_view.add_category(row)
+
+    def on_category_updated(self, category: Category) -> None:
+        """
+        Заменяет категорию в данных и во view, перерисовывает расходы.
+        """
+        for idx, old in enumerate(self.categories):
+            if old.pk == category.pk:
+                self.categories[idx] = category
+                break
+        self.category_id_to_name[category.pk] = category.name
+        row = formatter.format_category(category)
+        self.view.category_view.update_category(row)
+        self.view.expense_view.update_category(row)
+        self.view.expense_view.refresh()
+
+    def on_category_deleted(self, pk: int) -> None:
+        """
+        Удаляет категорию из данных и из view, перерисовывает расходы.
+        """
+        self.categories = [c for c in self.categories if c.pk != pk]
+        for category in self.categories:
+            if category.parent == pk:
+                category.parent = None
+        for expense in self.expenses:
+            if expense.category == pk:
+                expense.category = None
+        self.category_id_to_name.pop(pk, None)
+        self.view.category_view.remove_category(str(pk))
+        self.view.expense_view.remove_category(str(pk))
+        self.view.expense_view.refresh()
+
+    def on_expense_added(self, expense: Expense) -> None:
+        """
+        Добавляет расход в данные, строку в таблицу расходов
+        и обновляет бюджет. Если загружены не все страницы, строка
+        появится при подгрузке следующей.
+        """
+        self.budget_totals.add(expense)
+        if not self.expense_pages.has_more:
+            with self.view.expense_view.inserting_expenses(len(self.expenses)):
+                self.expense_pages.add(expense)
+        self.view.budget_view.refresh()
+
+    def on_expense_updated(self, row_id: int, expense: Expense) -> None:
+        """
+        Заменяет расход в данных и строку в таблице расходов,
+        обновляет бюджет.
+        """
+        self.budget_totals.replace(self.expenses[row_id], expense)
+        self.expenses[row_id] = expense
+        self.view.expense_view.update_expense(row_id)
+        self.view.budget_view.refresh()
+
+    def on_expense_deleted(self, row_id: int) -> None:
+        """
+        Удаляет расход из данных и строку из таблицы расходов,
+        обновляет бюджет.
+        """
+        with self.view.expense_view.removing_expense(row_id):
+            expense = self.expenses.pop(row_id)
+        self.budget_totals.remove(expense)
+        self.view.budget_view.refresh()
+
+    def is_name_taken(self, category: Category) -> bool:
+        """
+        Проверяет, есть ли у родителя категории другая подкатегория
+        с тем же названием (в БД на это стоит уникальный индекс).
+        """
+        return any(other.name == category.name and other.parent == category.parent
+                   and other.pk != category.pk for other in self.categories)
 
     def handle_add_category_clicked(self) -> None:
         """
@@ -138,10 +311,12 @@ class Presenter:
 
         if category.parent == 0:
             category.parent = None
+        if self.is_name_taken(category):
+            return
 
-        self.category_repository.add(category)
-        self.view.category_view.edit_windows.add.hide()
-        self.on_categories_updated()
+        self.submit_write(self.view.category_view.edit_windows.add,
+                          lambda: self.save_category(category),
+                          lambda result: self.on_category_added(category))
 
     def handle_update_category_clicked(self) -> None:
         """
@@ -153,10 +328,34 @@ class Presenter:
 
         if category.parent == 0:
             category.parent = None
+        if self.is_name_taken(category):
+            return
+
+        self.submit_write(self.view.category_view.edit_windows.update,
+                          lambda: self.save_category(category),
+                          lambda result: self.on_category_updated(category))
 
-        self.category_repository.update(category)
-        self.view.category_view.edit_windows.update.hide()
-        self.on_categories_updated()
+    def save_category(self, category: Category) -> None:
+        """
+        Записывает новую или измененную категорию в бд и сбрасывает индекс
+        категорий. Выполняется в фоновом потоке.
+        """
+        if category.pk:
+            self.category_repository.update(category)
+        else:
+            self.category_repository.add(category)
+        self.category_index.invalidate()
+
+    def delete_category(self, pk: int) -> None:
+        """
+        Удаляет категорию из бд и сбрасывает индекс категорий. Подкатегории
+        и расходы удаляемой категории остаются без категории: это делают
+        внешние ключи ON DELETE SET NULL схемы (миграция 3) в том же
+        запросе DELETE, без чтения и перезаписи расходов. Данные в памяти
+        обновляет on_category_deleted. Выполняется в фоновом потоке.
+        """
+        self.category_repository.delete(pk)
+        self.category_index.invalidate()
 
     def handle_delete_category_clicked(self) -> None:
         """
@@ -166,9 +365,9 @@ class Presenter:
         if pk_to_delete == 0:
             return
 
-        self.category_repository.delete(pk_to_delete)
-        self.view.category_view.edit_windows.delete.hide()
-        self.on_categories_updated()
+        self.submit_write(self.view.category_view.edit_windows.delete,
+                          lambda: self.delete_category(pk_to_delete),
+                          lambda result: self.on_category_deleted(pk_to_delete))
 
     # EXPENSE HANDLERS
 
@@ -180,9 +379,9 @@ class Presenter:
         if expense.category == 0:
             expense.category = None
 
-        self.expense_repository.add(expense)
-        self.view.expense_view.edit_windows.add.hide()
-        self.on_expenses_updated()
+        self.submit_write(self.view.expense_view.edit_windows.add,
+                          lambda: self.expense_repository.add(expense),
+                          lambda result: self.on_expense_added(expense))
 
     def handle_update_expense_clicked(self) -> None:
         """
@@ -191,48 +390,116 @@ class Presenter:
         row_id, expense = self.view.expense_view.update_content.get_expense_update()
         if expense.category == 0:
             expense.category = None
-        expense.pk = self.expenses[row_id].pk
+        old = self.expenses[row_id]
+        expense.pk = old.pk
 
-        self.expense_repository.update(expense)
-        self.view.expense_view.edit_windows.update.hide()
-        self.on_expenses_updated()
+        def on_done(result: None) -> None:
+            row = find_row(self.expenses, old)
+            if row is not None:
+                self.on_expense_updated(row, expense)
+
+        self.submit_write(self.view.expense_view.edit_windows.update,
+                          lambda: self.expense_repository.update(expense), on_done)
 
     def handle_delete_expense_clicked(self) -> None:
         """
         Обрабатывает удаление расхода.
         """
         row_id = self.view.expense_view.delete_content.get_row_id()
-        self.expense_repository.delete(self.expenses[row_id].pk)
-        self.view.expense_view.edit_windows.delete.hide()
-        self.on_expenses_updated()
+        old = self.expenses[row_id]
+
+        def on_done(result: None) -> None:
+            row = find_row(self.expenses, old)
+            if row is not None:
+                self.on_expense_deleted(row)
+
+        self.submit_write(self.view.expense_view.edit_windows.delete,
+                          lambda: self.expense_repository.delete(old.pk), on_done)
 
     # BUDGET HANDLERS
 
+    def on_budget_added(self, budget: Budget) -> None:
+        """
+        Добавляет бюджет в данные и во view.
+        """
+        with self.view.budget_view.inserting_budgets(len(self.budgets)):
+            self.budgets.append(budget)
+
     def handle_add_budget_clicked(self) -> None:
         """
         Обрабатывает добавление бюджета.
         """
         budget = self.view.budget_view.add_content.get_budget_add()
-        self.budget_repository.add(budget)
-        self.view.budget_view.edit_windows.add.hide()
-        self.on_budgets_updated()
+        self.submit_write(self.view.budget_view.edit_windows.add,
+                          lambda: self.budget_repository.add(budget),
+                          lambda result: self.on_budget_added(budget))
 
     def handle_update_budget_clicked(self) -> None:
         """
         Обрабатывает обновление бюджета.
         """
         row_id, budget = self.view.budget_view.update_content.get_budget_update()
-        budget.pk = self.budgets[row_id].pk
-        self.budget_repository.update(budget)
-        self.view.budget_view.edit_windows.update.hide()
-        self.on_budgets_updated()
+        old = self.budgets[row_id]
+        budget.pk = old.pk
+
+        def on_done(result: None) -> None:
+            row = find_row(self.budgets, old)
+            if row is not None:
+                self.budgets[row] = budget
+                self.view.budget_view.update_budget(row)
+
+        self.submit_write(self.view.budget_view.edit_windows.update,
+                          lambda: self.budget_repository.update(budget), on_done)
 
     def handle_delete_budget_clicked(self) -> None:
         """
         Обрабатывает удаление бюджета.
         """
         row_id = self.view.budget_view.delete_content.get_row_id()
-        pk = self.budgets[row_id].pk
-        self.budget_repository.delete(pk)
-        self.view.budget_view.edit_windows.delete.hide()
-        self.on_budgets_updated()
+        old = self.budgets[row_id]
+
+        def on_done(result: None) -> None:
+            row = find_row(self.budgets, old)
+            if row is not None:
+                with self.view.budget_view.removing_budget(row):
+                    del self.budgets[row]
+
+        self.submit_write(self.view.budget_view.edit_windows.delete,
+                          lambda: self.budget_repository.delete(old.pk), on_done)
+
+    # REPORT HANDLERS
+
+    def build_report(self, start: date, finish: date) -> list[list[str]]:
+        """
+        Строит строки отчета о расходах по категориям. Выполняется
+        в фоновом потоке; индекс категорий перестраивается, только если
+        категории менялись.
+        """
+        totals = category_report(self.expense_repository, self.category_index,
+                                 start, finish)
+        return formatter.format_report_data(self.category_index, totals)
+
+    def on_report_ready(self, rows: list[list[str]]) -> None:
+        """
+        Показывает построенный отчет.
+        """
+        self.view.report_view.set_loading(False)
+        self.view.report_view.set_data(rows)
+
+    def on_report_failed(self, error: BaseException) -> None:
+        """
+        Снимает индикатор загрузки отчета при ошибке.
+        """
+        self.view.report_view.set_loading(False)
+        Executor.log_error(error)
+
+    def handle_show_report_clicked(self) -> None:
+        """
+        Строит отчет о расходах по категориям за выбранный период.
+        Новый запрос отчета вытесняет незавершенный.
+        """
+        start, finish = self.view.report_view.get_period()
+        self.view.report_view.set_loading(True)
+        self.executor.submit(lambda: self.build_report(start, finish),
+                             self.on_report_ready, key='report',
+                             on_error=self.on_report_failed)
@@ -0,0 +1,76 @@
+"""
+Модуль содержит отчет о расходах по иерархии категорий.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any
+
+from bookkeeper.models.category import CategoryIndex
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import DATE_FIELD, ge, in_range, lt
+
+
+@dataclass(slots=True)
+class CategoryTotal:
+    """
+    Сумма расходов по категории.
+    own - расходы, отнесенные непосредственно к категории
+    total - расходы по категории вместе со всеми подкатегориями
+    """
+
+    own: int = 0
+    total: int = 0
+
+
+def rollup(index: CategoryIndex,
+           own: dict[int | None, int]) -> dict[int | None, CategoryTotal]:
+    """
+    Поднять суммы по категориям вверх по иерархии за один обратный проход
+    порядка обхода в глубину: к моменту обработки категории все ее
+    подкатегории уже учтены.
+
+    Расходы без категории или с удаленной категорией собираются под
+    ключом None (только если они есть).
+
+    Parameters
+    ----------
+    index - индекс иерархии категорий
+    own - суммы расходов, отнесенных непосредственно к категориям
+
+    Returns
+    -------
+    Словарь id категории -> CategoryTotal
+    """
+    result: dict[int | None, CategoryTotal] = {}
+    for pk in reversed(index.preorder()):
+        node = result.setdefault(pk, CategoryTotal())
+        node.own = own.get(pk, 0)
+        node.total += node.own
+        parent = index.parent(pk)
+        if parent is not None:
+            result.setdefault(parent, CategoryTotal()).total += node.total
+    rest = sum(amount for pk, amount in own.items() if pk not in index)
+    if rest:
+        result[None] = CategoryTotal(rest, rest)
+    return result
+
+
+def category_report(repo: AbstractRepository[Expense],
+                    index: CategoryIndex,
+                    start: date | None = None,
+                    finish: date | None = None) -> dict[int | None, CategoryTotal]:
+    """
+    Посчитать расходы по категориям с учетом подкатегорий за период
+    [start, finish). Границу None не ограничивает. Суммы по категориям
+    считаются одним агрегирующим запросом к репозиторию.
+    """
+    where: dict[str, Any] = {}
+    if start is not None and finish is not None:
+        where[DATE_FIELD] = in_range(start, finish)
+    elif start is not None:
+        where[DATE_FIELD] = ge(start)
+    elif finish is not None:
+        where[DATE_FIELD] = lt(finish)
+    return rollup(index, repo.sum_amount(where, group_by='category'))
@@ -8,7 +8,9 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from typing import Generic, TypeVar, Protocol, Any, Iterable, Iterator
+
+from bookkeeper.repository.query import AMOUNT_FIELD, GROUP_BY, group_key
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -30,6 +32,10 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    Методы для групповых операций (add_many, update_many, delete_many)
+    по умолчанию вызывают одиночные методы в цикле, iter_all - get_all,
+    а sum_amount суммирует в цикле по iter_all; реализации могут
+    переопределить их более эффективным способом.
     """
 
     @abstractmethod
@@ -44,12 +50,47 @@ class AbstractRepository(ABC, Generic[T]):
         """ Получить объект по id """
 
     @abstractmethod
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | None = None,
+                limit: int | None = None,
+                offset: int = 0) -> list[T]:
         """
         Получить все записи по некоторому условию
         where - условие в виде словаря {'название_поля': значение}
-        если условие не задано (по умолчанию), вернуть все записи
+        если условие не задано (по умолчанию), вернуть все записи.
+        Значением может быть условие из модуля query (isin, lt, between и т.д.).
+        order_by - поле для сортировки, с ведущим минусом - по убыванию
+        limit, offset - вернуть не более limit записей, пропустив первые offset
+        """
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Получить записи по условию в виде генератора. Записи читаются
+        порциями по batch_size, так что в памяти не держится вся выборка.
+        Параметры where и order_by - как в get_all.
+        """
+        yield from self.get_all(where, order_by)
+
+    def sum_amount(self, where: dict[str, Any] | None = None,
+                   group_by: str | None = None) -> dict[Any, Any]:
         """
+        Посчитать сумму поля amount по записям, удовлетворяющим условию where.
+        group_by - None, 'category', 'day', 'week', 'month' или 'year'.
+        Вернуть словарь
+        {ключ группы: сумма}; ключ - id категории или дата начала периода
+        (неделя начинается с понедельника). Без группировки вернуть
+        {None: сумма}. Поддерживается только моделями с полями amount,
+        category и expense_date.
+        """
+        if group_by not in GROUP_BY:
+            raise ValueError(f'unknown grouping {group_by}')
+        totals: dict[Any, Any] = {None: 0} if group_by is None else {}
+        for obj in self.iter_all(where):
+            key = group_key(obj, group_by)
+            totals[key] = totals.get(key, 0) + getattr(obj, AMOUNT_FIELD)
+        return totals
 
     @abstractmethod
     def update(self, obj: T) -> None:
@@ -58,3 +99,20 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, pk: int) -> None:
         """ Удалить запись """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов в репозиторий, вернуть список id
+        в порядке следования объектов, также записать id в атрибут pk.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах. """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for pk in pks:
+            self.delete(pk)
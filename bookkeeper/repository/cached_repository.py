@@ -0,0 +1,189 @@
+"""
+Модуль описывает кэширующую обертку над репозиторием
+
+CachedRepository хранит последние полученные объекты (LRU-кэш по pk)
+и результаты get_all, так что повторные чтения редко меняющихся данных
+(например, категорий) не обращаются к исходному репозиторию. Записи идут
+в исходный репозиторий сразу и сбрасывают запомненные выборки.
+Изменения, сделанные в исходном репозитории в обход обертки, она
+не видит - в этом случае нужно вызвать clear.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Iterator, NamedTuple
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+
+
+class CacheInfo(NamedTuple):
+    """
+    Статистика кэша.
+    hits, misses - число обращений, обслуженных из кэша и исходным репозиторием
+    maxsize - наибольшее число объектов в кэше
+    currsize - текущее число объектов в кэше
+    queries - текущее число запомненных выборок get_all
+    """
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    queries: int
+
+
+def query_key(where: dict[str, Any] | None, *args: Any) -> Hashable | None:
+    """
+    Получить ключ кэша выборки по ее параметрам; None, если значения
+    условий нехэшируемы и выборку запоминать нельзя.
+    """
+    key = (tuple(sorted((where or {}).items())), *args)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class CachedRepository(AbstractRepository[T]):
+    """
+    Репозиторий-обертка с кэшем чтения.
+    repository - исходный репозиторий
+    maxsize - наибольшее число объектов в LRU-кэше get
+    query_maxsize - наибольшее число запомненных выборок get_all
+
+    Кэш работает как карта идентичности: пока объект в кэше, get и get_all
+    возвращают один и тот же экземпляр. Возвращаемые объекты не стоит
+    изменять без последующего update.
+    """
+
+    def __init__(self, repository: AbstractRepository[T],
+                 maxsize: int = 1024, query_maxsize: int = 128) -> None:
+        if maxsize < 1 or query_maxsize < 0:
+            raise ValueError('cache size must be positive')
+        self.repository = repository
+        self.maxsize = maxsize
+        self.query_maxsize = query_maxsize
+        self.hits = 0
+        self.misses = 0
+        self._objects: OrderedDict[int, T] = OrderedDict()
+        self._queries: OrderedDict[Hashable, list[T]] = OrderedDict()
+
+    def cache_info(self) -> CacheInfo:
+        """ Получить статистику кэша """
+        return CacheInfo(self.hits, self.misses, self.maxsize,
+                         len(self._objects), len(self._queries))
+
+    def clear(self) -> None:
+        """ Очистить кэш и сбросить статистику """
+        self._objects.clear()
+        self._queries.clear()
+        self.hits = self.misses = 0
+
+    def _remember(self, obj: T) -> T:
+        """ Положить объект в кэш; если он там уже есть, вернуть кэшированный """
+        cached = self._objects.get(obj.pk)
+        if cached is not None:
+            self._objects.move_to_end(obj.pk)
+            return cached
+        self._store(obj)
+        return obj
+
+    def _store(self, obj: T) -> None:
+        self._objects[obj.pk] = obj
+        self._objects.move_to_end(obj.pk)
+        if len(self._objects) > self.maxsize:
+            self._objects.popitem(last=False)
+
+    def _changed(self) -> None:
+        # выборки зависят от значений полей, поэтому после любой записи
+        # сбрасываются все; объекты в кэше обновляет сам метод записи
+        self._queries.clear()
+
+    def add(self, obj: T) -> int:
+        pk = self.repository.add(obj)
+        self._store(obj)
+        self._changed()
+        return pk
+
+    def get(self, pk: int) -> T | None:
+        obj = self._objects.get(pk)
+        if obj is not None:
+            self._objects.move_to_end(pk)
+            self.hits += 1
+            return obj
+        self.misses += 1
+        obj = self.repository.get(pk)
+        if obj is not None:
+            self._store(obj)
+        return obj
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | None = None,
+                limit: int | None = None,
+                offset: int = 0) -> list[T]:
+        key = query_key(where, order_by, limit, offset)
+        objs = self._queries.get(key) if key is not None else None
+        if objs is not None:
+            self._queries.move_to_end(key)
+            self.hits += 1
+            return list(objs)
+        self.misses += 1
+        objs = [self._remember(obj) for obj in
+                self.repository.get_all(where, order_by, limit, offset)]
+        if key is not None and self.query_maxsize:
+            self._queries[key] = objs
+            if len(self._queries) > self.query_maxsize:
+                self._queries.popitem(last=False)
+        return list(objs)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        # потоковое чтение не кэшируется: оно нужно для больших выборок
+        return self.repository.iter_all(where, order_by, batch_size)
+
+    def sum_amount(self, where: dict[str, Any] | None = None,
+                   group_by: str | None = None) -> dict[Any, Any]:
+        return self.repository.sum_amount(where, group_by)
+
+    def _update(self, objs: list[T], write: Callable[[], None]) -> None:
+        try:
+            write()
+        except BaseException:
+            # объекты могли быть изменены до неудачной записи
+            for obj in objs:
+                self._objects.pop(obj.pk, None)
+            raise
+        finally:
+            self._changed()
+        for obj in objs:
+            self._store(obj)
+
+    def update(self, obj: T) -> None:
+        self._update([obj], lambda: self.repository.update(obj))
+
+    def delete(self, pk: int) -> None:
+        self.repository.delete(pk)
+        self._objects.pop(pk, None)
+        self._changed()
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        pks = self.repository.add_many(objs)
+        for obj in objs:
+            self._store(obj)
+        self._changed()
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        self._update(objs, lambda: self.repository.update_many(objs))
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        try:
+            self.repository.delete_many(pks)
+        finally:
+            for pk in pks:
+                self._objects.pop(pk, None)
+            self._changed()
@@ -0,0 +1,315 @@
+"""
+Модуль описывает колоночное хранилище расходов в оперативной памяти
+
+Расходы хранятся не объектами, а столбцами в массивах NumPy: pk, сумма,
+категория, даты (в микросекундах от начала эпохи) и смещения комментариев
+в общем буфере UTF-8. Запись занимает около 50 байт вместо нескольких сотен
+для объекта Expense, а выборки по условию и суммы по периодам и категориям
+считаются векторно, без цикла по объектам. Для работы нужен пакет numpy
+(необязательная зависимость, ставится с дополнением columnar:
+pip install pybookkeeper[columnar]).
+"""
+
+from datetime import timedelta
+from typing import Any, Iterable, Iterator
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError('ExpenseColumnStore requires numpy, install it with '
+                      'pip install pybookkeeper[columnar]') from error
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import (
+    CATEGORY_FIELD, DATE_FIELD, GROUP_BY, Condition, conditions, order_key
+)
+from bookkeeper.utils import EPOCH, from_microseconds, to_microseconds
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+NO_CATEGORY = -1
+INITIAL_CAPACITY = 16
+# доля мусора в буфере комментариев, после которой он уплотняется
+COMPACT_RATIO = 0.5
+
+VALUE_COLUMNS = ('amount', 'category', 'expense_date', 'added_date',
+                 'comment_start', 'comment_len')
+FIELD_COLUMNS = ('pk', 'amount', 'category', 'expense_date', 'added_date')
+DATE_COLUMNS = ('expense_date', 'added_date')
+COMPARE = {
+    'lt': np.less,
+    'le': np.less_equal,
+    'gt': np.greater,
+    'ge': np.greater_equal,
+}
+
+
+class ExpenseColumnStore(AbstractRepository[Expense]):
+    """
+    Репозиторий расходов, хранящий данные по столбцам в массивах NumPy.
+    Массивы растут с запасом (удвоением емкости), строки упорядочены
+    по pk, так что поиск по pk - бинарный. Категория None хранится как -1,
+    комментарии - отрезками общего байтового буфера.
+    capacity - начальная емкость массивов
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY) -> None:
+        self._size = 0
+        self._last_pk = 0
+        self._columns = {name: np.zeros(capacity, dtype=np.int64)
+                         for name in ('pk', *VALUE_COLUMNS)}
+        self._columns['comment_len'] = np.zeros(capacity, dtype=np.int32)
+        self._text = bytearray()
+        self._garbage = 0
+
+    @property
+    def nbytes(self) -> int:
+        """ Объем памяти под данные: массивы столбцов и буфер комментариев """
+        return sum(column.nbytes for column in self._columns.values()) \
+            + len(self._text)
+
+    def _column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self._size]
+
+    def _reserve(self, count: int) -> None:
+        needed = self._size + count
+        capacity = len(self._columns['pk'])
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, INITIAL_CAPACITY)
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+
+    def _write(self, rows: np.ndarray, objs: list[Expense]) -> None:
+        """ Записать значения объектов в строки rows, по столбцу за раз """
+        columns = self._columns
+        columns['amount'][rows] = np.fromiter(
+            (obj.amount for obj in objs), dtype=np.int64, count=len(objs))
+        columns['category'][rows] = np.fromiter(
+            (NO_CATEGORY if obj.category is None else obj.category for obj in objs),
+            dtype=np.int64, count=len(objs))
+        columns['expense_date'][rows] = np.fromiter(
+            (to_microseconds(obj.expense_date) for obj in objs),
+            dtype=np.int64, count=len(objs))
+        columns['added_date'][rows] = np.fromiter(
+            (to_microseconds(obj.added_date) for obj in objs),
+            dtype=np.int64, count=len(objs))
+        comments = [obj.comment.encode() for obj in objs]
+        lengths = np.fromiter(map(len, comments), dtype=np.int64, count=len(objs))
+        columns['comment_len'][rows] = lengths
+        columns['comment_start'][rows] = len(self._text) + np.cumsum(lengths) - lengths
+        self._text += b''.join(comments)
+
+    def _rows(self, pks: list[int]) -> np.ndarray:
+        """ Номера строк для pk; -1 для отсутствующих """
+        pk_column = self._column('pk')
+        rows = np.searchsorted(pk_column, pks)
+        found = rows < self._size
+        found[found] = pk_column[rows[found]] == np.asarray(pks)[found]
+        return np.where(found, rows, -1)
+
+    def _build(self, rows: np.ndarray) -> list[Expense]:
+        pks, *values = (self._columns[name][rows].tolist()
+                        for name in ('pk', *VALUE_COLUMNS))
+        text = self._text
+        return [
+            Expense(amount,
+                    None if category == NO_CATEGORY else category,  # type: ignore
+                    from_microseconds(expense_date),
+                    from_microseconds(added_date),
+                    text[start:start + length].decode(),
+                    pk)
+            for pk, (amount, category, expense_date, added_date, start, length)
+            in zip(pks, zip(*values))
+        ]
+
+    def _comment(self, row: int) -> str:
+        start = int(self._columns['comment_start'][row])
+        length = int(self._columns['comment_len'][row])
+        return self._text[start:start + length].decode()
+
+    def _compact(self) -> None:
+        """ Переписать буфер комментариев, выбросив отрезки удаленных записей """
+        if self._garbage <= COMPACT_RATIO * len(self._text):
+            return
+        starts = self._column('comment_start')
+        lengths = self._column('comment_len')
+        text = bytearray()
+        for row, (start, length) in enumerate(zip(starts.tolist(), lengths.tolist())):
+            starts[row] = len(text)
+            text += self._text[start:start + length]
+        self._text = text
+        self._garbage = 0
+
+    def _value(self, field: str, value: Any) -> Any:
+        if value is None:
+            return NO_CATEGORY if field == CATEGORY_FIELD else None
+        if field in DATE_COLUMNS:
+            return to_microseconds(value)
+        return value
+
+    def _match(self, field: str, cond: Condition) -> np.ndarray:
+        column = self._column(field)
+        if cond.operator == 'eq':
+            value = self._value(field, cond.value)
+            if value is None:
+                return np.zeros(self._size, dtype=bool)
+            return column == value
+        if cond.operator == 'in':
+            values = [self._value(field, v) for v in cond.value]
+            return np.isin(column, [v for v in values if v is not None])
+        mask = column != NO_CATEGORY if field == CATEGORY_FIELD \
+            else np.ones(self._size, dtype=bool)
+        if cond.operator in ('between', 'range'):
+            low, high = (self._value(field, v) for v in cond.value)
+            upper = np.less_equal if cond.operator == 'between' else np.less
+            return mask & (column >= low) & upper(column, high)
+        return mask & COMPARE[cond.operator](column, self._value(field, cond.value))
+
+    def _mask(self, where: dict[str, Any] | None) -> np.ndarray:
+        mask = np.ones(self._size, dtype=bool)
+        rest = []
+        for field, cond in conditions(where):
+            if field in FIELD_COLUMNS:
+                mask &= self._match(field, cond)
+            elif field == 'comment':
+                rest.append(cond)
+            else:
+                raise ValueError(f'unknown field {field} for expense')
+        if rest:
+            rows = np.flatnonzero(mask)
+            mask[rows] = [all(cond.matches(self._comment(row)) for cond in rest)
+                          for row in rows.tolist()]
+        return mask
+
+    def _select(self, where: dict[str, Any] | None,
+                order_by: str | None) -> np.ndarray:
+        """ Номера строк, удовлетворяющих условию, в порядке сортировки """
+        rows = np.flatnonzero(self._mask(where))
+        if order_by is None:
+            return rows
+        field, reverse = order_key(order_by)
+        if field in FIELD_COLUMNS:
+            keys = self._column(field)[rows]
+            # сортировка устойчивая, как sorted в MemoryRepository;
+            # None (-1) идет первым по возрастанию и последним по убыванию
+            return rows[np.argsort(-keys if reverse else keys, kind='stable')]
+        if field == 'comment':
+            comments = [self._comment(row) for row in rows.tolist()]
+            order = sorted(range(len(rows)), key=comments.__getitem__,
+                           reverse=reverse)
+            return rows[np.asarray(order, dtype=np.int64)]
+        raise ValueError(f'unknown field {field} for expense')
+
+    def add(self, obj: Expense) -> int:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[Expense]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        self._reserve(len(objs))
+        rows = np.arange(self._size, self._size + len(objs))
+        pks = list(range(self._last_pk + 1, self._last_pk + len(objs) + 1))
+        self._write(rows, objs)
+        self._columns['pk'][rows] = pks
+        self._size += len(objs)
+        if pks:
+            self._last_pk = pks[-1]
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+        return pks
+
+    def get(self, pk: int) -> Expense | None:
+        rows = self._rows([pk])
+        if rows[0] < 0:
+            return None
+        return self._build(rows)[0]
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | None = None,
+                limit: int | None = None,
+                offset: int = 0) -> list[Expense]:
+        rows = self._select(where, order_by)
+        stop = None if limit is None else offset + limit
+        return self._build(rows[offset:stop])
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | None = None,
+                 batch_size: int = 1000) -> Iterator[Expense]:
+        rows = self._select(where, order_by)
+        for start in range(0, len(rows), batch_size):
+            yield from self._build(rows[start:start + batch_size])
+
+    def sum_amount(self, where: dict[str, Any] | None = None,
+                   group_by: str | None = None) -> dict[Any, Any]:
+        if group_by not in GROUP_BY:
+            raise ValueError(f'unknown grouping {group_by}')
+        rows = np.flatnonzero(self._mask(where))
+        amounts = self._column('amount')[rows]
+        if group_by is None:
+            return {None: int(amounts.sum())}
+        if group_by == CATEGORY_FIELD:
+            keys = self._column(CATEGORY_FIELD)[rows]
+        else:
+            keys = self._period_keys(self._column(DATE_FIELD)[rows], group_by)
+        order = np.argsort(keys, kind='stable')
+        keys, amounts = keys[order], amounts[order]
+        groups, starts = np.unique(keys, return_index=True)
+        if not len(groups):
+            return {}
+        sums = np.add.reduceat(amounts, starts)
+        if group_by == CATEGORY_FIELD:
+            return {None if key == NO_CATEGORY else key: total
+                    for key, total in zip(groups.tolist(), sums.tolist())}
+        start_day = EPOCH.date()
+        return {start_day + timedelta(days=key): total
+                for key, total in zip(groups.tolist(), sums.tolist())}
+
+    @staticmethod
+    def _period_keys(moments: np.ndarray, period: str) -> np.ndarray:
+        """ Номер дня от начала эпохи, с которого начинается период даты """
+        days = moments // MICROSECONDS_PER_DAY
+        if period == 'day':
+            return days
+        if period == 'week':
+            # 1970-01-01 - четверг, неделя начинается с понедельника
+            return days - (days + 3) % 7
+        unit = 'datetime64[M]' if period == 'month' else 'datetime64[Y]'
+        return days.astype('datetime64[D]').astype(unit) \
+            .astype('datetime64[D]').astype(np.int64)
+
+    def update(self, obj: Expense) -> None:
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[Expense]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        rows = self._rows([obj.pk for obj in objs])
+        if (rows < 0).any():
+            raise ValueError('Часть обновляемых записей не существует в хранилище.')
+        self._garbage += int(self._columns['comment_len'][rows].sum())
+        self._write(rows, objs)
+        self._compact()
+
+    def delete(self, pk: int) -> None:
+        if self._rows([pk])[0] < 0:
+            raise KeyError(pk)
+        self.delete_many([pk])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        rows = self._rows(list(pks))
+        if (rows < 0).any():
+            raise KeyError('Часть удаляемых записей не существует в хранилище.')
+        keep = np.ones(self._size, dtype=bool)
+        keep[rows] = False
+        self._garbage += int(self._columns['comment_len'][rows].sum())
+        for column in self._columns.values():
+            live = column[:self._size][keep]
+            column[:len(live)] = live
+        self._size = int(keep.sum())
+        self._compact()
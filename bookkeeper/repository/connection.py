@@ -0,0 +1,354 @@
+"""
+Модуль описывает менеджер соединений с SQLite БД
+
+Менеджер держит по одному долгоживущему соединению на поток и разделяется
+всеми репозиториями, работающими с одной и той же БД. Общий менеджер
+(for_database) считает ссылки: каждый вызов for_database берет ссылку,
+release() ее освобождает, и менеджер закрывается с последней ссылкой. Настройки соединения
+(режим журнала, уровень синхронизации, размер кэша) применяются один раз
+при открытии соединения, а не при каждом запросе.
+
+Запись и транзакции. По умолчанию каждая запись репозитория фиксируется
+своей транзакцией. В режиме группировки (commit_every_rows и/или
+commit_every_ms) записи копятся в одной открытой транзакции (группе)
+и фиксируются вместе, когда набирается commit_every_rows строк или с начала
+группы проходит commit_every_ms миллисекунд: срок отслеживает таймер,
+так что одиночная запись тоже фиксируется вовремя. flush() фиксирует
+группу сразу. transaction() объединяет записи в транзакцию явно: все
+или ничего.
+
+Потоки. Открытая группа держит блокировку БД на запись, поэтому группа
+в каждый момент одна: когда другой поток начинает запись или транзакцию,
+группа предыдущего потока фиксируется и блокировка переходит к нему.
+Явная транзакция другого потока так не прерывается: запись ждет ее
+окончания (не дольше таймаута ожидания блокировки SQLite, 5 с).
+Группу чужого соединения фиксирует поток, забирающий группу, а по сроку -
+фоновый поток таймера; подробности - в описании ConnectionManager.
+
+Гарантии сохранности. Незафиксированные записи видны в том же потоке,
+но не в других соединениях, и теряются при падении процесса; не дольше
+commit_every_ms, если срок задан. После фиксации (flush, выход из
+transaction, достижение порога или срока, запись другого потока, close)
+данные сохранены так же, как при обычной записи: в режиме WAL с
+synchronous = NORMAL они переживают падение процесса, но последние
+транзакции могут пропасть при отключении питания; synchronous = FULL
+защищает и от этого ценой fsync на каждую фиксацию.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from types import TracebackType
+from typing import ClassVar, Iterator
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionManager:
+    """
+    Менеджер соединений с SQLite БД.
+    database - путь к файлу БД
+    journal_mode - режим журнала (по умолчанию WAL)
+    synchronous - уровень синхронизации с диском (по умолчанию NORMAL)
+    cache_size - размер кэша страниц; отрицательное значение задает размер
+    в килобайтах (см. PRAGMA cache_size)
+    commit_every_rows - фиксировать сгруппированные записи каждые столько строк
+    commit_every_ms - фиксировать сгруппированные записи не реже, чем раз
+    в столько миллисекунд; если оба параметра 0, группировка выключена
+
+    Соединения открываются с check_same_thread=False: соединение потока
+    используется не только им самим. close() закрывает соединения всех
+    потоков, а открытую группу фиксирует чужой поток: поток, начинающий
+    запись или транзакцию (_take_group), либо поток таймера по истечении
+    commit_every_ms (_expire). Такая фиксация и любая сгруппированная запись
+    выполняются под _group_lock, поэтому фиксация не попадает в середину
+    записи группы, а записи после нее начинают новую группу. Чтения потока
+    идут без блокировки; одновременные вызовы на одном соединении из двух
+    потоков безопасны, пока SQLite собрана в режиме serialized
+    (sqlite3.threadsafety == 3, сборка по умолчанию): она сама сериализует
+    обращения к соединению. Соединения внутри transaction() чужие потоки
+    не фиксируют: их фиксирует или откатывает только владелец.
+    """
+
+    _shared: ClassVar[dict[str, 'ConnectionManager']] = {}
+    _shared_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, database: str,
+                 journal_mode: str = 'WAL',
+                 synchronous: str = 'NORMAL',
+                 cache_size: int = -8000,
+                 commit_every_rows: int = 0,
+                 commit_every_ms: int = 0) -> None:
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f'unknown journal mode {journal_mode}')
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f'unknown synchronous level {synchronous}')
+        self.database = database
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = int(cache_size)
+        if commit_every_rows < 0 or commit_every_ms < 0:
+            raise ValueError('group commit thresholds must be non-negative')
+        self.commit_every_rows = commit_every_rows
+        self.commit_every_ms = commit_every_ms
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        # соединения внутри transaction(): close() не фиксирует их частично
+        self._explicit: set[sqlite3.Connection] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        # открытая группа записей: соединение, номер группы и таймер срока
+        # фиксации; меняются и фиксируются под _group_lock, который держится
+        # на время сгруппированной записи
+        self._group_lock = threading.RLock()
+        self._group_con: sqlite3.Connection | None = None
+        self._group_id = 0
+        self._timer: threading.Timer | None = None
+        self._users = 0
+
+    @classmethod
+    def for_database(cls, database: str, **settings: str | int) -> 'ConnectionManager':
+        """
+        Получить общий менеджер для БД. Если менеджер для этой БД уже создан
+        и не закрыт, вернуть его (настройки при этом игнорируются), иначе
+        создать новый с заданными настройками. Вызов берет ссылку на менеджер,
+        которую нужно освободить вызовом release().
+        """
+        with cls._shared_lock:
+            manager = cls._shared.get(database)
+            if manager is None or manager.closed:
+                manager = cls(database, **settings)  # type: ignore[arg-type]
+                cls._shared[database] = manager
+            manager._users += 1
+            return manager
+
+    def release(self) -> None:
+        """
+        Освободить ссылку, взятую for_database. Менеджер закрывается,
+        когда освобождена последняя ссылка.
+        """
+        with self._shared_lock:
+            self._users = max(self._users - 1, 0)
+            last = self._users == 0
+        if last:
+            self.close()
+
+    @property
+    def closed(self) -> bool:
+        """ Закрыт ли менеджер """
+        return self._closed
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Получить соединение текущего потока, открыв его при первом обращении.
+        """
+        if self._closed:
+            raise sqlite3.ProgrammingError(
+                f'connection manager for {self.database} is closed')
+        con: sqlite3.Connection | None = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._connect()
+            self._local.con = con
+        return con
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False: close(), _take_group и таймер (_expire)
+        # закрывают и фиксируют соединение из чужого потока, см. описание
+        # класса; фиксация при этом идет под _group_lock
+        con = sqlite3.connect(self.database, check_same_thread=False,
+                              cached_statements=STATEMENT_CACHE_SIZE)
+        con.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        con.execute(f'PRAGMA synchronous = {self.synchronous}')
+        con.execute(f'PRAGMA cache_size = {self.cache_size}')
+        con.execute('PRAGMA foreign_keys = ON')
+        with self._lock:
+            self._connections.append(con)
+        return con
+
+    @property
+    def grouping(self) -> bool:
+        """ Включен ли режим группировки записей """
+        return bool(self.commit_every_rows or self.commit_every_ms)
+
+    def _state(self) -> threading.local:
+        local = self._local
+        if not hasattr(local, 'depth'):
+            local.depth = 0
+            local.pending = 0
+            local.started = 0.0
+        return local
+
+    def _begin(self, con: sqlite3.Connection) -> None:
+        if not con.in_transaction:
+            con.execute('BEGIN IMMEDIATE')
+            state = self._state()
+            state.pending = 0
+            state.started = time.monotonic()
+
+    @staticmethod
+    @contextmanager
+    def _savepoint(con: sqlite3.Connection, name: str) -> Iterator[None]:
+        """ Выполнить блок в точке сохранения: при ошибке откатывается только он """
+        con.execute(f'SAVEPOINT {name}')
+        try:
+            yield
+        except BaseException:
+            con.execute(f'ROLLBACK TO {name}')
+            con.execute(f'RELEASE {name}')
+            raise
+        con.execute(f'RELEASE {name}')
+
+    def _take_group(self, con: sqlite3.Connection) -> None:
+        """
+        Передать группу соединению con, зафиксировав открытую группу другого
+        потока (под _group_lock: тот поток сейчас не пишет в нее).
+        """
+        other = self._group_con
+        if other is not None and other is not con and other not in self._explicit \
+                and other.in_transaction:
+            other.commit()
+            self._cancel_timer()
+        self._group_con = con
+
+    def _start_timer(self) -> None:
+        self._group_id += 1
+        if self.commit_every_ms:
+            self._timer = threading.Timer(self.commit_every_ms / 1000, self._expire,
+                                          (self._group_id,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _expire(self, group_id: int) -> None:
+        """ Зафиксировать группу по истечении commit_every_ms (поток таймера) """
+        with self._group_lock:
+            con = self._group_con
+            if group_id == self._group_id and not self._closed and con is not None \
+                    and con not in self._explicit and con.in_transaction:
+                con.commit()
+
+    @contextmanager
+    def write(self, rows: int = 1) -> Iterator[sqlite3.Connection]:
+        """
+        Выполнить запись в БД. Без группировки и вне transaction() запись
+        фиксируется сразу; иначе выполняется в точке сохранения открытой
+        транзакции: при ошибке откатывается только эта запись.
+        rows - число записываемых строк для порога commit_every_rows
+        """
+        con = self.connection()
+        state = self._state()
+        if state.depth:
+            with self._savepoint(con, 'write'):
+                yield con
+            return
+        if not self.grouping:
+            with con:
+                self._begin(con)
+                yield con
+            return
+        with self._group_lock:
+            self._take_group(con)
+            if not con.in_transaction:
+                self._begin(con)
+                self._start_timer()
+            with self._savepoint(con, 'write'):
+                yield con
+            state.pending += rows
+            if self._due(state):
+                self.flush()
+
+    def _due(self, state: threading.local) -> bool:
+        if self.commit_every_rows and state.pending >= self.commit_every_rows:
+            return True
+        elapsed = (time.monotonic() - state.started) * 1000
+        return bool(self.commit_every_ms) and elapsed >= self.commit_every_ms
+
+    def flush(self) -> None:
+        """
+        Зафиксировать сгруппированные записи текущего потока. Внутри
+        transaction() ничего не делает: фиксация произойдет при выходе из нее.
+        """
+        con = self.connection()
+        state = self._state()
+        if state.depth:
+            return
+        with self._group_lock:
+            if con.in_transaction:
+                con.commit()
+            if self._group_con is con:
+                self._cancel_timer()
+        state.pending = 0
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выполнить записи одной транзакцией: при выходе без ошибки они
+        фиксируются, при ошибке откатываются. Ранее сгруппированные записи
+        фиксируются до начала транзакции. Вложенные транзакции выполняются
+        в точках сохранения и откатываются независимо от внешней.
+        """
+        con = self.connection()
+        state = self._state()
+        if state.depth == 0:
+            self.flush()
+            with self._group_lock:
+                self._take_group(con)
+                self._explicit.add(con)
+                self._begin(con)
+        # выход из транзакции не берет _group_lock: его может держать
+        # запись другого потока, которая ждет окончания этой транзакции
+        savepoint = f'tx{state.depth}'
+        state.depth += 1
+        try:
+            with self._savepoint(con, savepoint):
+                yield con
+        except BaseException:
+            state.depth -= 1
+            if state.depth == 0:
+                con.rollback()
+                self._explicit.discard(con)
+            raise
+        state.depth -= 1
+        if state.depth == 0:
+            con.commit()
+            state.pending = 0
+            self._explicit.discard(con)
+
+    def close(self) -> None:
+        """
+        Зафиксировать сгруппированные записи и закрыть все соединения,
+        открытые менеджером. Повторный вызов ничего не делает.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            connections, self._connections = self._connections, []
+        with self._group_lock:
+            self._cancel_timer()
+            self._group_con = None
+            for con in connections:
+                if con.in_transaction and con not in self._explicit:
+                    con.commit()
+                con.close()
+        self._local = threading.local()
+        with self._shared_lock:
+            if self._shared.get(self.database) is self:
+                del self._shared[self.database]
+
+    def __enter__(self) -> 'ConnectionManager':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        self.close()
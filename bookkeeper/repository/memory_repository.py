@@ -2,20 +2,159 @@
 Модуль описывает репозиторий, работающий в оперативной памяти
 """
 
-from itertools import count
-from typing import Any
+from bisect import bisect_left, bisect_right
+from itertools import count, islice
+from typing import Any, Iterable, Iterator
 
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import AMOUNT_FIELD, GROUP_BY, Condition, \
+    conditions, group_key, order_key
+from bookkeeper.utils import sort_key
+
+
+class FieldIndex:
+    """
+    Вторичный индекс по полю: хэш-таблица значение -> множество pk для
+    условий равенства и отсортированный список значений для диапазонов.
+    Значения None в отсортированный список не попадают, так как
+    не участвуют в сравнениях. Ключи списка приводятся через sort_key,
+    чтобы date и datetime можно было хранить вместе.
+    """
+
+    def __init__(self) -> None:
+        self._hash: dict[Any, set[int]] = {}
+        self._keys: list[Any] = []
+        self._pks: list[int] = []
+
+    def add(self, value: Any, pk: int) -> None:
+        """ Добавить запись в индекс """
+        self._hash.setdefault(value, set()).add(pk)
+        if value is not None:
+            value = sort_key(value)
+            idx = bisect_right(self._keys, value)
+            self._keys.insert(idx, value)
+            self._pks.insert(idx, pk)
+
+    def remove(self, value: Any, pk: int) -> None:
+        """ Удалить запись из индекса """
+        pks = self._hash[value]
+        pks.discard(pk)
+        if not pks:
+            del self._hash[value]
+        if value is not None:
+            value = sort_key(value)
+            lo = bisect_left(self._keys, value)
+            hi = bisect_right(self._keys, value)
+            idx = self._pks.index(pk, lo, hi)
+            del self._keys[idx]
+            del self._pks[idx]
+
+    def search(self, cond: Condition) -> set[int]:
+        """ Найти pk записей, удовлетворяющих условию """
+        if cond.operator == 'eq':
+            return set(self._hash.get(cond.value, ()))
+        if cond.operator == 'in':
+            return set().union(*(self._hash.get(v, ()) for v in cond.value))
+        lo, hi = 0, len(self._keys)
+        if cond.operator in ('between', 'range'):
+            low, high = map(sort_key, cond.value)
+            lo = bisect_left(self._keys, low)
+            if cond.operator == 'between':
+                hi = bisect_right(self._keys, high)
+            else:
+                hi = bisect_left(self._keys, high)
+            return set(self._pks[lo:hi])
+        value = sort_key(cond.value)
+        if cond.operator == 'lt':
+            hi = bisect_left(self._keys, value)
+        elif cond.operator == 'le':
+            hi = bisect_right(self._keys, value)
+        elif cond.operator == 'gt':
+            lo = bisect_right(self._keys, value)
+        elif cond.operator == 'ge':
+            lo = bisect_left(self._keys, value)
+        return set(self._pks[lo:hi])
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+    indexes - поля, по которым поддерживаются вторичные индексы для get_all
+    Суммы sum_amount без условия поддерживаются по группам: при первом
+    запросе группировки они считаются по всем записям, дальше обновляются
+    при записи.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, indexes: Iterable[str] = ()) -> None:
         self._container: dict[int, T] = {}
         self._counter = count(1)
+        self._indexes = {field: FieldIndex() for field in indexes}
+        # значения индексируемых полей на момент записи: объект могут
+        # изменить снаружи до вызова update, а из индекса нужно удалить
+        # именно старые значения
+        self._indexed: dict[int, tuple[Any, ...]] = {}
+        # группировка -> {ключ группы: [сумма, число записей]} и по тому же
+        # принципу сумма и ключи групп каждой записи на момент записи
+        self._sums: dict[str | None, dict[Any, list[Any]]] = {}
+        self._summed: dict[int, tuple[Any, tuple[Any, ...]]] = {}
+
+    def _index(self, pk: int, obj: T) -> None:
+        if self._sums:
+            self._add_sums(pk, obj)
+        if not self._indexes:
+            return
+        values = tuple(getattr(obj, field) for field in self._indexes)
+        for index, value in zip(self._indexes.values(), values):
+            index.add(value, pk)
+        self._indexed[pk] = values
+
+    def _unindex(self, pk: int) -> None:
+        if self._sums:
+            self._remove_sums(pk)
+        if not self._indexes:
+            return
+        values = self._indexed.pop(pk)
+        for index, value in zip(self._indexes.values(), values):
+            index.remove(value, pk)
+
+    def _add_sums(self, pk: int, obj: T) -> None:
+        amount = getattr(obj, AMOUNT_FIELD)
+        keys = tuple(group_key(obj, group_by) for group_by in self._sums)
+        for sums, key in zip(self._sums.values(), keys):
+            total = sums.setdefault(key, [0, 0])
+            total[0] += amount
+            total[1] += 1
+        self._summed[pk] = (amount, keys)
+
+    def _remove_sums(self, pk: int) -> None:
+        amount, keys = self._summed.pop(pk)
+        for sums, key in zip(self._sums.values(), keys):
+            total = sums[key]
+            total[0] -= amount
+            total[1] -= 1
+            if not total[1]:
+                del sums[key]
+
+    def sum_amount(self, where: dict[str, Any] | None = None,
+                   group_by: str | None = None) -> dict[Any, Any]:
+        """
+        Посчитать сумму amount. Без условия where суммы берутся из
+        поддерживаемых итогов по группам, с условием - перебором
+        подходящих записей, как в AbstractRepository.sum_amount.
+        """
+        if where or group_by not in GROUP_BY:
+            return super().sum_amount(where, group_by)
+        if group_by not in self._sums:
+            self._sums[group_by] = {}
+            for sums in self._sums.values():
+                sums.clear()
+            self._summed.clear()
+            for pk, obj in self._container.items():
+                self._add_sums(pk, obj)
+        totals = {key: total for key, (total, _) in self._sums[group_by].items()}
+        if group_by is None:
+            return totals or {None: 0}
+        return totals
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
@@ -23,21 +162,92 @@ class MemoryRepository(AbstractRepository[T]):
         pk = next(self._counter)
         self._container[pk] = obj
         obj.pk = pk
+        self._index(pk, obj)
         return pk
 
     def get(self, pk: int) -> T | None:
         return self._container.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-        if where is None:
-            return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+    def _select(self, where: dict[str, Any] | None,
+                order_by: str | None) -> Iterator[T]:
+        """
+        Лениво выбрать объекты по условию. Итерация идет по снимку ключей,
+        поэтому репозиторий можно изменять, не дочитав результат.
+        """
+        conds = conditions(where)
+        indexed = [(key, cond) for key, cond in conds if key in self._indexes]
+        rest = [(key, cond) for key, cond in conds if key not in self._indexes]
+        pks: Iterable[int]
+        if indexed:
+            found = [self._indexes[key].search(cond) for key, cond in indexed]
+            pks = sorted(set.intersection(*sorted(found, key=len)))
+        else:
+            pks = list(self._container)
+        objs = (obj for obj in map(self._container.get, pks) if obj is not None)
+        if rest:
+            objs = (obj for obj in objs
+                    if all(cond.matches(getattr(obj, key)) for key, cond in rest))
+        if order_by is not None:
+            field, reverse = order_key(order_by)
+            objs = iter(sorted(objs, reverse=reverse,
+                               key=lambda obj: (getattr(obj, field) is not None,
+                                                sort_key(getattr(obj, field)))))
+        return objs
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | None = None,
+                limit: int | None = None,
+                offset: int = 0) -> list[T]:
+        objs = self._select(where, order_by)
+        stop = None if limit is None else offset + limit
+        return list(islice(objs, offset, stop))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        yield from self._select(where, order_by)
 
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
+        if obj.pk in self._container:
+            self._unindex(obj.pk)
         self._container[obj.pk] = obj
+        self._index(obj.pk, obj)
 
     def delete(self, pk: int) -> None:
         self._container.pop(pk)
+        self._unindex(pk)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        pks = []
+        for obj in objs:
+            pk = next(self._counter)
+            self._container[pk] = obj
+            obj.pk = pk
+            self._index(pk, obj)
+            pks.append(pk)
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        for obj in objs:
+            if obj.pk in self._container:
+                self._unindex(obj.pk)
+            self._container[obj.pk] = obj
+            self._index(obj.pk, obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        for pk in pks:
+            if pk not in self._container:
+                raise KeyError(pk)
+        for pk in pks:
+            del self._container[pk]
+            self._unindex(pk)
@@ -0,0 +1,238 @@
+"""
+Модуль описывает миграции схемы SQLite БД приложения
+
+Схема меняется упорядоченными шагами (Migration). Номер последнего
+примененного шага хранится в таблице schema_version. При запуске migrate
+применяет недостающие шаги, каждый в своей транзакции вместе с записью
+номера версии; если версия БД актуальна, никаких DDL-запросов не выполняется.
+
+Шаги описывают схему явным SQL, а не по текущим моделям: модели меняются,
+а уже выпущенный шаг должен делать то же самое, что и при выпуске.
+"""
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from bookkeeper.repository.connection import ConnectionManager
+from bookkeeper.utils import to_microseconds
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Шаг миграции схемы.
+    version - номер версии схемы после шага
+    name - описание шага
+    apply - функция, выполняющая шаг на соединении внутри транзакции
+    """
+
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Connection], None]
+
+
+def table_columns(con: sqlite3.Connection, table: str) -> dict[str, str]:
+    """ Получить объявленные типы колонок таблицы; пустой словарь, если ее нет """
+    return {row[1]: row[2] for row in
+            con.execute(f'PRAGMA table_info({table})').fetchall()}
+
+
+def _convert(conv: Callable[[Any], Any], value: Any) -> Any:
+    if value is None:
+        return None
+    try:
+        return conv(value)
+    except (TypeError, ValueError):
+        logger.warning('cannot convert value %r, keeping it as is', value)
+        return value
+
+
+def rebuild_table(con: sqlite3.Connection, table: str, create: str,
+                  converters: dict[str, Callable[[Any], Any]] | None = None) -> None:
+    """
+    Пересоздать таблицу по новому описанию, сохранив данные и индексы.
+    create - запрос CREATE TABLE с {table} на месте имени таблицы
+    converters - функции преобразования значений колонок при копировании
+
+    Данные копируются по общим для старой и новой таблицы колонкам.
+    Вызывать внутри транзакции; если на таблицу ссылаются внешние ключи,
+    их проверку нужно отключить (PRAGMA foreign_keys = OFF) до ее начала.
+    """
+    converters = converters or {}
+    indexes = [row[0] for row in con.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? "
+        "AND sql IS NOT NULL", (table,))]
+    old = table_columns(con, table)
+    con.execute(create.format(table=f'{table}_new'))
+    common = [name for name in table_columns(con, f'{table}_new') if name in old]
+    names = ', '.join(common)
+    rows = con.execute(f'SELECT {names} FROM {table}')
+    convs = [converters.get(name) for name in common]
+    con.executemany(
+        f'INSERT INTO {table}_new ({names}) VALUES ({", ".join("?" * len(common))})',
+        ([value if conv is None else _convert(conv, value)
+          for conv, value in zip(convs, row)] for row in rows))
+    con.execute(f'DROP TABLE {table}')
+    con.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    for sql in indexes:
+        con.execute(sql)
+
+
+CATEGORY_V1 = 'CREATE TABLE IF NOT EXISTS {table} ' \
+    '(id INTEGER PRIMARY KEY, name TEXT, parent INTEGER)'
+EXPENSE_V1 = 'CREATE TABLE IF NOT EXISTS {table} ' \
+    '(id INTEGER PRIMARY KEY, amount INTEGER, category INTEGER, ' \
+    'expense_date INTEGER, added_date INTEGER, comment TEXT)'
+BUDGET_V1 = 'CREATE TABLE IF NOT EXISTS {table} ' \
+    '(id INTEGER PRIMARY KEY, amount INTEGER, period TEXT)'
+
+CATEGORY_V3 = 'CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT, ' \
+    'parent INTEGER REFERENCES category (id) ON DELETE SET NULL)'
+EXPENSE_V3 = 'CREATE TABLE {table} (id INTEGER PRIMARY KEY, amount INTEGER, ' \
+    'category INTEGER REFERENCES category (id) ON DELETE SET NULL, ' \
+    'expense_date INTEGER, added_date INTEGER, comment TEXT)'
+
+
+def _create_tables(con: sqlite3.Connection) -> None:
+    for table, create in (('category', CATEGORY_V1), ('expense', EXPENSE_V1),
+                          ('budget', BUDGET_V1)):
+        con.execute(create.format(table=table))
+
+
+def _typed_columns(con: sqlite3.Connection) -> None:
+    # в БД до миграций суммы и даты хранились в колонках TEXT,
+    # даты - строками ISO
+    def to_date(value: Any) -> Any:
+        return value if isinstance(value, int) else to_microseconds(value)
+
+    tables = (
+        ('category', CATEGORY_V1, {'parent': int}),
+        ('expense', EXPENSE_V1, {'amount': int, 'category': int,
+                                 'expense_date': to_date, 'added_date': to_date}),
+        ('budget', BUDGET_V1, {'amount': int}),
+    )
+    for table, create, converters in tables:
+        columns = table_columns(con, table)
+        if any(columns.get(name) != 'INTEGER' for name in converters):
+            rebuild_table(con, table, create, converters)
+
+
+def _foreign_keys(con: sqlite3.Connection) -> None:
+    # ссылки на несуществующие категории обнуляются, иначе новые
+    # ограничения не пройдут проверку
+    con.execute('UPDATE category SET parent = NULL WHERE parent IS NOT NULL '
+                'AND parent NOT IN (SELECT id FROM category)')
+    con.execute('UPDATE expense SET category = NULL WHERE category IS NOT NULL '
+                'AND category NOT IN (SELECT id FROM category)')
+    for table, create in (('category', CATEGORY_V3), ('expense', EXPENSE_V3)):
+        if not con.execute(f'PRAGMA foreign_key_list({table})').fetchall():
+            rebuild_table(con, table, create)
+
+
+def _indexes(con: sqlite3.Connection) -> None:
+    for table, column in (('expense', 'expense_date'), ('expense', 'category'),
+                          ('category', 'parent')):
+        con.execute(f'CREATE INDEX IF NOT EXISTS {table}_{column}_idx '
+                    f'ON {table} ({column})')
+
+
+def _unique_category_names(con: sqlite3.Connection) -> None:
+    # одинаковые названия у одного родителя переименовываются: к названию
+    # добавляется id, иначе уникальный индекс не создать
+    duplicates = con.execute(
+        "UPDATE category SET name = name || ' (' || id || ')' "
+        'WHERE id NOT IN (SELECT MIN(id) FROM category GROUP BY name, parent)'
+    ).rowcount
+    if duplicates:
+        logger.warning('renamed %d categories with duplicate names', duplicates)
+    con.execute('CREATE UNIQUE INDEX IF NOT EXISTS category_name_parent_idx '
+                'ON category (name, parent)')
+
+
+# у категорий верхнего уровня parent = NULL, а NULL в уникальном индексе
+# не равен другому NULL, поэтому индекс строится по IFNULL(parent, 0)
+CATEGORY_NAME_INDEX = 'category_name_key_idx'
+
+
+def unique_category_names(con: sqlite3.Connection) -> None:
+    """
+    Создать уникальный индекс по названию и родителю категории, если его
+    еще нет. Одинаковые названия у одного родителя (в том числе у категорий
+    верхнего уровня) до этого переименовываются: к названию добавляется id.
+    """
+    if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                   (CATEGORY_NAME_INDEX,)).fetchone() is not None:
+        return
+    duplicates = con.execute(
+        "UPDATE category SET name = name || ' (' || id || ')' WHERE id NOT IN "
+        '(SELECT MIN(id) FROM category GROUP BY name, IFNULL(parent, 0))'
+    ).rowcount
+    if duplicates:
+        logger.warning('renamed %d categories with duplicate names', duplicates)
+    con.execute(f'CREATE UNIQUE INDEX {CATEGORY_NAME_INDEX} '
+                'ON category (name, IFNULL(parent, 0))')
+
+
+def _unique_top_level_names(con: sqlite3.Connection) -> None:
+    # индекс миграции 5 не запрещал одинаковые названия верхнего уровня
+    con.execute('DROP INDEX IF EXISTS category_name_parent_idx')
+    unique_category_names(con)
+
+
+MIGRATIONS = [
+    Migration(1, 'create tables', _create_tables),
+    Migration(2, 'typed columns', _typed_columns),
+    Migration(3, 'foreign keys', _foreign_keys),
+    Migration(4, 'indexes', _indexes),
+    Migration(5, 'unique category names', _unique_category_names),
+    Migration(6, 'unique top-level category names', _unique_top_level_names),
+]
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(con: sqlite3.Connection) -> int:
+    """ Получить версию схемы БД; 0, если миграции не применялись """
+    try:
+        row = con.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def migrate(manager: ConnectionManager,
+            migrations: list[Migration] | None = None) -> int:
+    """
+    Применить к БД недостающие шаги миграции и вернуть итоговую версию
+    схемы. Каждый шаг выполняется в отдельной транзакции с отключенной
+    проверкой внешних ключей; перед фиксацией проверяется, что ссылки
+    не нарушены (иначе sqlite3.IntegrityError и откат шага).
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    con = manager.connection()
+    version = schema_version(con)
+    pending = [step for step in migrations if step.version > version]
+    if not pending:
+        return version
+    con.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for step in pending:
+            logger.info('applying migration %d: %s', step.version, step.name)
+            with con:
+                if not con.in_transaction:
+                    con.execute('BEGIN IMMEDIATE')
+                con.execute('CREATE TABLE IF NOT EXISTS schema_version '
+                            '(version INTEGER PRIMARY KEY, name TEXT)')
+                step.apply(con)
+                if con.execute('PRAGMA foreign_key_check').fetchone() is not None:
+                    raise sqlite3.IntegrityError(
+                        f'migration {step.version} violates foreign keys')
+                con.execute('INSERT INTO schema_version VALUES (?, ?)',
+                            (step.version, step.name))
+            version = step.version
+    finally:
+        con.execute('PRAGMA foreign_keys = ON')
+    return version
@@ -0,0 +1,189 @@
+"""
+Модуль описывает условия выборки для метода get_all репозиториев
+
+Условие задается словарем {'название_поля': значение}. Значением может быть
+как обычное значение (проверка на равенство), так и объект Condition,
+созданный одной из функций eq, isin, lt, le, gt, ge, between, in_range,
+startswith:
+
+    repo.get_all({'category': isin([1, 2]),
+                  'expense_date': between(start, finish)})
+"""
+
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from bookkeeper.utils import GROUP_PERIODS, period_start, sort_key
+
+AMOUNT_FIELD = 'amount'
+DATE_FIELD = 'expense_date'
+CATEGORY_FIELD = 'category'
+GROUP_BY = (None, 'category', *GROUP_PERIODS)
+
+OPERATORS = {
+    'eq': '=',
+    'lt': '<',
+    'le': '<=',
+    'gt': '>',
+    'ge': '>=',
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Condition:
+    """
+    Условие на значение поля.
+    operator - eq, in, lt, le, gt, ge, between или range
+    value - значение для сравнения; для in - кортеж значений,
+    для between - пара (нижняя граница, верхняя граница), обе включительно,
+    для range - пара (нижняя граница включительно, верхняя - исключая)
+    Даты типов date и datetime сравниваются между собой, date считается
+    началом суток. Равенство None (в том числе None среди значений in)
+    означает отсутствие значения: в SQL это IS NULL.
+    """
+
+    operator: str
+    value: Any
+
+    def matches(self, value: Any) -> bool:
+        """ Проверить, удовлетворяет ли значение условию """
+        if self.operator == 'eq':
+            return bool(value == self.value)
+        if self.operator == 'in':
+            return value in self.value
+        if value is None:
+            return False
+        value = sort_key(value)
+        if self.operator == 'lt':
+            return bool(value < sort_key(self.value))
+        if self.operator == 'le':
+            return bool(value <= sort_key(self.value))
+        if self.operator == 'gt':
+            return bool(value > sort_key(self.value))
+        if self.operator == 'ge':
+            return bool(value >= sort_key(self.value))
+        low, high = map(sort_key, self.value)
+        if self.operator == 'range':
+            return bool(low <= value < high)
+        return bool(low <= value <= high)
+
+    def sql(self, column: str) -> tuple[str, list[Any]]:
+        """
+        Получить фрагмент SQL-условия для колонки и значения параметров
+        для подстановки вместо ?.
+        """
+        if self.operator == 'eq' and self.value is None:
+            return f'{column} IS NULL', []
+        if self.operator == 'in':
+            values = [value for value in self.value if value is not None]
+            parts = [f'{column} IN ({", ".join("?" * len(values))})'] if values else []
+            if len(values) != len(self.value):
+                parts.append(f'{column} IS NULL')
+            if not parts:
+                return '0', []
+            if len(parts) == 1:
+                return parts[0], values
+            return f'({" OR ".join(parts)})', values
+        if self.operator == 'between':
+            return f'{column} BETWEEN ? AND ?', list(self.value)
+        if self.operator == 'range':
+            return f'{column} >= ? AND {column} < ?', list(self.value)
+        return f'{column} {OPERATORS[self.operator]} ?', [self.value]
+
+    def sql_key(self) -> tuple[str, int, bool]:
+        """
+        Ключ формы SQL-фрагмента: условия с одинаковым ключом дают
+        одинаковый текст запроса и отличаются только параметрами.
+        """
+        if self.operator == 'in':
+            values = sum(value is not None for value in self.value)
+            return self.operator, values, values != len(self.value)
+        return self.operator, 0, self.operator == 'eq' and self.value is None
+
+
+def eq(value: Any) -> Condition:
+    """ Поле равно значению """
+    return Condition('eq', value)
+
+
+def isin(values: Iterable[Any]) -> Condition:
+    """ Поле равно одному из значений """
+    return Condition('in', tuple(values))
+
+
+def lt(value: Any) -> Condition:
+    """ Поле меньше значения """
+    return Condition('lt', value)
+
+
+def le(value: Any) -> Condition:
+    """ Поле меньше или равно значению """
+    return Condition('le', value)
+
+
+def gt(value: Any) -> Condition:
+    """ Поле больше значения """
+    return Condition('gt', value)
+
+
+def ge(value: Any) -> Condition:
+    """ Поле больше или равно значению """
+    return Condition('ge', value)
+
+
+def between(low: Any, high: Any) -> Condition:
+    """ Поле лежит между low и high, обе границы включительно """
+    return Condition('between', (low, high))
+
+
+def in_range(low: Any, high: Any) -> Condition:
+    """ Поле лежит в полуинтервале: не меньше low и меньше high """
+    return Condition('range', (low, high))
+
+
+def startswith(prefix: str) -> Condition:
+    """
+    Строковое поле начинается с prefix. Условие задается полуинтервалом
+    строк, поэтому для него используются индексы по полю.
+    """
+    end = prefix.rstrip(chr(0x10ffff))
+    if not end:
+        return ge(prefix)
+    last = ord(end[-1]) + 1
+    if 0xd800 <= last <= 0xdfff:
+        # суррогаты нельзя записать в БД, следующий за ними символ - U+E000
+        last = 0xe000
+    return in_range(prefix, end[:-1] + chr(last))
+
+
+def conditions(where: dict[str, Any] | None) -> list[tuple[str, Condition]]:
+    """
+    Привести словарь условий к списку пар (поле, условие), заменив обычные
+    значения на условие равенства.
+    """
+    if not where:
+        return []
+    return [(key, value if isinstance(value, Condition) else eq(value))
+            for key, value in where.items()]
+
+
+def order_key(order_by: str) -> tuple[str, bool]:
+    """
+    Разобрать поле сортировки: ведущий минус означает сортировку
+    по убыванию. Вернуть пару (поле, по убыванию).
+    """
+    if order_by.startswith('-'):
+        return order_by[1:], True
+    return order_by, False
+
+
+def group_key(obj: Any, group_by: str | None) -> Any:
+    """
+    Получить ключ группировки объекта для sum_amount: id категории,
+    начало дня/недели/месяца даты расхода или None без группировки.
+    """
+    if group_by is None:
+        return None
+    if group_by == 'category':
+        return getattr(obj, CATEGORY_FIELD)
+    return period_start(getattr(obj, DATE_FIELD), group_by)
@@ -2,144 +2,496 @@
 Модуль описывает репозиторий, работающий с sqlite
 """
 
-import sqlite3
 import os
 import logging
-from typing import Any, Type
+import sqlite3
+import dataclasses
+from operator import attrgetter
+from datetime import date, datetime
+from types import TracebackType, UnionType
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Sequence, Type, \
+    Union, get_args, get_origin
 from inspect import get_annotations
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.connection import ConnectionManager
+from bookkeeper.repository.migrations import rebuild_table, table_columns, \
+    unique_category_names
+from bookkeeper.utils import GROUP_PERIODS, from_microseconds, to_microseconds
+from bookkeeper.repository.query import AMOUNT_FIELD, CATEGORY_FIELD, DATE_FIELD, \
+    GROUP_BY, Condition, conditions, order_key
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_INDEXES: dict[str, tuple[str, ...]] = {
+    'expense': ('expense_date', 'category'),
+}
+# индексы схемы, которые не описать списком полей: их создают миграции,
+# а при ensure_schema - и репозиторий, так что схема БД без миграций та же
+SCHEMA_INDEXES: dict[str, Callable[[sqlite3.Connection], None]] = {
+    'category': unique_category_names,
+}
+
+# даты хранятся в колонках INTEGER как число микросекунд от начала эпохи,
+# так что сравнения и сортировка по датам - сравнения целых чисел;
+# адаптеры переводят в это представление и параметры запросов
+sqlite3.register_adapter(datetime, to_microseconds)
+sqlite3.register_adapter(date, to_microseconds)
+
+# выражение даты для функций даты sqlite
+_DATE_SQL = f"{DATE_FIELD} / 1000000.0, 'unixepoch'"
+
+# выражения для ключей группировки sum_amount; неделя начинается
+# с понедельника: 'weekday 0' переносит дату на ближайшее воскресенье
+GROUP_SQL = {
+    'category': CATEGORY_FIELD,
+    'day': f"date({_DATE_SQL})",
+    'week': f"date({_DATE_SQL}, 'weekday 0', '-6 days')",
+    'month': f"date({_DATE_SQL}, 'start of month')",
+    'year': f"date({_DATE_SQL}, 'start of year')",
+}
+
+COLUMN_TYPES: dict[Any, str] = {
+    int: 'INTEGER',
+    bool: 'INTEGER',
+    float: 'REAL',
+    datetime: 'INTEGER',
+    date: 'INTEGER',
+    str: 'TEXT',
+}
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    """ Для аннотации вида X | None вернуть X, иначе саму аннотацию """
+    if get_origin(annotation) in (Union, UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def column_type(annotation: Any) -> str:
+    """
+    Определить тип колонки таблицы по аннотации поля модели: целые числа
+    и даты - INTEGER, дробные числа - REAL, остальное - TEXT
+    """
+    return COLUMN_TYPES.get(_unwrap_optional(annotation), 'TEXT')
+
+
+def converter(annotation: Any) -> Callable[[Any], Any] | None:
+    """
+    Получить функцию преобразования значения из БД к типу аннотации поля.
+    Для типов, которые sqlite3 и так возвращает как есть, вернуть None.
+    """
+    annotation = _unwrap_optional(annotation)
+    if annotation is datetime:
+        return from_microseconds
+    if annotation is date:
+        return lambda value: from_microseconds(value).date()
+    if annotation in (int, float):
+        return annotation  # type: ignore[no-any-return]
+    return None
+
+
+def storage_converter(annotation: Any) -> Callable[[Any], Any] | None:
+    """
+    Получить функцию преобразования значения, записанного в БД старыми
+    версиями (даты - строками ISO, числа - строками), к хранимому
+    сейчас представлению. Для текстовых полей вернуть None.
+    """
+    annotation = _unwrap_optional(annotation)
+    if annotation in (datetime, date):
+        return lambda value: value if isinstance(value, int) else to_microseconds(value)
+    if annotation in (int, float):
+        return annotation  # type: ignore[no-any-return]
+    return None
+
 
-def gettype(attr: Any) -> str:
+def make_row_factory(cls: Type[T], fields: Sequence[str]) -> Callable[[Sequence[Any]], T]:
     """
-    Определить тип аттрибута таблиы
+    Собрать функцию, создающую объект модели из строки (id, *fields).
+    Если модель - dataclass, у которого параметры конструктора совпадают
+    с fields и pk идет последним, объект создается одним позиционным вызовом
+    конструктора, иначе атрибуты присваиваются по одному.
+    Значения приводятся к типам из аннотаций (см. converter), NULL остается None.
     """
-    if isinstance(attr, int) or attr is None:
-        return 'INTEGER'
-    return 'TEXT'
+    annotations = get_annotations(cls, eval_str=True)
+    namespace: dict[str, Any] = {'cls': cls}
+    args = []
+    for i, field in enumerate(fields, 1):
+        conv = converter(annotations[field])
+        if conv is None:
+            args.append(f'row[{i}]')
+        else:
+            namespace[f'conv_{i}'] = conv
+            args.append(f'(None if row[{i}] is None else conv_{i}(row[{i}]))')
+    if dataclasses.is_dataclass(cls) and [
+            f.name for f in dataclasses.fields(cls) if f.init] == [*fields, 'pk']:
+        body = [f'    return cls({", ".join(args)}, row[0])']
+    else:
+        namespace['new'] = object.__new__
+        body = ['    obj = new(cls)', '    obj.pk = row[0]',
+                *(f'    obj.{field} = {arg}' for field, arg in zip(fields, args)),
+                '    return obj']
+    exec('\n'.join(['def factory(row):', *body]), namespace)  # pylint: disable=exec-used
+    return namespace['factory']  # type: ignore[no-any-return]
+
+
+def make_values_getter(fields: Sequence[str]) -> Callable[[Any], tuple[Any, ...]]:
+    """
+    Собрать функцию, возвращающую кортеж значений полей объекта
+    для параметров запросов (одним вызовом attrgetter).
+    """
+    if len(fields) == 1:
+        getter = attrgetter(fields[0])
+        return lambda obj: (getter(obj),)
+    return attrgetter(*fields)
 
 
 class SqliteRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий c SQLite БД. Хранит данные в файле bookkeeper.db.
+    Соединение берется из менеджера соединений; если менеджер не передан,
+    используется общий менеджер для данной БД, так что все репозитории
+    на одном файле работают через одно соединение в каждом потоке.
+    Переданный менеджер закрывает тот, кто его создал; close() репозитория
+    только освобождает ссылку на общий менеджер.
+    indexes - поля, по которым создаются индексы; по умолчанию берутся
+    из DEFAULT_INDEXES по имени таблицы (индексы SCHEMA_INDEXES создаются
+    всегда)
+    ensure_schema - создать таблицу и индексы (и привести типы колонок)
+    при создании репозитория; если схемой управляют миграции (migrations),
+    передается False и DDL-запросы не выполняются
     """
 
     database: str
     table_name: str
     fields: dict
     cls: Type[T]
+    manager: ConnectionManager
+    indexes: tuple[str, ...]
 
-    def __init__(self, database: str, cls: Type[T]) -> None:
+    def __init__(self, database: str, cls: Type[T],
+                 manager: ConnectionManager | None = None,
+                 indexes: Iterable[str] | None = None,
+                 ensure_schema: bool = True) -> None:
         self.database = database
+        # ссылка на общий менеджер, которую освобождает close()
+        self._shared_manager = manager is None
+        self.manager = manager or ConnectionManager.for_database(database)
         self.table_name = cls.__name__.lower()
         self.fields = get_annotations(cls, eval_str=True)
         self.fields.pop('pk')
         self.cls = cls
+        self.queries = self._build_queries()
+        self.row_factory = make_row_factory(cls, list(self.fields))
+        self.values = make_values_getter(list(self.fields))
+        self._where_queries: dict[tuple[Any, ...], str] = {}
+        self.indexes = tuple(DEFAULT_INDEXES.get(self.table_name, ())
+                             if indexes is None else indexes)
         if not os.path.exists(database+'.db'):
             with open(database+'.db', 'w'):
                 pass
-        with sqlite3.connect(self.database) as con:
-            values = [(f'{i}', gettype(getattr(cls, i))) for i in self.fields]
-            que = ', '.join([f'{i} {tp}' for i, tp in values])
-            cur = con.cursor()
-            query = (f"""CREATE TABLE IF NOT EXISTS {self.table_name} 
-                         (id INTEGER PRIMARY KEY, {que})""")
-            cur.execute(query)
-        con.close()
+        if ensure_schema:
+            with self.manager.connection() as con:
+                self._migrate_columns(con)
+                self._create_indexes(con)
+
+    def _build_queries(self) -> dict[str, str]:
+        """
+        Сгенерировать тексты запросов для модели. Значения передаются
+        только через параметры ?, поэтому тексты не меняются от вызова
+        к вызову и берутся соединением из кэша скомпилированных запросов.
+        """
+        table = self.table_name
+        names = ', '.join(self.fields)
+        placeholders = ', '.join('?' * len(self.fields))
+        setter = ', '.join(f'{name} = ?' for name in self.fields)
+        return {
+            'create': self._create_query(table),
+            'insert': f'INSERT INTO {table} ({names}) VALUES ({placeholders})',
+            'insert_with_id': f'INSERT INTO {table} (id, {names}) '
+                              f'VALUES (?, {placeholders})',
+            'next_id': f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}',
+            'select': f'SELECT id, {names} FROM {table}',
+            'get': f'SELECT id, {names} FROM {table} WHERE id = ?',
+            'update': f'UPDATE {table} SET {setter} WHERE id = ?',
+            'delete': f'DELETE FROM {table} WHERE id = ?',
+        }
+
+    def _create_query(self, table: str) -> str:
+        """ Запрос создания таблицы с колонками по аннотациям модели """
+        columns = ', '.join(f'{name} {column_type(annotation)}'
+                            for name, annotation in self.fields.items())
+        return f'CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, {columns})'
+
+    def _column(self, field: str) -> str:
+        """ Получить имя колонки для поля модели, проверив что оно существует """
+        if field == 'pk':
+            return 'id'
+        if field not in self.fields:
+            raise ValueError(f'unknown field {field} for {self.table_name}')
+        return field
+
+    def _select_where(self, conds: list[tuple[str, Condition]],
+                      order_by: str | None, paged: bool) -> str:
+        """
+        Получить из кэша запрос выборки с заданной формой условий, сортировкой
+        и постраничным выводом, сгенерировав его при первом обращении.
+        """
+        key = (tuple((field, cond.sql_key()) for field, cond in conds), order_by, paged)
+        query = self._where_queries.get(key)
+        if query is None:
+            query = self.queries['select']
+            if conds:
+                query += ' WHERE ' + ' AND '.join(
+                    cond.sql(self._column(field))[0] for field, cond in conds)
+            if order_by is not None:
+                field, desc = order_key(order_by)
+                query += f' ORDER BY {self._column(field)}{" DESC" if desc else ""}, id'
+            if paged:
+                query += ' LIMIT ? OFFSET ?'
+            self._where_queries[key] = query
+        return query
+
+    def _sum_where(self, conds: list[tuple[str, Condition]], group_by: str | None) -> str:
+        """
+        Получить из кэша запрос суммы amount с заданной формой условий
+        и группировкой, сгенерировав его при первом обращении.
+        """
+        key = ('sum', tuple((field, cond.sql_key()) for field, cond in conds), group_by)
+        query = self._where_queries.get(key)
+        if query is None:
+            group = 'NULL' if group_by is None else GROUP_SQL[group_by]
+            query = (f'SELECT {group}, SUM({self._column(AMOUNT_FIELD)}) '
+                     f'FROM {self.table_name}')
+            if conds:
+                query += ' WHERE ' + ' AND '.join(
+                    cond.sql(self._column(field))[0] for field, cond in conds)
+            if group_by is not None:
+                query += f' GROUP BY {group}'
+            self._where_queries[key] = query
+        return query
+
+    def _migrate_columns(self, con: sqlite3.Connection) -> None:
+        """
+        Создать таблицу или привести существующую к типам колонок из
+        аннотаций модели. Если типы колонок не совпадают (в старых БД даты
+        и суммы хранились в TEXT), таблица пересоздается на месте одной
+        транзакцией: данные копируются с преобразованием значений.
+        """
+        table = self.table_name
+        declared = table_columns(con, table)
+        if not declared:
+            con.execute(self.queries['create'])
+            return
+        if all(declared.get(name) == column_type(annotation)
+               for name, annotation in self.fields.items()):
+            return
+        logger.info('migrating table %s to typed columns', table)
+        converters = {name: conv for name, annotation in self.fields.items()
+                      if (conv := storage_converter(annotation)) is not None}
+        if not con.in_transaction:
+            con.execute('BEGIN IMMEDIATE')
+        rebuild_table(con, table, self._create_query('{table}'), converters)
+
+    def _create_indexes(self, con: sqlite3.Connection) -> None:
+        for field in self.indexes:
+            con.execute(f'CREATE INDEX IF NOT EXISTS {self.table_name}_{field}_idx '
+                        f'ON {self.table_name} ({self._column(field)})')
+        create_schema_indexes = SCHEMA_INDEXES.get(self.table_name)
+        if create_schema_indexes is not None:
+            create_schema_indexes(con)
+
+    def close(self) -> None:
+        """
+        Освободить ссылку на общий менеджер соединений: соединения
+        закрываются, когда закрыт последний использующий его репозиторий.
+        Переданный при создании менеджер не закрывается. Повторный вызов
+        ничего не делает.
+        """
+        if self._shared_manager:
+            self._shared_manager = False
+            self.manager.release()
+
+    def flush(self) -> None:
+        """
+        Зафиксировать сгруппированные записи (см. режим группировки
+        ConnectionManager). Фиксируются записи всех репозиториев,
+        работающих через тот же менеджер в текущем потоке.
+        """
+        self.manager.flush()
+
+    def transaction(self) -> ContextManager[sqlite3.Connection]:
+        """
+        Контекстный менеджер транзакции: записи всех репозиториев на том же
+        менеджере внутри блока фиксируются вместе или откатываются при ошибке.
+
+            with repo.transaction():
+                repo.add(a)
+                repo.update(b)
+        """
+        return self.manager.transaction()
+
+    def __enter__(self) -> 'SqliteRepository[T]':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        self.close()
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
-        names = ', '.join(self.fields.keys())
-        values = [getattr(obj, x) for x in self.fields]
-        with sqlite3.connect(self.database) as con:
-            cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
-            cur.execute(
-                f"""INSERT INTO {self.table_name} ({names}) VALUES ({', '.join('?' * len(self.fields))})""",
-                values
-            )
+        values = self.values(obj)
+        with self.manager.write() as con:
+            cur = con.execute(self.queries['insert'], values)
             if not cur.lastrowid:
                 raise ValueError("No assignable pk")
             obj.pk = int(cur.lastrowid)
-        con.close()
         return obj.pk
 
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов одной транзакцией. Id назначаются явно
+        подряд после максимального id в таблице, пока держится блокировка
+        на запись, поэтому порядок id совпадает с порядком объектов.
+        """
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        if not objs:
+            return []
+        with self.manager.write(len(objs)) as con:
+            start = con.execute(self.queries['next_id']).fetchone()[0]
+            pks = list(range(start, start + len(objs)))
+            con.executemany(
+                self.queries['insert_with_id'],
+                ((pk, *self.values(obj))
+                 for pk, obj in zip(pks, objs))
+            )
+        for pk, obj in zip(pks, objs):
+            obj.pk = pk
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """
+        Обновить несколько объектов одной транзакцией. Если хотя бы одной
+        записи нет в БД, изменения откатываются.
+        """
+        objs = list(objs)
+        with self.manager.write(len(objs)) as con:
+            cur = con.executemany(
+                self.queries['update'],
+                ((*self.values(obj), obj.pk) for obj in objs)
+            )
+            if cur.rowcount != len(objs):
+                raise ValueError('Часть обновляемых записей не существует в БД.')
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """
+        Удалить несколько записей одной транзакцией. Если хотя бы одной
+        записи нет в БД, изменения откатываются.
+        """
+        pks = list(pks)
+        with self.manager.write(len(pks)) as con:
+            cur = con.executemany(
+                self.queries['delete'],
+                ((pk,) for pk in pks)
+            )
+            if cur.rowcount != len(pks):
+                raise KeyError('Часть удаляемых записей не существует в БД.')
+
     def get_obj(self, res: Any) -> T:
         """ Получаем объект из БД """
 
-        obj: T = self.cls
-        obj.pk = res[0]
-        for x, r in zip(self.fields, res[1:]):
-            setattr(obj, x, r)
-        return obj
+        return self.row_factory(res)
 
     def get(self, pk: int) -> T | None:
         """ Получить объект по id """
 
-        with sqlite3.connect(self.database) as con:
-            query = f"""SELECT * FROM {self.table_name} WHERE id = {pk}"""
-            cur = con.cursor()
-            result = cur.execute(query).fetchone()
-            if result is None:
-                return None
-            obj = self.get_obj(result)
-        con.close()
-        return obj
+        result = self.manager.connection().execute(
+            self.queries['get'], (pk,)).fetchone()
+        if result is None:
+            return None
+        return self.get_obj(result)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | None = None,
+                limit: int | None = None,
+                offset: int = 0) -> list[T]:
         """
         Получить все записи по некоторому условию
         where - условие в виде словаря {'название_поля': значение}
-        если условие не задано (по умолчанию пусто), вернуть все записи
+        если условие не задано (по умолчанию пусто), вернуть все записи.
+        Значением может быть условие из модуля query (isin, lt, between и т.д.).
+        order_by - поле для сортировки, с ведущим минусом - по убыванию
+        limit, offset - вернуть не более limit записей, пропустив первые offset
         """
 
-        conditions = ''
-        if where:
-            condition = ''
-            for key, value in where.items():
-                condition += f' {key} = {value} AND'
-            conditions += condition.rsplit(' ', 1)[0]
-            query = f"""SELECT * FROM {self.table_name} WHERE""" + conditions
-            print(query)
-        else:
-            query = f"""SELECT * FROM {self.table_name}"""
-        with sqlite3.connect(self.database) as con:
-            cur = con.cursor()
-            results = cur.execute(query).fetchall()
-            print(results)
-            objs = [self.get_obj(result) for result in results]
-        con.close()
-        return objs
+        conds = conditions(where)
+        paged = limit is not None or offset != 0
+        params = [param for field, cond in conds for param in cond.sql(field)[1]]
+        if paged:
+            params += [-1 if limit is None else limit, offset]
+        cur = self.manager.connection().execute(
+            self._select_where(conds, order_by, paged), params)
+        return list(map(self.row_factory, cur.fetchall()))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Получить записи по условию в виде генератора. Строки читаются
+        из курсора через fetchmany порциями по batch_size.
+        """
+
+        conds = conditions(where)
+        params = [param for field, cond in conds for param in cond.sql(field)[1]]
+        cur = self.manager.connection().execute(
+            self._select_where(conds, order_by, False), params)
+        try:
+            while rows := cur.fetchmany(batch_size):
+                yield from map(self.row_factory, rows)
+        finally:
+            cur.close()
 
-    def check_pk(self, cur: Any, pk: int) -> bool:
+    def sum_amount(self, where: dict[str, Any] | None = None,
+                   group_by: str | None = None) -> dict[Any, Any]:
         """
-        Узнать есть ли в БД запись с данным pk.
+        Посчитать сумму amount запросом SELECT SUM ... GROUP BY.
+        Параметры и результат - как в AbstractRepository.sum_amount.
         """
 
-        res = cur.execute(f"""SELECT * FROM {self.table_name} WHERE id = {pk}""")
-        return res is not None
+        if group_by not in GROUP_BY:
+            raise ValueError(f'unknown grouping {group_by}')
+        conds = conditions(where)
+        params = [param for field, cond in conds for param in cond.sql(field)[1]]
+        rows = self.manager.connection().execute(
+            self._sum_where(conds, group_by), params).fetchall()
+        to_amount = converter(self.fields[AMOUNT_FIELD]) or (lambda value: value)
+        to_key: Callable[[Any], Any] = lambda value: value
+        if group_by in GROUP_PERIODS:
+            to_key = date.fromisoformat
+        elif group_by == 'category':
+            to_key = converter(self.fields[CATEGORY_FIELD]) or to_key
+        return {None if key is None else to_key(key):
+                0 if total is None else to_amount(total)
+                for key, total in rows}
 
     def update(self, obj: T) -> None:
         """ Обновить данные об объекте. Объект должен содержать поле pk. """
 
-        values = tuple((getattr(obj, x)) for x in self.fields)
-        setter = ', '.join([f'{col} = {val}' for col, val in zip(self.fields, values)])
-        with sqlite3.connect(self.database) as con:
-            if not self.check_pk(con.cursor(), obj.pk):
-                raise ValueError(f"""Обновляемой записи с id={obj.pk} не существует в БД.""")
-            query = f"""UPDATE {self.table_name} SET {setter} WHERE id = {obj.pk}"""
-            con.cursor().execute(query)
-        con.close()
+        values = (*self.values(obj), obj.pk)
+        with self.manager.write() as con:
+            if con.execute(self.queries['update'], values).rowcount == 0:
+                raise ValueError(
+                    f'Обновляемой записи с id={obj.pk} не существует в БД.')
 
     def delete(self, pk: int) -> None:
         """ Удалить запись c заданным pk"""
 
-        with sqlite3.connect(self.database) as con:
-            if not self.check_pk(con.cursor(), pk):
+        with self.manager.write() as con:
+            if con.execute(self.queries['delete'], (pk,)).rowcount == 0:
                 raise KeyError(f"В БД не существует записи с id={pk}.")
-            query = f"""DELETE FROM {self.table_name} WHERE id = {pk}"""
-            con.cursor().execute(query)
-        con.close()
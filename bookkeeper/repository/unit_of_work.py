@@ -0,0 +1,159 @@
+"""
+Модуль описывает единицу работы (unit of work) над несколькими репозиториями
+
+Единица работы связывает репозитории одной БД общей транзакцией и ведет
+карту идентичности: в пределах блока with каждой записи соответствует
+ровно один объект. Изменения загруженных объектов отслеживаются
+и записываются при выходе из блока одним update_many на каждую модель,
+удаления - одним delete_many. Все изменения фиксируются вместе или
+откатываются при ошибке.
+
+    with UnitOfWork([category_repository, expense_repository]) as uow:
+        for expense in uow.get_all(Expense, {'category': pk}):
+            expense.category = None
+        uow.delete(uow.get(Category, pk))
+"""
+
+from types import TracebackType
+from typing import Any, ContextManager, Iterable
+
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+
+
+class UnitOfWork:
+    """
+    Единица работы над репозиториями, работающими через один менеджер
+    соединений. Объекты выбираются по классу модели; новые объекты
+    записываются сразу (чтобы получить pk), измененные и удаленные -
+    при выходе из блока with или вызове flush.
+    """
+
+    def __init__(self, repositories: Iterable[SqliteRepository[Any]]) -> None:
+        self.repositories = {repo.cls: repo for repo in repositories}
+        managers = {id(repo.manager): repo.manager
+                    for repo in self.repositories.values()}
+        if len(managers) != 1:
+            raise ValueError('repositories of a unit of work must share '
+                             'one connection manager')
+        self.manager = next(iter(managers.values()))
+        self._transaction: ContextManager[Any] | None = None
+        self._identity: dict[tuple[type, int], Any] = {}
+        self._snapshots: dict[tuple[type, int], tuple[Any, ...]] = {}
+        self._deleted: dict[type, list[int]] = {}
+
+    def __enter__(self) -> 'UnitOfWork':
+        if self._transaction is not None:
+            raise RuntimeError('unit of work is already active')
+        self._transaction = self.manager.transaction()
+        self._transaction.__enter__()
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        transaction = self._active()
+        self._transaction = None
+        try:
+            if exc_type is None:
+                try:
+                    self._flush()
+                except BaseException as error:
+                    transaction.__exit__(type(error), error, error.__traceback__)
+                    raise
+            transaction.__exit__(exc_type, exc_value, traceback)
+        finally:
+            self._identity.clear()
+            self._snapshots.clear()
+            self._deleted.clear()
+
+    def _active(self) -> ContextManager[Any]:
+        if self._transaction is None:
+            raise RuntimeError('unit of work is not active, use it in a with block')
+        return self._transaction
+
+    def _repository(self, cls: type) -> SqliteRepository[Any]:
+        try:
+            return self.repositories[cls]
+        except KeyError:
+            raise ValueError(f'no repository for {cls.__name__}') from None
+
+    def _snapshot(self, obj: Any) -> tuple[Any, ...]:
+        return tuple(getattr(obj, field)
+                     for field in self._repository(type(obj)).fields)
+
+    def _register(self, obj: Any) -> Any:
+        """ Вернуть объект из карты идентичности, добавив в нее новый """
+        key = (type(obj), obj.pk)
+        known = self._identity.get(key)
+        if known is not None:
+            return known
+        self._identity[key] = obj
+        self._snapshots[key] = self._snapshot(obj)
+        return obj
+
+    def get(self, cls: type, pk: int) -> Any:
+        """ Получить объект по id; повторный вызов вернет тот же объект """
+        self._active()
+        known = self._identity.get((cls, pk))
+        if known is not None:
+            return known
+        if pk in self._deleted.get(cls, ()):
+            return None
+        obj = self._repository(cls).get(pk)
+        return None if obj is None else self._register(obj)
+
+    def get_all(self, cls: type, where: dict[str, Any] | None = None,
+                order_by: str | None = None) -> list[Any]:
+        """
+        Получить объекты по условию (см. AbstractRepository.get_all).
+        Условие проверяется по БД: до flush несохраненные изменения
+        загруженных объектов в нем не учитываются.
+        """
+        self._active()
+        self._flush_deletes()
+        return [self._register(obj)
+                for obj in self._repository(cls).get_all(where, order_by)]
+
+    def add(self, obj: Any) -> int:
+        """ Добавить объект; он записывается сразу и получает pk """
+        self._active()
+        pk = self._repository(type(obj)).add(obj)
+        self._register(obj)
+        return pk
+
+    def delete(self, obj: Any) -> None:
+        """ Пометить объект на удаление """
+        self._active()
+        key = (type(obj), obj.pk)
+        self._repository(type(obj))
+        self._identity.pop(key, None)
+        self._snapshots.pop(key, None)
+        self._deleted.setdefault(type(obj), []).append(obj.pk)
+
+    def flush(self) -> None:
+        """
+        Записать изменения и удаления в БД, не завершая транзакцию.
+        """
+        self._active()
+        self._flush()
+
+    def _flush(self) -> None:
+        for cls, repo in self.repositories.items():
+            dirty = []
+            for (obj_cls, pk), obj in self._identity.items():
+                if obj_cls is cls:
+                    snapshot = self._snapshot(obj)
+                    if snapshot != self._snapshots[(obj_cls, pk)]:
+                        dirty.append(obj)
+                        self._snapshots[(obj_cls, pk)] = snapshot
+            if dirty:
+                repo.update_many(dirty)
+        self._flush_deletes()
+
+    def _flush_deletes(self) -> None:
+        # удаления идут в порядке, обратном порядку репозиториев:
+        # сначала зависимые записи (расходы), затем категории
+        for cls, repo in reversed(self.repositories.items()):
+            pks = self._deleted.pop(cls, None)
+            if pks:
+                repo.delete_many(pks)
@@ -1,16 +1,30 @@
 """
 Простой тестовый скрипт для терминала
+
+Без аргументов работает в интерактивном режиме. С ключом --batch читает
+команды вида "1500 мясо" из файла (или из stdin, если вместо имени
+файла указан -) и записывает расходы пакетами:
+
+    python -m bookkeeper.simple_client --batch receipts.txt
+    cat receipts.txt | python -m bookkeeper.simple_client --batch -
 """
 
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.cached_repository import CachedRepository
 from bookkeeper.repository.sqlite_repository import SqliteRepository
-from bookkeeper.utils import read_tree
-
-cat_repo = SqliteRepository[Category]("simple_bookkeeper", Category)
-exp_repo = SqliteRepository[Expense]("simple_bookkeeper", Expense)
+from bookkeeper.utils import iter_tree
 
-cats = '''
+CATS = '''
 продукты
     мясо
         сырое мясо
@@ -20,26 +34,153 @@ cats = '''
 одежда
 '''.splitlines()
 
-Category.create_from_tree(read_tree(cats), cat_repo)
-
-while True:
-    try:
-        cmd = input('$> ')
-    except EOFError:
-        break
-    if not cmd:
-        continue
-    if cmd == 'категории':
-        print(*cat_repo.get_all(), sep='\n')
-    elif cmd == 'расходы':
-        print(*exp_repo.get_all(), sep='\n')
-    elif cmd[0].isdecimal():
-        amount, name = cmd.split(maxsplit=1)
+
+@dataclass
+class BatchStats:
+    """
+    Итоги пакетной записи.
+    added - число записанных расходов
+    skipped - число пропущенных строк с ошибками
+    seconds - время работы
+    """
+
+    added: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """ Число записанных расходов в секунду """
+        return self.added / self.seconds if self.seconds else 0.0
+
+
+def parse_command(line: str) -> tuple[int, str] | None:
+    """
+    Разобрать команду добавления расхода "сумма категория".
+    Вернуть пару (сумма, название категории) или None, если строка
+    не является такой командой.
+    """
+    parts = line.split(maxsplit=1)
+    if len(parts) != 2 or not parts[0].isdecimal():
+        return None
+    return int(parts[0]), parts[1].strip()
+
+
+def category_names(cat_repo: AbstractRepository[Category]) -> dict[str, int]:
+    """
+    Получить словарь название -> id категории. Для повторяющихся
+    названий берется категория с меньшим id, как в Category.get_by_name.
+    """
+    names: dict[str, int] = {}
+    for cat in cat_repo.get_all(order_by='pk'):
+        names.setdefault(cat.name, cat.pk)
+    return names
+
+
+def read_expenses(lines: Iterable[str], names: dict[str, int],
+                  stats: BatchStats, errors: TextIO) -> Iterator[Expense]:
+    """
+    Лениво разобрать строки с командами в расходы. Пустые строки
+    пропускаются, о строках с ошибками пишется в errors.
+    """
+    now = datetime.now()
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        command = parse_command(line)
+        if command is None:
+            print(f'строка {number}: не удалось разобрать {line.strip()!r}', file=errors)
+            stats.skipped += 1
+            continue
+        amount, name = command
+        pk = names.get(name)
+        if pk is None:
+            print(f'строка {number}: категория {name} не найдена', file=errors)
+            stats.skipped += 1
+            continue
+        yield Expense(amount, pk, now, now)
+
+
+def add_expenses(lines: Iterable[str],
+                 cat_repo: AbstractRepository[Category],
+                 exp_repo: AbstractRepository[Expense],
+                 batch_size: int = 1000,
+                 errors: TextIO | None = None) -> BatchStats:
+    """
+    Записать расходы из строк с командами "сумма категория". Строки
+    читаются потоком, категории ищутся в словаре, загруженном один раз,
+    расходы записываются вызовами add_many по batch_size штук
+    (в SqliteRepository - одна транзакция на пакет). О пропущенных
+    строках пишется в errors (по умолчанию sys.stderr).
+    """
+    stats = BatchStats()
+    start = time.perf_counter()
+    expenses = read_expenses(lines, category_names(cat_repo), stats,
+                             errors or sys.stderr)
+    while batch := list(islice(expenses, batch_size)):
+        exp_repo.add_many(batch)
+        stats.added += len(batch)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def run_interactive(cat_repo: AbstractRepository[Category],
+                    exp_repo: AbstractRepository[Expense]) -> None:
+    """ Выполнять команды, вводимые пользователем, до конца ввода """
+    while True:
         try:
-            cat = cat_repo.get_all({'name': name})[0]
-        except IndexError:
-            print(f'категория {name} не найдена')
+            cmd = input('$> ')
+        except EOFError:
+            break
+        if not cmd:
             continue
-        exp = Expense(int(amount), cat.pk)
-        exp_repo.add(exp)
-        print(exp)
+        if cmd == 'категории':
+            print(*cat_repo.get_all(), sep='\n')
+        elif cmd == 'расходы':
+            print(*exp_repo.get_all(), sep='\n')
+        elif cmd[0].isdecimal():
+            command = parse_command(cmd)
+            if command is None:
+                print('формат команды: сумма категория')
+                continue
+            amount, name = command
+            cat = Category.get_by_name(name, cat_repo)
+            if cat is None:
+                print(f'категория {name} не найдена')
+                continue
+            exp = Expense(amount, cat.pk)
+            exp_repo.add(exp)
+            print(exp)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """ Разобрать аргументы командной строки и запустить клиент """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--batch', metavar='FILE',
+                        help='записать расходы из файла (- для stdin)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='число расходов в одной транзакции')
+    args = parser.parse_args(argv)
+    if args.batch_size < 1:
+        parser.error('--batch-size must be positive')
+
+    cat_repo = CachedRepository(SqliteRepository[Category]("simple_bookkeeper", Category))
+    exp_repo = SqliteRepository[Expense]("simple_bookkeeper", Expense)
+
+    if not cat_repo.get_all(limit=1):
+        Category.create_from_tree(iter_tree(CATS), cat_repo)
+
+    if args.batch is None:
+        run_interactive(cat_repo, exp_repo)
+        return
+    if args.batch == '-':
+        stats = add_expenses(sys.stdin, cat_repo, exp_repo, args.batch_size)
+    else:
+        with open(args.batch, encoding='utf-8') as file:
+            stats = add_expenses(file, cat_repo, exp_repo, args.batch_size)
+    print(f'добавлено расходов: {stats.added}, пропущено строк: {stats.skipped}, '
+          f'{stats.seconds:.2f} с ({stats.rate:.0f} в секунду)')
+
+
+if __name__ == '__main__':
+    main()
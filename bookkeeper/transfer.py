@@ -0,0 +1,386 @@
+"""
+Модуль описывает импорт и экспорт данных в файлы CSV и JSON Lines
+
+Записи читаются и пишутся потоком через генераторы: из файла строки
+читаются по одной и записываются в репозиторий порциями по batch_size
+вызовами add_many, а экспорт читает репозиторий через iter_all. Поэтому
+расход памяти не зависит от размера файла (кроме категорий, которых
+немного: они загружаются целиком).
+
+В файлах категории расходов и родители категорий указываются путями
+от категории верхнего уровня: названиями через '/' (например,
+'продукты/мясо'; '/' и '\\' в названиях экранируются обратной косой
+чертой), так как одинаковые названия допустимы у разных родителей.
+Путь из одного названия, которого нет среди категорий верхнего уровня,
+относится к подкатегории с этим названием, если она одна (так читаются
+файлы, где указывались только названия). Даты записываются строками ISO.
+Категории расходов, которых нет в БД, создаются при импорте.
+
+Функции принимают progress - функцию, которую вызывают после каждой
+порции с числом обработанных записей. Каждая порция импорта записывается
+своей транзакцией: при ошибке в файле уже записанные порции остаются.
+"""
+
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Iterator, TextIO
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category, CategoryIndex
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+
+FORMATS = ('csv', 'jsonl')
+FIELDS = {
+    'expense': ('amount', 'category', 'expense_date', 'added_date', 'comment'),
+    'category': ('name', 'parent'),
+    'budget': ('amount', 'period'),
+}
+
+Progress = Callable[[int], None]
+
+
+def guess_format(path: str) -> str:
+    """ Определить формат файла по расширению (.csv, .jsonl или .json) """
+    suffix = path.rsplit('.', 1)[-1].lower()
+    if suffix == 'csv':
+        return 'csv'
+    if suffix in ('jsonl', 'json', 'ndjson'):
+        return 'jsonl'
+    raise ValueError(f'cannot guess format of {path}, use one of {FORMATS}')
+
+
+def read_rows(file: TextIO, fmt: str,
+              fields: tuple[str, ...]) -> Iterator[tuple[Any, ...]]:
+    """
+    Лениво прочитать записи из файла в виде кортежей значений полей fields.
+    В CSV первая строка - заголовок, значения - строки; отсутствующие
+    поля заменяются на None (в CSV пустая строка тоже означает отсутствие
+    значения, ее нужно проверять при разборе).
+    """
+    if fmt == 'csv':
+        reader = csv.reader(file)
+        header = next(reader, [])
+        columns = [header.index(field) if field in header else None for field in fields]
+        if None not in columns:
+            getter = itemgetter(*columns) if len(columns) > 1 else \
+                lambda row: (row[columns[0]],)
+            return map(getter, reader)
+        return (tuple(None if col is None else row[col] for col in columns)
+                for row in reader)
+    if fmt == 'jsonl':
+        return (tuple(map(json.loads(line).get, fields)) for line in file if line.strip())
+    raise ValueError(f'unknown format {fmt}')
+
+
+def write_rows(rows: Iterable[tuple[Any, ...]], file: TextIO, fmt: str,
+               fields: tuple[str, ...], batch_size: int = 10000,
+               progress: Progress | None = None) -> int:
+    """
+    Записать кортежи значений полей fields в файл, вернуть число записей.
+    None в CSV записывается пустой строкой, в JSON Lines - null.
+    """
+    if fmt == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        write: Callable[[tuple[Any, ...]], Any] = writer.writerow
+    elif fmt == 'jsonl':
+        def write(row: tuple[Any, ...]) -> Any:
+            return file.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False)
+                              + '\n')
+    else:
+        raise ValueError(f'unknown format {fmt}')
+    count = 0
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        for row in batch:
+            write(row)
+        count += len(batch)
+        if progress is not None:
+            progress(count)
+    return count
+
+
+def _add_batches(objs: Iterator[Any], repo: AbstractRepository[Any],
+                 batch_size: int, progress: Progress | None) -> int:
+    count = 0
+    while batch := list(islice(objs, batch_size)):
+        repo.add_many(batch)
+        count += len(batch)
+        if progress is not None:
+            progress(count)
+    return count
+
+
+def _date(value: str | None, default: datetime) -> datetime:
+    """ Разобрать дату ISO; пустое значение заменяется на default """
+    return datetime.fromisoformat(value) if value else default
+
+
+def _isoformat(value: datetime | None) -> str | None:
+    return None if value is None else value.isoformat(' ')
+
+
+def join_path(names: Iterable[str]) -> str:
+    """ Собрать путь категории из названий, экранировав в них '/' и '\\' """
+    return '/'.join(name.replace('\\', '\\\\').replace('/', '\\/') for name in names)
+
+
+def split_path(path: str) -> list[str]:
+    """ Разобрать путь категории на названия (обратно к join_path) """
+    names: list[str] = []
+    name: list[str] = []
+    escaped = False
+    for char in path:
+        if escaped:
+            name.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '/':
+            names.append(''.join(name))
+            name = []
+        else:
+            name.append(char)
+    names.append(''.join(name))
+    return names
+
+
+def _child_path(parent: str | None, name: str) -> str:
+    return join_path([name]) if parent is None else f'{parent}/{join_path([name])}'
+
+
+def _name(path: str) -> str:
+    return split_path(path)[-1]
+
+
+class CategoryPaths:
+    """
+    Категории репозитория по путям. Категории загружаются один раз
+    (их немного), пути и результаты поиска запоминаются; созданные через
+    create или зарегистрированные через add категории тоже учитываются.
+    """
+
+    def __init__(self, cat_repo: AbstractRepository[Category]) -> None:
+        self.repo = cat_repo
+        self._cats: dict[int, Category] = {}
+        self._children: dict[tuple[int | None, str], Category] = {}
+        self._by_name: dict[str, list[Category]] = {}
+        self._paths: dict[int, str] = {}
+        for cat in cat_repo.get_all(order_by='pk'):
+            self.add(cat)
+
+    def add(self, cat: Category) -> None:
+        """ Учесть сохраненную в репозитории категорию """
+        self._cats[cat.pk] = cat
+        self._children.setdefault((cat.parent, cat.name), cat)
+        self._by_name.setdefault(cat.name, []).append(cat)
+
+    def path(self, pk: int) -> str:
+        """ Путь категории с id pk """
+        path = self._paths.get(pk)
+        if path is None:
+            names = []
+            cat: Category | None = self._cats[pk]
+            while cat is not None and len(names) <= len(self._cats):
+                names.append(cat.name)
+                cat = None if cat.parent is None else self._cats.get(cat.parent)
+            if cat is not None:
+                raise ValueError(f'category {pk} is in a parent cycle')
+            path = self._paths[pk] = join_path(reversed(names))
+        return path
+
+    def get(self, path: str, by_name: bool = False) -> Category | None:
+        """
+        Найти категорию по пути. С by_name=True путь из одного названия,
+        не найденный среди категорий верхнего уровня, ищется по названию
+        среди всех категорий, если такая категория одна.
+        """
+        names = split_path(path)
+        parent: int | None = None
+        cat: Category | None = None
+        for name in names:
+            cat = self._children.get((parent, name))
+            if cat is None:
+                break
+            parent = cat.pk
+        if cat is None and by_name and len(names) == 1 \
+                and len(self._by_name.get(names[0], ())) == 1:
+            cat = self._by_name[names[0]][0]
+        return cat
+
+    def create(self, paths: Iterable[str]) -> dict[str, int]:
+        """
+        Создать недостающие категории путей paths вместе с недостающими
+        родителями, вернуть id категорий по путям. Категории создаются
+        одним вызовом Category.create_from_tree: по уровню за вызов add_many.
+        """
+        pks: dict[str, int] = {}
+        tree: dict[str, str | None] = {}
+        keys: dict[str, str] = {}
+        for path in paths:
+            parent: str | None = None
+            for name in split_path(path):
+                key = _child_path(parent, name)
+                if key not in pks and key not in tree:
+                    cat = None if parent in tree else self.get(key)
+                    if cat is None:
+                        tree[key] = parent
+                    else:
+                        pks[key] = cat.pk
+                parent = key
+            assert parent is not None
+            keys[path] = parent
+        Category.create_from_tree(tree.items(), self.repo, max(len(tree), 1), pks,
+                                  _name)
+        for key, parent in tree.items():
+            self.add(Category(_name(key), None if parent is None else pks[parent],
+                              pks[key]))
+        return {path: pks[key] for path, key in keys.items()}
+
+
+def export_expenses(exp_repo: AbstractRepository[Expense],
+                    cat_repo: AbstractRepository[Category],
+                    file: TextIO, fmt: str, batch_size: int = 10000,
+                    progress: Progress | None = None) -> int:
+    """ Выгрузить расходы в файл, вернуть число записей """
+    paths = CategoryPaths(cat_repo)
+    rows = ((exp.amount, None if exp.category is None else paths.path(exp.category),
+             _isoformat(exp.expense_date), _isoformat(exp.added_date), exp.comment)
+            for exp in exp_repo.iter_all(batch_size=batch_size))
+    return write_rows(rows, file, fmt, FIELDS['expense'], batch_size, progress)
+
+
+def import_expenses(exp_repo: AbstractRepository[Expense],
+                    cat_repo: AbstractRepository[Category],
+                    file: TextIO, fmt: str, batch_size: int = 10000,
+                    progress: Progress | None = None) -> int:
+    """
+    Загрузить расходы из файла, вернуть число загруженных записей. Записи
+    без суммы пропускаются. Категории ищутся по пути; отсутствующие
+    создаются вместе с недостающими родителями. Незаполненные даты
+    заменяются временем начала загрузки.
+    """
+    paths = CategoryPaths(cat_repo)
+    categories: dict[str, int] = {}
+    now = datetime.now()
+    rows = (row for row in read_rows(file, fmt, FIELDS['expense'])
+            if row[0] not in (None, ''))
+    count = 0
+    while batch := list(islice(rows, batch_size)):
+        missing = []
+        for path in dict.fromkeys(row[1] for row in batch):
+            if path and path not in categories:
+                cat = paths.get(path, by_name=True)
+                if cat is None:
+                    missing.append(path)
+                else:
+                    categories[path] = cat.pk
+        categories.update(paths.create(missing))
+        exp_repo.add_many(
+            Expense(int(amount), categories[path] if path else None,
+                    _date(expense_date, now), _date(added_date, now), comment or '')
+            for amount, path, expense_date, added_date, comment in batch)
+        count += len(batch)
+        if progress is not None:
+            progress(count)
+    return count
+
+
+def export_categories(cat_repo: AbstractRepository[Category],
+                      file: TextIO, fmt: str, batch_size: int = 10000,
+                      progress: Progress | None = None) -> int:
+    """
+    Выгрузить категории в файл: название и путь родителя, вернуть число
+    записей. Категории идут в порядке обхода дерева: родитель раньше
+    подкатегорий.
+    """
+    index = CategoryIndex(cat_repo)
+    paths = CategoryPaths(cat_repo)
+
+    def parent_path(pk: int) -> str | None:
+        parent = index.parent(pk)
+        return None if parent is None else paths.path(parent)
+
+    rows = ((index.get(pk).name, parent_path(pk)) for pk in index.preorder())
+    return write_rows(rows, file, fmt, FIELDS['category'], batch_size, progress)
+
+
+def import_categories(cat_repo: AbstractRepository[Category],
+                      file: TextIO, fmt: str, batch_size: int = 10000,
+                      progress: Progress | None = None) -> int:
+    """
+    Загрузить категории из файла, вернуть число созданных категорий.
+    Родитель должен идти в файле раньше подкатегории или уже быть в БД;
+    категории, которые уже есть в БД у того же родителя, пропускаются.
+    Новые категории записываются Category.create_from_tree порциями
+    по batch_size, каждая порция - по уровням.
+    """
+    paths = CategoryPaths(cat_repo)
+    # id по путям: родители из БД и созданные категории
+    pks: dict[str, int] = {}
+    created: set[str] = set()
+    created_by_name: dict[str, list[str]] = {}
+
+    def parent_path(parent: str) -> str:
+        if parent in created:
+            return parent
+        saved = paths.get(parent, by_name=True)
+        if saved is not None:
+            path = paths.path(saved.pk)
+            pks[path] = saved.pk
+            return path
+        if len(created_by_name.get(parent, ())) == 1:
+            return created_by_name[parent][0]
+        raise ValueError(f'unknown parent category {parent}')
+
+    def new_categories() -> Iterator[tuple[str, str | None]]:
+        """ Пары путей "потомок-родитель" для категорий, которых нет в БД """
+        for name, parent in read_rows(file, fmt, FIELDS['category']):
+            ppath = parent_path(parent) if parent else None
+            path = _child_path(ppath, name)
+            if path in created or paths.get(path) is not None:
+                continue
+            created.add(path)
+            created_by_name.setdefault(name, []).append(path)
+            yield path, ppath
+
+    pairs = new_categories()
+    count = 0
+    while batch := list(islice(pairs, batch_size)):
+        count += Category.create_from_tree(batch, cat_repo, batch_size, pks, _name)
+        if progress is not None:
+            progress(count)
+    return count
+
+def export_budgets(bud_repo: AbstractRepository[Budget],
+                   file: TextIO, fmt: str, batch_size: int = 10000,
+                   progress: Progress | None = None) -> int:
+    """ Выгрузить бюджеты в файл, вернуть число записей """
+    rows = ((budget.amount, budget.period)
+            for budget in bud_repo.iter_all(batch_size=batch_size))
+    return write_rows(rows, file, fmt, FIELDS['budget'], batch_size, progress)
+
+
+def import_budgets(bud_repo: AbstractRepository[Budget],
+                   file: TextIO, fmt: str, batch_size: int = 10000,
+                   progress: Progress | None = None) -> int:
+    """ Загрузить бюджеты из файла, вернуть число записей """
+    objs = (Budget(int(amount), period)
+            for amount, period in read_rows(file, fmt, FIELDS['budget']))
+    return _add_batches(objs, bud_repo, batch_size, progress)
+
+
+IMPORTERS: dict[str, Callable[..., int]] = {
+    'expense': import_expenses,
+    'category': import_categories,
+    'budget': import_budgets,
+}
+EXPORTERS: dict[str, Callable[..., int]] = {
+    'expense': export_expenses,
+    'category': export_categories,
+    'budget': export_budgets,
+}
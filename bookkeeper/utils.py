@@ -2,7 +2,14 @@
 Вспомогательные функции
 """
 
-from typing import Iterable, Iterator
+from datetime import date, datetime, time, timedelta
+from typing import Any, Hashable, Iterable, Iterator, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+
+GROUP_PERIODS = ('day', 'week', 'month', 'year')
+
+EPOCH = datetime(1970, 1, 1)
 
 
 def _get_indent(line: str) -> int:
@@ -16,6 +23,40 @@ def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
         yield _get_indent(line), line.strip()
 
 
+def iter_tree(lines: Iterable[str]) -> Iterator[tuple[str, str | None]]:
+    """
+    Прочитать структуру дерева из текста на основе отступов, выдавая пары
+    "потомок-родитель" по мере чтения строк. Память расходуется только
+    на стек предков текущей строки, поэтому генератор подходит для больших
+    файлов. Формат и порядок пар - как у read_tree.
+
+    Parameters
+    ----------
+    lines - Итерируемый объект, содержащий строки текста (файл или список строк)
+
+    Yields
+    -------
+    Пары "потомок-родитель" в порядке топологической сортировки
+    """
+    parents: list[tuple[str | None, int]] = []
+    last_indent = -1
+    last_name = None
+    for i, (indent, name) in enumerate(_lines_with_indent(lines)):
+        if indent > last_indent:
+            parents.append((last_name, last_indent))
+        elif indent < last_indent:
+            while indent < last_indent:
+                _, last_indent = parents.pop()
+            if indent != last_indent:
+                raise IndentationError(
+                    f'unindent does not match any outer indentation '
+                    f'level in line {i}:\n'
+                )
+        yield name, parents[-1][0]
+        last_name = name
+        last_indent = indent
+
+
 def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     """
     Прочитать структуру дерева из текста на основе отступов. Вернуть список
@@ -32,7 +73,8 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     [('parent', None), ('child1', 'parent'),
      ('child2', 'child1'), ('child3', 'parent')]
 
-    Пустые строки игнорируются.
+    Пустые строки игнорируются. Для больших файлов удобнее генератор
+    iter_tree, не хранящий весь результат в памяти.
 
     Parameters
     ----------
@@ -42,22 +84,121 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     -------
     Список пар "потомок-родитель"
     """
-    parents: list[tuple[str | None, int]] = []
-    last_indent = -1
-    last_name = None
-    result: list[tuple[str, str | None]] = []
-    for i, (indent, name) in enumerate(_lines_with_indent(lines)):
-        if indent > last_indent:
-            parents.append((last_name, last_indent))
-        elif indent < last_indent:
-            while indent < last_indent:
-                _, last_indent = parents.pop()
-            if indent != last_indent:
-                raise IndentationError(
-                    f'unindent does not match any outer indentation '
-                    f'level in line {i}:\n'
-                )
-        result.append((name, parents[-1][0]))
-        last_name = name
-        last_indent = indent
-    return result
+    return list(iter_tree(lines))
+
+
+def to_date(value: date | str) -> date:
+    """
+    Привести дату расхода к date: из репозитория приходит datetime,
+    из формы - date, из старых записей - строка в формате ISO.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+def sort_key(value: Any) -> Any:
+    """
+    Привести значение к виду, пригодному для сравнения с датами обоих типов:
+    date заменяется на datetime с временем 00:00, остальные значения
+    возвращаются как есть. Так date и datetime упорядочиваются так же,
+    как их ISO-строки в sqlite.
+    """
+    if type(value) is date:  # pylint: disable=unidiomatic-typecheck
+        return datetime.combine(value, time())
+    return value
+
+
+def to_microseconds(value: date | str) -> int:
+    """
+    Перевести дату в число микросекунд от начала эпохи (1970-01-01 00:00).
+    date считается началом суток, строка разбирается как дата в формате ISO.
+    Часовой пояс не учитывается: все даты считаются датами в одном поясе.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    delta = sort_key(value) - EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_microseconds(value: int) -> datetime:
+    """ Перевести число микросекунд от начала эпохи в datetime """
+    return EPOCH + timedelta(0, 0, value)
+
+
+def period_start(value: date | str, period: str) -> date:
+    """
+    Получить начало периода ('day', 'week', 'month' или 'year'), в который
+    попадает дата. Неделя начинается с понедельника.
+    """
+    day = to_date(value)
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'year':
+        return day.replace(day=1, month=1)
+    raise ValueError(f'unknown period {period}')
+
+
+def index_children(nodes: Iterable[tuple[K, K]],
+                   root: K) -> tuple[dict[K, list[K]], list[K]]:
+    """
+    Построить за один проход индекс "родитель -> список потомков" по парам
+    (id, id родителя). Потомки перечисляются в порядке следования пар.
+
+    Узлы, недостижимые из root (родитель отсутствует или узел входит
+    в цикл), переносятся к корню: в индексе они становятся потомками root.
+    Их id возвращаются вторым элементом результата.
+
+    Parameters
+    ----------
+    nodes - пары (id узла, id родителя); у узлов верхнего уровня родитель root
+    root - id корня
+
+    Returns
+    -------
+    Индекс потомков и список id перенесенных к корню узлов
+    """
+    parents: dict[K, K] = {}
+    children: dict[K, list[K]] = {root: []}
+    for pk, parent in nodes:
+        parents[pk] = parent
+        children.setdefault(parent, []).append(pk)
+        children.setdefault(pk, [])
+
+    reached = {root}
+    stack = [root]
+    orphans: list[K] = []
+    pending = iter(parents)
+    while True:
+        while stack:
+            for child in children[stack.pop()]:
+                if child not in reached:
+                    reached.add(child)
+                    stack.append(child)
+        # самый "верхний" недостижимый узел: поднимаемся по родителям,
+        # пока родитель существует, недостижим и не пройден (цикл)
+        pk = next((pk for pk in pending if pk not in reached), None)
+        if pk is None:
+            break
+        seen = {pk}
+        while parents[pk] in parents and parents[pk] not in reached \
+                and parents[pk] not in seen:
+            pk = parents[pk]
+            seen.add(pk)
+        siblings = children.get(parents[pk])
+        if siblings is not None:
+            siblings.remove(pk)
+        children[root].append(pk)
+        orphans.append(pk)
+        reached.add(pk)
+        stack.append(pk)
+
+    for pk in [pk for pk in children if pk not in parents and pk != root]:
+        del children[pk]
+    return children, orphans
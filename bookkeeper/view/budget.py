@@ -2,7 +2,7 @@
 Модуль отображения бюджета.
 """
 
-from typing import Tuple
+from typing import Callable, ContextManager, Tuple
 from PySide6.QtWidgets import (
     QLabel, QWidget, QHeaderView,
     QComboBox, QGridLayout, QDoubleSpinBox
@@ -20,7 +20,6 @@ height = 150
 
 class BudgetView(FrameTableViewWithControls):
     """Отображение бюджета."""
-    budgets: list[list[str]]
 
     def __init__(self, parent: QWidget | None = None) -> None:
         super().__init__(parent)
@@ -49,16 +48,38 @@ class BudgetView(FrameTableViewWithControls):
         self.edit_windows.update.setFixedSize(width, height)
         self.edit_windows.delete.setFixedSize(width, height)
 
-    def set_up(self, budgets: list[list[str]]) -> None:
-        """Устанавливает данные для виджета."""
-        self.budgets = budgets
-        self.table.set_data(budgets)
-
-        for row_id in range(self.table.rowCount()):
-            budget = float(self.table.item(row_id, 1).text())
-            general_expense = float(self.table.item(row_id, 2).text())
-            if general_expense > budget:
-                self.table.item(row_id, 2).setBackground(QColor(50, 0, 0))
+    def set_up(self, budgets: list[Budget],
+               format_row: Callable[[Budget], list[str]]) -> None:
+        """Устанавливает данные для виджета: таблица показывает сам список budgets."""
+        self.table.set_data(budgets, format_row)
+        self.table.table_model.background = self.highlight
+
+    @staticmethod
+    def highlight(row: list[str], column: int) -> QColor | None:
+        """Выделяет расходы, превысившие бюджет."""
+        if column != 2:
+            return None
+        budget = float(row[1])
+        general_expense = float(row[2])
+        if general_expense > budget:
+            return QColor(50, 0, 0)
+        return None
+
+    def inserting_budgets(self, first: int, count: int = 1) -> ContextManager[None]:
+        """Блок, в котором бюджеты вставляются в список таблицы."""
+        return self.table.inserting_rows(first, count)
+
+    def update_budget(self, row_id: int) -> None:
+        """Обновляет строку измененного бюджета."""
+        self.table.update_row(row_id)
+
+    def removing_budget(self, row_id: int) -> ContextManager[None]:
+        """Блок, в котором бюджет удаляется из списка таблицы."""
+        return self.table.removing_row(row_id)
+
+    def refresh(self) -> None:
+        """Перерисовывает строки после изменения расходов."""
+        self.table.refresh()
 
     def on_add_button_clicked(self) -> None:
         """Обработка нажатия кнопки добавления."""
@@ -70,7 +91,7 @@ class BudgetView(FrameTableViewWithControls):
         if row_id < 0:
             return
 
-        self.update_content.set_row(row_id, self.budgets[self.table.currentRow()])
+        self.update_content.set_row(row_id, self.table.row(row_id))
         self.edit_windows.update.show()
 
     def on_delete_button_clicked(self) -> None:
@@ -2,14 +2,22 @@
 Модуль отображения категорий
 """
 
-from collections import deque
+import logging
 from PySide6.QtWidgets import (
     QLabel, QWidget, QGridLayout, QLineEdit, QHBoxLayout
 )
+from PySide6.QtCore import QModelIndex
 from PySide6.QtGui import QStandardItem
+from bookkeeper.utils import index_children
 from bookkeeper.view.widgets import (CategoryDropdown, Tree, FrameTreeViewWithControls, EditWindows)
 from ..models.category import Category
 
+logger = logging.getLogger(__name__)
+
+ROOT = '0'
+# деревья до такого размера строятся и раскрываются целиком сразу
+EXPAND_ALL_LIMIT = 500
+
 width = 300
 height = 150
 
@@ -42,6 +50,33 @@ class CategoryView(FrameTreeViewWithControls):
         self.update_content.parent_dropdown.set_data(categories)
         self.delete_content.dropdown.set_data(categories)
 
+    def dropdowns(self) -> list[CategoryDropdown]:
+        """Возвращает все выпадающие списки категорий"""
+        return [
+            self.add_content.dropdown,
+            self.update_content.dropdown_to_edit,
+            self.update_content.parent_dropdown,
+            self.delete_content.dropdown,
+        ]
+
+    def add_category(self, category: list[str]) -> None:
+        """Добавляет категорию в дерево и выпадающие списки"""
+        self.tree.add_node(category)
+        for dropdown in self.dropdowns():
+            dropdown.add_category(category)
+
+    def update_category(self, category: list[str]) -> None:
+        """Обновляет категорию в дереве и выпадающих списках"""
+        self.tree.update_node(category)
+        for dropdown in self.dropdowns():
+            dropdown.update_category(category)
+
+    def remove_category(self, pk: str) -> None:
+        """Удаляет категорию из дерева и выпадающих списков"""
+        self.tree.remove_node(pk)
+        for dropdown in self.dropdowns():
+            dropdown.remove_category(pk)
+
     def on_add_button_clicked(self) -> None:
         """Обработка нажатия кнопки добавления"""
         self.edit_windows.add.show()
@@ -56,35 +91,169 @@ class CategoryView(FrameTreeViewWithControls):
 
 
 class CategoryTree(Tree):
-    """Иерархическая таблица категорий."""
+    """
+    Иерархическая таблица категорий. Элементы потомков создаются только
+    при раскрытии узла, пока узел не раскрыт, у него есть пустой
+    элемент-заглушка, чтобы отображалась стрелка раскрытия.
+    """
+    nodes: dict[str, list[str]]
+    children: dict[str, list[str]]
+    parents: dict[str, str]
+    items: dict[str, QStandardItem]
+    populated: set[str]
+
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.nodes = {}
+        self.children = {ROOT: []}
+        self.parents = {}
+        self.items = {}
+        self.populated = {ROOT}
+        self.expanded.connect(self.on_expanded)  # type: ignore[attr-defined]
+
     def set_data(self, data: list[list[str]]) -> None:
         """Устанавливает данные для древовидной структуры."""
         self.item_model.setRowCount(0)
-        root = self.item_model.invisibleRootItem()
-        seen: dict[str, QStandardItem] = {}
-        nodes = deque(data)
-        print("data "+str(data))
-        print("nodes" + str(nodes))
-        print(nodes)
-        while nodes:
-            node = nodes.popleft()
-            if node[2] == '0':
-                parent = root
-            else:
-                pid = node[2]
-                if pid not in seen:
-                    nodes.append(node)
-                    continue
-
-                parent = seen[pid]
-
-            pk = node[0]
-            parent.appendRow([
-                 QStandardItem(node[1]),
-            ])
-            seen[pk] = parent.child(parent.rowCount() - 1)
-
-        self.expandAll()
+        self.nodes = {node[0]: node for node in data}
+        self.children, orphans = index_children(
+            ((node[0], node[2]) for node in data), ROOT)
+        self.parents = {child: pk for pk, children in self.children.items()
+                        for child in children}
+        if orphans:
+            logger.warning('categories without parent shown at top level: %s',
+                           ', '.join(orphans))
+        self.items = {}
+        self.populated = {ROOT}
+        self.populate(ROOT)
+        if len(data) <= EXPAND_ALL_LIMIT:
+            stack = list(self.children[ROOT])
+            while stack:
+                pk = stack.pop()
+                self.populate(pk)
+                stack.extend(self.children[pk])
+            self.expandAll()
+
+    def item(self, pk: str) -> QStandardItem:
+        """Возвращает элемент категории, для ROOT - корень модели."""
+        if pk == ROOT:
+            return self.item_model.invisibleRootItem()
+        return self.items[pk]
+
+    def make_item(self, pk: str) -> QStandardItem:
+        """Создает элемент дерева для категории."""
+        item = QStandardItem(self.nodes[pk][1])
+        item.setData(pk)
+        if self.children[pk]:
+            item.appendRow([QStandardItem()])
+        self.items[pk] = item
+        return item
+
+    def populate(self, pk: str) -> None:
+        """Создает элементы непосредственных потомков категории."""
+        item = self.item(pk)
+        if pk != ROOT:
+            item.removeRows(0, item.rowCount())
+        for child in self.children[pk]:
+            item.appendRow([self.make_item(child)])
+        self.populated.add(pk)
+
+    def on_expanded(self, index: QModelIndex) -> None:
+        """Заполняет узел при первом раскрытии."""
+        pk = self.item_model.itemFromIndex(index).data()
+        if pk not in self.populated:
+            self.populate(pk)
+
+    def forget(self, pk: str) -> None:
+        """Забывает созданные элементы поддерева категории."""
+        stack = [pk]
+        while stack:
+            node = stack.pop()
+            self.items.pop(node, None)
+            if node in self.populated:
+                self.populated.discard(node)
+                stack.extend(self.children[node])
+
+    def attach(self, pk: str, parent: str,
+               row: list[QStandardItem] | None = None) -> None:
+        """
+        Показывает категорию под родителем: если родитель уже заполнен,
+        добавляет элемент (готовый row или новый), иначе только выставляет
+        у родителя заглушку.
+        """
+        if parent in self.populated:
+            self.item(parent).appendRow(row or [self.make_item(pk)])
+            return
+        if row:
+            self.forget(pk)
+        if parent in self.items and self.items[parent].rowCount() == 0:
+            self.items[parent].appendRow([QStandardItem()])
+
+    def detach(self, pk: str) -> list[QStandardItem] | None:
+        """Убирает элемент категории от родителя и возвращает его строку."""
+        item = self.items.get(pk)
+        if item is None:
+            return None
+        parent = item.parent()
+        if parent is None:
+            parent = self.item_model.invisibleRootItem()
+        return parent.takeRow(item.row())
+
+    def move(self, pk: str, parent: str) -> None:
+        """Переносит категорию вместе с поддеревом к другому родителю."""
+        old_parent = self.parents[pk]
+        self.children[old_parent].remove(pk)
+        self.children[parent].append(pk)
+        self.parents[pk] = parent
+        self.attach(pk, parent, self.detach(pk))
+        if not self.children[old_parent] and old_parent in self.items:
+            item = self.items[old_parent]
+            item.removeRows(0, item.rowCount())
+
+    def is_descendant(self, pk: str, ancestor: str) -> bool:
+        """Лежит ли категория pk в поддереве ancestor."""
+        while pk != ROOT:
+            if pk == ancestor:
+                return True
+            pk = self.parents[pk]
+        return False
+
+    def add_node(self, node: list[str]) -> None:
+        """Добавляет категорию в дерево."""
+        pk = node[0]
+        parent = node[2] if node[2] in self.children else ROOT
+        self.nodes[pk] = node
+        self.children[pk] = []
+        self.children[parent].append(pk)
+        self.parents[pk] = parent
+        self.attach(pk, parent)
+
+    def update_node(self, node: list[str]) -> None:
+        """Обновляет название и родителя категории."""
+        pk = node[0]
+        parent = node[2] if node[2] in self.children else ROOT
+        if self.is_descendant(parent, pk):
+            logger.warning('category %s cannot be moved into its own subtree', pk)
+            parent = ROOT
+        self.nodes[pk] = node
+        if pk in self.items:
+            self.items[pk].setText(node[1])
+        if self.parents[pk] != parent:
+            self.move(pk, parent)
+
+    def remove_node(self, pk: str) -> None:
+        """
+        Удаляет категорию. Ее потомки переносятся на верхний уровень,
+        как и при загрузке категорий без родителя.
+        """
+        if pk not in self.nodes:
+            return
+        for child in list(self.children[pk]):
+            self.move(child, ROOT)
+        self.detach(pk)
+        self.forget(pk)
+        self.children[self.parents.pop(pk)].remove(pk)
+        del self.nodes[pk]
+        del self.children[pk]
 
 
 class AddContent(QWidget):
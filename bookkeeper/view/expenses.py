@@ -3,7 +3,7 @@
 """
 
 from datetime import date
-from typing import Tuple
+from typing import Callable, ContextManager, Tuple
 from PySide6.QtWidgets import (
     QLabel, QWidget, QHeaderView,
     QGridLayout, QLineEdit, QDateEdit, QDoubleSpinBox
@@ -21,7 +21,6 @@ height = 200
 
 class ExpenseView(FrameTableViewWithControls):
     """Отображение расходов."""
-    expenses: list[list[str]]
 
     def __init__(self, parent: QWidget | None = None) -> None:
         super().__init__(parent)
@@ -51,15 +50,58 @@ class ExpenseView(FrameTableViewWithControls):
         self.edit_windows.update.setFixedSize(width, height)
         self.edit_windows.delete.setFixedSize(width, height)
 
-    def set_up(self, expenses: list[list[str]], categories: list[list[str]]) -> None:
-        """Устанавливает данные для виджета"""
-        self.expenses = expenses
-        if expenses is not None:
-            self.table.set_data(expenses)
+    def set_up(
+            self,
+            expenses: list[Expense] | None,
+            categories: list[list[str]] | None,
+            format_row: Callable[[Expense], list[str]] | None = None,
+            fetch: Callable[[Callable[[bool], None]], None] | None = None,
+            has_more: bool = False,
+    ) -> None:
+        """
+        Устанавливает данные для виджета. Таблица показывает сам список
+        expenses, строки форматируются функцией format_row при отображении.
+        fetch при прокрутке дописывает в список следующую страницу расходов
+        (в блоке inserting_expenses) и передает функции-аргументу, есть ли
+        следующие страницы.
+        """
+        if expenses is not None and format_row is not None:
+            self.table.set_data(expenses, format_row, fetch, has_more)
         if categories is not None:
             self.update_content.category_dropdown.set_data(categories)
             self.add_content.category_dropdown.set_data(categories)
 
+    def inserting_expenses(self, first: int, count: int = 1) -> ContextManager[None]:
+        """Блок, в котором расходы вставляются в список таблицы"""
+        return self.table.inserting_rows(first, count)
+
+    def update_expense(self, row_id: int) -> None:
+        """Обновляет строку измененного расхода"""
+        self.table.update_row(row_id)
+
+    def removing_expense(self, row_id: int) -> ContextManager[None]:
+        """Блок, в котором расход удаляется из списка таблицы"""
+        return self.table.removing_row(row_id)
+
+    def refresh(self) -> None:
+        """Перерисовывает строки, например после переименования категории"""
+        self.table.refresh()
+
+    def add_category(self, category: list[str]) -> None:
+        """Добавляет категорию в выпадающие списки"""
+        self.add_content.category_dropdown.add_category(category)
+        self.update_content.category_dropdown.add_category(category)
+
+    def update_category(self, category: list[str]) -> None:
+        """Обновляет категорию в выпадающих списках"""
+        self.add_content.category_dropdown.update_category(category)
+        self.update_content.category_dropdown.update_category(category)
+
+    def remove_category(self, pk: str) -> None:
+        """Удаляет категорию из выпадающих списков"""
+        self.add_content.category_dropdown.remove_category(pk)
+        self.update_content.category_dropdown.remove_category(pk)
+
     def on_add_button_clicked(self) -> None:
         """Обработка нажатия кнопки добавления"""
         self.edit_windows.add.show()
@@ -70,7 +112,7 @@ class ExpenseView(FrameTableViewWithControls):
         if row_id < 0:
             return
 
-        self.update_content.set_row(row_id, self.expenses[self.table.currentRow()])
+        self.update_content.set_row(row_id, self.table.row(row_id))
         self.edit_windows.update.show()
 
     def on_delete_button_clicked(self) -> None:
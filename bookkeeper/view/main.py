@@ -3,12 +3,13 @@
 """
 
 from PySide6.QtWidgets import (
-    QWidget, QGridLayout
+    QWidget, QGridLayout, QTabWidget, QProgressBar, QMessageBox
 )
 from PySide6.QtWidgets import QMainWindow
 from bookkeeper.view.categories import CategoryView
 from bookkeeper.view.expenses import ExpenseView
 from bookkeeper.view.budget import BudgetView
+from bookkeeper.view.report import ReportView
 
 
 class MainWindow(QMainWindow):
@@ -36,4 +37,29 @@ class MainWindow(QMainWindow):
         self.widget = QWidget()
         self.widget.setLayout(layout)
 
-        self.setCentralWidget(self.widget)
\ No newline at end of file
+        self.report_view = ReportView(self)
+
+        self.tabs = QTabWidget()
+        self.tabs.addTab(self.widget, "Расходы")
+        self.tabs.addTab(self.report_view, "Отчет по категориям")
+
+        self.setCentralWidget(self.tabs)
+
+        # индикатор фоновой работы с БД: бегущая полоса в строке состояния
+        self.loading_bar = QProgressBar()
+        self.loading_bar.setRange(0, 0)
+        self.loading_bar.setMaximumWidth(150)
+        self.loading_bar.hide()
+        self.statusBar().addPermanentWidget(self.loading_bar)
+
+    def show_error(self, message: str) -> None:
+        """Показывает сообщение об ошибке"""
+        QMessageBox.warning(self, "Ошибка", message)
+
+    def set_loading(self, loading: bool) -> None:
+        """Показывает или скрывает индикатор загрузки"""
+        self.loading_bar.setVisible(loading)
+        if loading:
+            self.statusBar().showMessage('Загрузка...')
+        else:
+            self.statusBar().clearMessage()
@@ -0,0 +1,91 @@
+"""
+Модуль отображения отчета о расходах по категориям.
+"""
+
+from datetime import date, timedelta
+from typing import Callable
+from PySide6.QtWidgets import (
+    QDateEdit, QFrame, QGridLayout, QHeaderView, QLabel, QPushButton,
+    QTreeView, QWidget
+)
+from PySide6.QtCore import QDate
+from PySide6.QtGui import QStandardItem, QStandardItemModel
+
+HEADERS = ["Категория", "Собственные", "Всего"]
+
+
+class ReportView(QFrame):
+    """
+    Отчет о расходах за период: по каждой категории показываются расходы,
+    отнесенные к ней самой, и расходы вместе со всеми подкатегориями.
+    """
+
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+
+        self.start_edit = QDateEdit()
+        self.start_edit.setDisplayFormat('yyyy-MM-dd')
+        self.start_edit.setDate(QDate.currentDate().addMonths(-1))
+        self.finish_edit = QDateEdit()
+        self.finish_edit.setDisplayFormat('yyyy-MM-dd')
+        self.finish_edit.setDate(QDate.currentDate())
+        self.show_button = QPushButton('Показать')
+        self.loading_label = QLabel()
+
+        self.item_model = QStandardItemModel()
+        self.item_model.setHorizontalHeaderLabels(HEADERS)
+        self.tree = QTreeView()
+        self.tree.setModel(self.item_model)
+        self.tree.header().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+
+        layout = QGridLayout()
+        layout.addWidget(QLabel('С'), 0, 0)
+        layout.addWidget(self.start_edit, 0, 1)
+        layout.addWidget(QLabel('По'), 0, 2)
+        layout.addWidget(self.finish_edit, 0, 3)
+        layout.addWidget(self.show_button, 0, 4)
+        layout.addWidget(self.loading_label, 0, 5)
+        layout.addWidget(self.tree, 1, 0, 1, 6)
+        self.setLayout(layout)
+
+        self.setFrameStyle(QFrame.Shape.StyledPanel)
+        self.setLineWidth(2)
+
+    def on_action_button_clicked(self, slot: Callable[[], None]) -> None:
+        """Обработка нажатия на кнопку построения отчета"""
+        self.show_button.clicked.connect(slot)  # type: ignore[attr-defined]
+
+    def get_period(self) -> tuple[date, date]:
+        """
+        Получение периода отчета: начало включительно и конец, не входящий
+        в период (день после выбранной даты окончания).
+        """
+        start = date.fromisoformat(self.start_edit.date().toString('yyyy-MM-dd'))
+        finish = date.fromisoformat(self.finish_edit.date().toString('yyyy-MM-dd'))
+        return start, finish + timedelta(days=1)
+
+    def set_loading(self, loading: bool) -> None:
+        """
+        Показывает, что отчет считается. Кнопка остается доступной:
+        новый запрос заменяет еще не готовый.
+        """
+        self.loading_label.setText('Загрузка...' if loading else '')
+
+    def set_data(self, rows: list[list[str]]) -> None:
+        """
+        Устанавливает строки отчета [id, название, id родителя, собственные,
+        всего]. Родитель должен идти раньше подкатегорий.
+        """
+        self.item_model.removeRows(0, self.item_model.rowCount())
+        root = self.item_model.invisibleRootItem()
+        items: dict[str, QStandardItem] = {}
+        for pk, name, parent, own, total in rows:
+            item = QStandardItem(name)
+            item.setEditable(False)
+            cells = [QStandardItem(own), QStandardItem(total)]
+            for cell in cells:
+                cell.setEditable(False)
+            items.get(parent, root).appendRow([item, *cells])
+            if pk:
+                items[pk] = item
+        self.tree.expandAll()
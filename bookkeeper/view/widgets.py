@@ -2,9 +2,13 @@
 Модуль переиспользуемых виджетов
 """
 
-from typing import Callable
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Iterator
 from PySide6.QtWidgets import *
-from PySide6.QtGui import QStandardItemModel
+from PySide6.QtCore import (
+    QAbstractTableModel, QModelIndex, QObject, QPersistentModelIndex, Qt
+)
+from PySide6.QtGui import QColor, QStandardItemModel
 
 
 class CategoryDropdown(QComboBox):
@@ -19,6 +23,22 @@ class CategoryDropdown(QComboBox):
         """Возвращает pk категории"""
         return int(self.itemData(self.currentIndex()))
 
+    def add_category(self, category: list[str]) -> None:
+        """Добавляет категорию"""
+        self.addItem(category[1], category[0])
+
+    def update_category(self, category: list[str]) -> None:
+        """Обновляет название категории"""
+        idx = self.findData(category[0])
+        if idx >= 0:
+            self.setItemText(idx, category[1])
+
+    def remove_category(self, pk: str) -> None:
+        """Удаляет категорию"""
+        idx = self.findData(pk)
+        if idx >= 0:
+            self.removeItem(idx)
+
     def set_current_item(self, name: str) -> None:
         """Устанавливает заданную категорию"""
         if name == '':
@@ -70,6 +90,10 @@ class EditWindow(QWidget):
         """Обработка нажатия на кнопку"""
         self.action_button.clicked.connect(slot)
 
+    def set_busy(self, busy: bool) -> None:
+        """Блокирует кнопку, пока выполняется действие"""
+        self.action_button.setEnabled(not busy)
+
 
 class EditWindows:
     """Класс содержащий окна редактирования"""
@@ -103,8 +127,159 @@ class EditWindows:
         )
 
 
-class Table(QTableWidget):
-    """Виджет таблицы"""
+class TableModel(QAbstractTableModel):
+    """
+    Модель таблицы поверх списка объектов презентера. Модель хранит ссылку
+    на список и сама его не меняет: презентер вставляет и удаляет объекты
+    внутри inserting и removing, которые уведомляют представление до и после
+    изменения, а о замене объекта сообщает вызовом changed.
+
+    Строки форматируются функцией format_row только когда представление
+    запрашивает видимые ячейки; отформатированная строка запоминается
+    (не больше ROW_CACHE_SIZE строк) до ее изменения или refresh.
+    Если задана функция fetch, данные подгружаются страницами по мере
+    прокрутки: fetch дописывает следующую страницу в список (возможно,
+    позже, из фонового потока через сигнал) и вызывает функцию fetched,
+    передав ей, есть ли еще страницы; пока страница не пришла, новые
+    не запрашиваются.
+    """
+    ROW_CACHE_SIZE = 1000
+
+    items: list[Any]
+
+    def __init__(self, headers: list[str], parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.headers = headers
+        self.items = []
+        self.format_row: Callable[[Any], list[str]] = lambda item: []
+        self.fetch: Callable[[Callable[[bool], None]], None] | None = None
+        self.has_more = False
+        self.fetching = False
+        self.background: Callable[[list[str], int], QColor | None] = \
+            lambda row, column: None
+        self._rows: dict[int, list[str]] = {}
+
+    def set_source(
+            self,
+            items: list[Any],
+            format_row: Callable[[Any], list[str]],
+            fetch: Callable[[Callable[[bool], None]], None] | None = None,
+            has_more: bool = False,
+    ) -> None:
+        """Устанавливает список объектов, функцию форматирования и подгрузки."""
+        self.beginResetModel()
+        self.items = items
+        self.format_row = format_row
+        self.fetch = fetch
+        self.has_more = fetch is not None and has_more
+        self.fetching = False
+        self._rows = {}
+        self.endResetModel()
+
+    def rowCount(self,
+                 parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> int:
+        """Количество загруженных строк."""
+        if parent.isValid():
+            return 0
+        return len(self.items)
+
+    def columnCount(self,
+                    parent: QModelIndex | QPersistentModelIndex = QModelIndex()) -> int:
+        """Количество столбцов."""
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def data(self, index: QModelIndex | QPersistentModelIndex,
+             role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        """Данные ячейки; строка форматируется при первом обращении."""
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.row(index.row())[index.column()]
+        if role == Qt.ItemDataRole.BackgroundRole:
+            return self.background(self.row(index.row()), index.column())
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation,
+                   role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        """Заголовки столбцов."""
+        if role == Qt.ItemDataRole.DisplayRole \
+                and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def canFetchMore(self, parent: QModelIndex | QPersistentModelIndex) -> bool:
+        """Есть ли еще не загруженные строки."""
+        return not parent.isValid() and self.has_more and not self.fetching
+
+    def fetchMore(self, parent: QModelIndex | QPersistentModelIndex) -> None:
+        """Запрашивает следующую страницу."""
+        if parent.isValid() or self.fetch is None or self.fetching:
+            return
+        self.fetching = True
+        self.fetch(self.fetched)
+
+    def fetched(self, has_more: bool) -> None:
+        """Страница загружена; has_more - есть ли следующие."""
+        self.fetching = False
+        self.has_more = has_more
+
+    def row(self, row_idx: int) -> list[str]:
+        """Отформатированная строка."""
+        row = self._rows.get(row_idx)
+        if row is None:
+            if len(self._rows) >= self.ROW_CACHE_SIZE:
+                self._rows = {}
+            row = self._rows[row_idx] = self.format_row(self.items[row_idx])
+        return row
+
+    def _forget(self, first: int) -> None:
+        """Забывает отформатированные строки начиная с first."""
+        self._rows = {idx: row for idx, row in self._rows.items() if idx < first}
+
+    @contextmanager
+    def inserting(self, first: int, count: int = 1) -> Iterator[None]:
+        """Блок, в котором в список вставляются count объектов с позиции first."""
+        if count <= 0:
+            yield
+            return
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        try:
+            yield
+        finally:
+            self._forget(first)
+            self.endInsertRows()
+
+    @contextmanager
+    def removing(self, row_idx: int) -> Iterator[None]:
+        """Блок, в котором из списка удаляется объект строки row_idx."""
+        self.beginRemoveRows(QModelIndex(), row_idx, row_idx)
+        try:
+            yield
+        finally:
+            self._forget(row_idx)
+            self.endRemoveRows()
+
+    def changed(self, row_idx: int) -> None:
+        """Сообщает, что объект строки заменен или изменен."""
+        self._rows.pop(row_idx, None)
+        self.dataChanged.emit(self.index(row_idx, 0),
+                              self.index(row_idx, len(self.headers) - 1))
+
+    def refresh(self) -> None:
+        """Сообщает представлению, что отображаемые значения могли измениться."""
+        self._rows = {}
+        if self.items:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(self.items) - 1, len(self.headers) - 1))
+
+
+class Table(QTableView):
+    """
+    Виджет таблицы. Данные хранятся в TableModel, ячейки создаются
+    только для видимых строк.
+    """
 
     def __init__(
             self,
@@ -114,8 +289,8 @@ class Table(QTableWidget):
     ) -> None:
         super().__init__(parent)
 
-        self.setColumnCount(len(headers))
-        self.setHorizontalHeaderLabels(headers)
+        self.table_model = TableModel(headers, self)
+        self.setModel(self.table_model)
 
         header = self.horizontalHeader()
         for idx, header_resize_mode in enumerate(header_resize_modes):
@@ -126,16 +301,43 @@ class Table(QTableWidget):
         self.setEditTriggers(
             QAbstractItemView.EditTrigger.NoEditTriggers
         )
+        self.setSelectionBehavior(
+            QAbstractItemView.SelectionBehavior.SelectRows
+        )
 
-    def set_data(self, data: list[list[str]]) -> None:
-        """Заполняет таблицу."""
-        self.setRowCount(len(data))
-        for row_idx, row in enumerate(data):
-            for column_idx, datum in enumerate(row):
-                self.setItem(
-                    row_idx, column_idx,
-                    QTableWidgetItem(datum)
-                )
+    def set_data(
+            self,
+            items: list[Any],
+            format_row: Callable[[Any], list[str]],
+            fetch: Callable[[Callable[[bool], None]], None] | None = None,
+            has_more: bool = False,
+    ) -> None:
+        """Заполняет таблицу объектами списка items (без копирования)."""
+        self.table_model.set_source(items, format_row, fetch, has_more)
+
+    def currentRow(self) -> int:  # pylint: disable=invalid-name
+        """Номер выбранной строки или -1."""
+        return self.currentIndex().row()
+
+    def row(self, row_idx: int) -> list[str]:
+        """Отформатированная строка."""
+        return self.table_model.row(row_idx)
+
+    def inserting_rows(self, first: int, count: int = 1) -> ContextManager[None]:
+        """Блок вставки объектов в список таблицы."""
+        return self.table_model.inserting(first, count)
+
+    def removing_row(self, row_idx: int) -> ContextManager[None]:
+        """Блок удаления объекта из списка таблицы."""
+        return self.table_model.removing(row_idx)
+
+    def update_row(self, row_idx: int) -> None:
+        """Перерисовывает измененную строку."""
+        self.table_model.changed(row_idx)
+
+    def refresh(self) -> None:
+        """Перерисовывает значения ячеек."""
+        self.table_model.refresh()
 
 
 class Tree(QTreeView):
@@ -0,0 +1,146 @@
+"""
+Модуль фонового выполнения работы с БД.
+
+Executor выполняет функции в отдельном потоке (QThreadPool с одним потоком,
+поэтому задачи выполняются по одной в порядке постановки и запись,
+поставленная раньше чтения, успевает завершиться до него). Результат
+возвращается в поток GUI через сигнал и передается функции on_done.
+
+Задачи с одинаковым ключом вытесняют друг друга: еще не начатая задача
+снимается с очереди, а результат уже выполняющейся отбрасывается.
+Так повторные обновления (например, отчета) не копятся в очереди.
+"""
+
+import logging
+from typing import Any, Callable
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+logger = logging.getLogger(__name__)
+
+
+class TaskSignals(QObject):
+    """Сигналы задачи: испускаются в рабочем потоке, принимаются в потоке GUI."""
+    finished = Signal(object, object)
+    failed = Signal(object, object)
+
+
+class Task(QRunnable):
+    """Задача для QThreadPool: вызывает job и сообщает результат сигналом."""
+
+    def __init__(
+            self,
+            key: str | None,
+            job: Callable[[], Any],
+            on_done: Callable[[Any], None],
+            on_error: Callable[[BaseException], None],
+            signals: TaskSignals,
+    ) -> None:
+        super().__init__()
+        # объект задачи хранит Executor до получения результата
+        self.setAutoDelete(False)
+        self.key = key
+        self.job = job
+        self.on_done = on_done
+        self.on_error = on_error
+        self.signals = signals
+        self.cancelled = False
+
+    def run(self) -> None:
+        """Выполняет задачу в рабочем потоке."""
+        if self.cancelled:
+            self.signals.finished.emit(self, None)
+            return
+        try:
+            result = self.job()
+        except Exception as error:  # pylint: disable=broad-except
+            self.signals.failed.emit(self, error)
+        else:
+            self.signals.finished.emit(self, result)
+
+
+class Executor(QObject):
+    """
+    Выполняет функции в фоновом потоке и доставляет результаты в поток GUI.
+    busy_changed испускается с True, когда появляется первая задача,
+    и с False, когда завершается последняя.
+    """
+    busy_changed = Signal(bool)
+
+    def __init__(self, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        # поток не завершается при простое: у каждого потока свое соединение
+        # с БД в ConnectionManager, и новый поток открывал бы новое
+        self.pool.setExpiryTimeout(-1)
+        self.signals = TaskSignals(self)
+        self.signals.finished.connect(self._on_finished)  # type: ignore[attr-defined]
+        self.signals.failed.connect(self._on_failed)  # type: ignore[attr-defined]
+        self._tasks: set[Task] = set()
+        self._latest: dict[str, Task] = {}
+
+    @property
+    def busy(self) -> bool:
+        """Есть ли незавершенные задачи."""
+        return bool(self._tasks)
+
+    def submit(
+            self,
+            job: Callable[[], Any],
+            on_done: Callable[[Any], None] = lambda result: None,
+            key: str | None = None,
+            on_error: Callable[[BaseException], None] | None = None,
+    ) -> Task:
+        """
+        Поставить функцию job в очередь. on_done получит ее результат
+        в потоке GUI; при исключении вызывается on_error (по умолчанию
+        ошибка пишется в лог). Задача с ключом key вытесняет предыдущую
+        задачу с тем же ключом; задачи без ключа выполняются всегда.
+        """
+        if key is not None:
+            self.cancel(key)
+        task = Task(key, job, on_done, on_error or self.log_error, self.signals)
+        if key is not None:
+            self._latest[key] = task
+        if not self._tasks:
+            self.busy_changed.emit(True)
+        self._tasks.add(task)
+        self.pool.start(task)
+        return task
+
+    def cancel(self, key: str) -> None:
+        """Отменить задачу с ключом key: снять с очереди или отбросить результат."""
+        task = self._latest.pop(key, None)
+        if task is None:
+            return
+        task.cancelled = True
+        if self.pool.tryTake(task):
+            self._done(task)
+
+    def shutdown(self) -> None:
+        """Снять с очереди неначатые задачи и дождаться выполняющейся."""
+        self.pool.clear()
+        self.pool.waitForDone()
+
+    def _done(self, task: Task) -> None:
+        self._tasks.discard(task)
+        if task.key is not None and self._latest.get(task.key) is task:
+            del self._latest[task.key]
+        if not self._tasks:
+            self.busy_changed.emit(False)
+
+    def _on_finished(self, task: Task, result: Any) -> None:
+        self._done(task)
+        if not task.cancelled:
+            task.on_done(result)
+
+    def _on_failed(self, task: Task, error: BaseException) -> None:
+        self._done(task)
+        if not task.cancelled:
+            task.on_error(error)
+
+    @staticmethod
+    def log_error(error: BaseException) -> None:
+        """Записать ошибку задачи в лог (обработчик ошибок по умолчанию)."""
+        logger.error('background task failed', exc_info=error)
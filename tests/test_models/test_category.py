@@ -5,8 +5,10 @@ from inspect import isgenerator
 
 import pytest
 
-from bookkeeper.models.category import Category
+from bookkeeper.models.category import Category, CategoryIndex
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import startswith
+from bookkeeper.repository.sqlite_repository import SqliteRepository
 
 
 @pytest.fixture
@@ -92,8 +94,8 @@ def test_get_subcategories_complicated(repo: MemoryRepository[Category]):
 
 def test_create_from_tree(repo):
     tree = [('parent', None), ('1', 'parent'), ('2', '1')]
-    cats = Category.create_from_tree(tree, repo)
-    assert len(cats) == len(tree)
+    assert Category.create_from_tree(tree, repo) == len(tree)
+    cats = repo.get_all()
     parent = next(c for c in cats if c.name == 'parent')
     assert parent.parent is None
     c1 = next(c for c in cats if c.name == '1')
@@ -106,3 +108,128 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+@pytest.fixture
+def tree(repo):
+    Category.create_from_tree(
+        [('0', None), ('1', '0'), ('2', '1'), ('3', '1'), ('4', '0'), ('5', None)],
+        repo)
+    return {c.name: c.pk for c in repo.get_all()}
+
+
+def test_index_structure(repo, tree):
+    index = CategoryIndex(repo)
+    assert len(index) == 6
+    assert tree['2'] in index
+    assert index.get(tree['2']).name == '2'
+    assert index.parent(tree['0']) is None
+    assert index.parent(tree['3']) == tree['1']
+    assert index.children(None) == [tree['0'], tree['5']]
+    assert index.children(tree['1']) == [tree['2'], tree['3']]
+    assert [index.depth(tree[n]) for n in '012345'] == [0, 1, 2, 2, 1, 0]
+    assert list(index.ancestors(tree['3'])) == [tree['1'], tree['0']]
+
+
+def test_index_descendants(repo, tree):
+    index = CategoryIndex(repo)
+    assert index.subtree(tree['0']) == [tree[n] for n in '1234']
+    assert index.subtree(tree['1'], include_self=True) == [tree[n] for n in '123']
+    assert index.subtree(tree['5']) == []
+    assert index.is_descendant(tree['2'], tree['0'])
+    assert index.is_descendant(tree['4'], tree['0'])
+    assert not index.is_descendant(tree['0'], tree['0'])
+    assert not index.is_descendant(tree['4'], tree['1'])
+    assert not index.is_descendant(tree['0'], tree['2'])
+    assert not index.is_descendant(tree['2'], tree['5'])
+
+
+def test_index_matches_get_subcategories(repo, tree):
+    index = CategoryIndex(repo)
+    for pk in tree.values():
+        expected = {c.pk for c in repo.get(pk).get_subcategories(repo)}
+        assert set(index.subtree(pk)) == expected
+
+
+def test_index_invalidate(repo, tree):
+    index = CategoryIndex(repo)
+    assert index.subtree(tree['5']) == []
+    pk = repo.add(Category('6', tree['5']))
+    assert index.subtree(tree['5']) == []
+    index.invalidate()
+    assert index.subtree(tree['5']) == [pk]
+    assert index.depth(pk) == 1
+
+
+def test_index_orphans_and_cycles(repo):
+    a = repo.add(Category('a', 100))
+    b = repo.add(Category('b'))
+    c = repo.add(Category('c', b))
+    repo.get(b).parent = c
+    index = CategoryIndex(repo)
+    assert len(index) == 3
+    assert index.parent(a) is None
+    assert index.depth(a) == 0
+    assert {index.depth(b), index.depth(c)} == {0, 1}
+
+
+def test_create_from_tree_batches(repo):
+    tree = [('a', None), ('b', 'a'), ('c', 'b'), ('d', 'a'),
+            ('e', None), ('f', 'c'), ('g', 'e')]
+    assert Category.create_from_tree(iter(tree), repo, batch_size=3) == len(tree)
+    by_name = {c.name: c for c in repo.get_all()}
+    for child, parent in tree:
+        expected = by_name[parent].pk if parent is not None else None
+        assert by_name[child].parent == expected
+
+
+def test_create_from_tree_sqlite(tmp_path):
+    repo = SqliteRepository(str(tmp_path / 'test.db'), Category)
+    tree = [(str(i), str(i // 2) if i else None) for i in range(1000)]
+    Category.create_from_tree(tree, repo, batch_size=100)
+    by_name = {c.name: c for c in repo.get_all()}
+    assert len(by_name) == 1000
+    assert by_name['999'].parent == by_name['499'].pk
+    assert by_name['0'].parent is None
+    repo.close()
+
+
+def test_deep_tree_traversal(repo):
+    depth = 5000
+    tree = [(str(i), str(i - 1) if i else None) for i in range(depth)]
+    Category.create_from_tree(tree, repo)
+    first = repo.get_all({'name': '0'})[0]
+    last = repo.get_all({'name': str(depth - 1)})[0]
+    assert len(list(last.get_all_parents(repo))) == depth - 1
+    assert [c.name for c in first.get_subcategories(repo)] == \
+        [str(i) for i in range(1, depth)]
+
+
+@pytest.mark.parametrize('make_repo', [
+    lambda tmp_path: MemoryRepository(indexes=('name',)),
+    lambda tmp_path: SqliteRepository(str(tmp_path / 'test.db'), Category),
+])
+def test_name_lookup(tmp_path, make_repo):
+    repo = make_repo(tmp_path)
+    Category.create_from_tree([('мясо', None), ('мясные продукты', 'мясо'),
+                               ('молоко', None), ('сладости', None),
+                               ("чай 'зеленый'", None)], repo)
+    assert Category.get_by_name('молоко', repo).name == 'молоко'
+    assert Category.get_by_name("чай 'зеленый'", repo) is not None
+    assert Category.get_by_name('хлеб', repo) is None
+    assert [c.name for c in Category.find_by_prefix('м', repo)] == \
+        ['молоко', 'мясные продукты', 'мясо']
+    assert [c.name for c in Category.find_by_prefix('мяс', repo, limit=1)] == \
+        ['мясные продукты']
+    assert Category.find_by_prefix('ю', repo) == []
+    assert len(Category.find_by_prefix('', repo)) == 5
+
+
+def test_startswith():
+    assert startswith('ab').matches('abc')
+    assert startswith('ab').matches('ab')
+    assert not startswith('ab').matches('ac')
+    assert not startswith('ab').matches('a')
+    assert not startswith('ab').matches(None)
+    assert startswith('a\U0010ffff').value == ('a\U0010ffff', 'b')
+    assert startswith('').matches('x')
@@ -0,0 +1,49 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter.budget_totals import BudgetTotals
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+@pytest.fixture
+def repo():
+    repo = MemoryRepository()
+    repo.add_many([
+        Expense(100, 1, expense_date=datetime(2023, 2, 26, 10)),
+        Expense(200, 2, expense_date=date(2023, 2, 27)),
+        Expense(300, 1, expense_date=datetime(2023, 3, 1, 9)),
+    ])
+    return repo
+
+
+def test_from_repository(repo):
+    totals = BudgetTotals.from_repository(repo)
+    assert totals.get('day', date(2023, 3, 1)) == 300
+    assert totals.get('week', date(2023, 3, 1)) == 500
+    assert totals.get('week', date(2023, 2, 26)) == 100
+    assert totals.get('month', date(2023, 2, 10)) == 300
+    assert totals.get('year', date(2023, 12, 31)) == 600
+    assert totals.get('day', date(2024, 1, 1)) == 0
+
+
+def test_incremental_updates(repo):
+    totals = BudgetTotals.from_repository(repo)
+    new = Expense(50, 1, expense_date=date(2023, 3, 1))
+    repo.add(new)
+    totals.add(new)
+    old = repo.get(1)
+    moved = Expense(100, 1, expense_date=date(2023, 3, 2), pk=old.pk)
+    repo.update(moved)
+    totals.replace(old, moved)
+    removed = repo.get(2)
+    repo.delete(removed.pk)
+    totals.remove(removed)
+
+    rebuilt = BudgetTotals.from_repository(repo)
+    for period in ('day', 'week', 'month', 'year'):
+        for day in (date(2023, 2, 26), date(2023, 2, 27), date(2023, 3, 1),
+                    date(2023, 3, 2)):
+            assert totals.get(period, day) == rebuilt.get(period, day)
+    assert totals.get('week', date(2023, 3, 1)) == 450
@@ -0,0 +1,51 @@
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter.expense_pages import ExpensePages
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+def fetch(pages):
+    page = pages.load(pages.last_pk)
+    pages.extend(page)
+    return page
+
+
+@pytest.fixture
+def repo():
+    repo = MemoryRepository()
+    repo.add_many([Expense(i, 1) for i in range(5)])
+    return repo
+
+
+def test_pages(repo):
+    pages = ExpensePages(repo, 2)
+    pages.reset(pages.load())
+    assert [e.amount for e in pages.items] == [0, 1]
+    assert pages.has_more
+    assert [e.amount for e in fetch(pages)] == [2, 3]
+    assert [e.amount for e in fetch(pages)] == [4]
+    assert not pages.has_more
+    assert [e.amount for e in pages.items] == list(range(5))
+
+
+def test_add_before_last_page(repo):
+    pages = ExpensePages(repo, 2)
+    pages.reset(pages.load())
+    expense = Expense(5, 1)
+    repo.add(expense)
+    assert not pages.add(expense)
+    while pages.has_more:
+        fetch(pages)
+    assert [e.amount for e in pages.items] == list(range(6))
+
+
+def test_add_after_last_page(repo):
+    pages = ExpensePages(repo, 10)
+    pages.reset(pages.load())
+    expense = Expense(5, 1)
+    repo.add(expense)
+    assert pages.add(expense)
+    assert pages.items[-1] is expense
+    assert fetch(pages) == []
+    assert [e.amount for e in pages.items] == list(range(6))
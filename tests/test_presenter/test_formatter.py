@@ -0,0 +1,23 @@
+from datetime import date, datetime
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter import formatter
+from bookkeeper.presenter.budget_totals import BudgetTotals
+
+
+def test_format_expense():
+    expense = Expense(100, 1, expense_date=datetime(2023, 3, 1, 23, 59), comment='хлеб')
+    assert formatter.format_expense(expense, {1: 'продукты'}) == \
+        ['2023-03-01', '100', 'продукты', 'хлеб']
+    assert formatter.format_expense(expense, {})[2] == ''
+
+
+def test_format_budget():
+    totals = BudgetTotals()
+    totals.add(Expense(100, 1, expense_date=datetime.now()))
+    totals.add(Expense(200, 1, expense_date=date(2000, 1, 1)))
+    assert formatter.format_budget(Budget(1000, 'День'), totals) == \
+        ['День', '1000', '100']
+    assert formatter.format_budget(Budget(1000, 'Квартал'), totals) == \
+        ['Квартал', '1000', '0']
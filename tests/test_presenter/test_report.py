@@ -0,0 +1,77 @@
+from datetime import date, datetime
+
+import pytest
+
+from bookkeeper.models.category import Category, CategoryIndex
+from bookkeeper.models.expense import Expense
+from bookkeeper.presenter.formatter import format_report_data
+from bookkeeper.presenter.report import CategoryTotal, category_report, rollup
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+
+
+@pytest.fixture
+def categories():
+    repo = MemoryRepository()
+    Category.create_from_tree(
+        [('продукты', None), ('мясо', 'продукты'), ('сладости', 'продукты'),
+         ('шоколад', 'сладости'), ('книги', None)],
+        repo)
+    return repo, {c.name: c.pk for c in repo.get_all()}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def expenses(request, tmp_path, categories):
+    _, pk = categories
+    if request.param == 'memory':
+        repo = MemoryRepository()
+    else:
+        repo = SqliteRepository(str(tmp_path / 'test.db'), Expense)
+        request.addfinalizer(repo.close)
+    repo.add_many([
+        Expense(100, pk['продукты'], expense_date=datetime(2023, 3, 1, 10)),
+        Expense(200, pk['мясо'], expense_date=datetime(2023, 3, 2)),
+        Expense(300, pk['шоколад'], expense_date=datetime(2023, 3, 3)),
+        Expense(400, pk['шоколад'], expense_date=datetime(2023, 4, 1)),
+        Expense(500, pk['книги'], expense_date=datetime(2023, 3, 5)),
+        Expense(600, 100, expense_date=datetime(2023, 3, 5)),
+    ])
+    return repo
+
+
+def test_rollup(categories):
+    repo, pk = categories
+    index = CategoryIndex(repo)
+    totals = rollup(index, {pk['мясо']: 1, pk['шоколад']: 2, pk['продукты']: 4})
+    assert totals[pk['продукты']] == CategoryTotal(4, 7)
+    assert totals[pk['сладости']] == CategoryTotal(0, 2)
+    assert totals[pk['шоколад']] == CategoryTotal(2, 2)
+    assert totals[pk['книги']] == CategoryTotal(0, 0)
+    assert None not in totals
+
+
+def test_category_report(categories, expenses):
+    repo, pk = categories
+    index = CategoryIndex(repo)
+    totals = category_report(expenses, index, date(2023, 3, 1), date(2023, 4, 1))
+    assert totals[pk['продукты']] == CategoryTotal(100, 600)
+    assert totals[pk['сладости']] == CategoryTotal(0, 300)
+    assert totals[pk['книги']] == CategoryTotal(500, 500)
+    assert totals[None] == CategoryTotal(600, 600)
+
+    totals = category_report(expenses, index, start=date(2023, 3, 3))
+    assert totals[pk['продукты']].total == 700
+    totals = category_report(expenses, index)
+    assert totals[pk['сладости']].total == 700
+
+
+def test_format_report_data(categories):
+    repo, pk = categories
+    index = CategoryIndex(repo)
+    totals = rollup(index, {pk['мясо']: 1, None: 5})
+    rows = format_report_data(index, totals)
+    assert rows[0] == [str(pk['продукты']), 'продукты', '0', '0', '1']
+    assert rows[1] == [str(pk['мясо']), 'мясо', str(pk['продукты']), '1', '1']
+    assert [row[1] for row in rows] == [
+        'продукты', 'мясо', 'сладости', 'шоколад', 'книги', 'Без категории']
+    assert rows[-1] == ['', 'Без категории', '0', '5', '5']
@@ -0,0 +1,9 @@
+import pytest
+
+from bookkeeper.repository.connection import ConnectionManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    with ConnectionManager(str(tmp_path / 'test')) as m:
+        yield m
@@ -0,0 +1,120 @@
+import pytest
+
+from bookkeeper.repository.cached_repository import CachedRepository, query_key
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import isin
+from bookkeeper.models.category import Category
+
+
+class CountingRepository(MemoryRepository):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get(self, pk):
+        self.reads += 1
+        return super().get(pk)
+
+    def get_all(self, *args, **kwargs):
+        self.reads += 1
+        return super().get_all(*args, **kwargs)
+
+
+@pytest.fixture
+def inner():
+    repo = CountingRepository()
+    repo.add_many([Category('food'), Category('meat', 1), Category('books')])
+    return repo
+
+
+@pytest.fixture
+def repo(inner):
+    return CachedRepository(inner, maxsize=2)
+
+
+def test_get_cached(repo, inner):
+    obj = repo.get(1)
+    assert repo.get(1) is obj
+    assert repo.get(100) is None
+    assert inner.reads == 2
+    info = repo.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 1)
+
+
+def test_lru_eviction(repo, inner):
+    repo.get(1)
+    repo.get(2)
+    repo.get(1)
+    repo.get(3)
+    assert repo.cache_info().currsize == 2
+    inner.reads = 0
+    repo.get(1)
+    assert inner.reads == 0
+    repo.get(2)
+    assert inner.reads == 1
+
+
+def test_get_all_memoised(repo, inner):
+    result = repo.get_all({'name': 'meat'})
+    assert result == [Category('meat', 1, 2)]
+    assert repo.get_all({'name': 'meat'}) == result
+    assert repo.get(2) is result[0]
+    assert repo.get_all({'name': isin(['meat', 'food'])}, order_by='name') == \
+        [Category('food', None, 1), Category('meat', 1, 2)]
+    assert inner.reads == 2
+    # возвращается копия списка
+    result.clear()
+    assert len(repo.get_all({'name': 'meat'})) == 1
+
+
+def test_write_through(repo, inner):
+    assert len(repo.get_all()) == 3
+    cat = Category('clothes')
+    repo.add(cat)
+    assert inner.get(cat.pk) is cat
+    assert len(repo.get_all()) == 4
+    cat.name = 'shoes'
+    repo.update(cat)
+    assert repo.get_all({'name': 'shoes'}) == [cat]
+    repo.delete(cat.pk)
+    assert repo.get(cat.pk) is None
+    assert repo.get_all({'name': 'shoes'}) == []
+    repo.add_many([Category('a'), Category('b')])
+    assert len(repo.get_all()) == 5
+    repo.update_many([Category('c', pk=1)])
+    assert repo.get(1).name == 'c'
+    repo.delete_many([1, 2])
+    assert repo.get(1) is None
+    assert len(repo.get_all()) == 3
+
+
+def test_failed_update_drops_object(repo, inner):
+    cat = repo.get(1)
+    cat.name = 'changed'
+    inner.update = None
+    with pytest.raises(TypeError):
+        repo.update(cat)
+    del inner.update
+    assert repo.get(1) is not None
+    assert repo.cache_info().misses == 2
+
+
+def test_unhashable_where_not_memoised(repo, inner):
+    assert query_key({'name': ['a']}) is None
+    assert query_key({'b': 1, 'a': 2}) == query_key({'a': 2, 'b': 1})
+    repo.get_all({'name': isin(['food'])})
+    repo.get_all({'name': isin(['food'])})
+    assert inner.reads == 1
+
+
+def test_clear(repo, inner):
+    repo.get(1)
+    inner.update(Category('other', pk=1))
+    repo.clear()
+    assert repo.get(1).name == 'other'
+    assert repo.cache_info().hits == 0
+
+
+def test_wrong_size(inner):
+    with pytest.raises(ValueError):
+        CachedRepository(inner, maxsize=0)
@@ -0,0 +1,140 @@
+from datetime import date, datetime, timedelta
+import random
+
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import between, ge, in_range, isin, lt
+
+np = pytest.importorskip('numpy')
+
+from bookkeeper.repository.column_store import ExpenseColumnStore  # noqa: E402
+
+
+def make_expenses(n, seed=0):
+    rnd = random.Random(seed)
+    start = datetime(2022, 12, 25)
+    return [
+        Expense(rnd.randint(1, 1000),
+                rnd.choice([None, 1, 2, 3]),
+                expense_date=start + timedelta(minutes=rnd.randint(0, 60 * 24 * 500)),
+                added_date=datetime(2023, 1, 1, 12, 30, 15, 123456),
+                comment=rnd.choice(['', 'хлеб', 'кофе', 'книга']))
+        for _ in range(n)
+    ]
+
+
+@pytest.fixture
+def repo():
+    return ExpenseColumnStore(capacity=4)
+
+
+@pytest.fixture
+def pair():
+    store, memory = ExpenseColumnStore(), MemoryRepository()
+    store.add_many(make_expenses(300))
+    memory.add_many(make_expenses(300))
+    return store, memory
+
+
+def test_crud(repo):
+    exp = Expense(100, 1, expense_date=datetime(2023, 3, 1, 10, 5, 7, 11), comment='чай')
+    pk = repo.add(exp)
+    assert exp.pk == pk == 1
+    assert repo.get(pk) == exp
+    exp2 = Expense(200, None, comment='кофе', pk=pk)
+    repo.update(exp2)
+    assert repo.get(pk) == exp2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    assert repo.add(Expense(1, 1)) == 2
+
+
+def test_errors(repo):
+    with pytest.raises(ValueError):
+        repo.add(Expense(1, 1, pk=5))
+    with pytest.raises(ValueError):
+        repo.update(Expense(1, 1))
+    with pytest.raises(ValueError):
+        repo.update(Expense(1, 1, pk=5))
+    with pytest.raises(KeyError):
+        repo.delete(5)
+    repo.add(Expense(1, 1))
+    with pytest.raises(KeyError):
+        repo.delete_many([1, 5])
+    assert repo.get(1) is not None
+    with pytest.raises(ValueError):
+        repo.get_all({'unknown': 1})
+
+
+def test_growth_and_delete_many(repo):
+    pks = repo.add_many(make_expenses(100))
+    assert pks == list(range(1, 101))
+    repo.delete_many(pks[::2])
+    assert [e.pk for e in repo.get_all()] == pks[1::2]
+    assert repo.get(pks[1]).pk == pks[1]
+    assert repo.get(pks[0]) is None
+
+
+@pytest.mark.parametrize('where', [
+    None,
+    {'category': 2},
+    {'category': None},
+    {'category': isin([1, None])},
+    {'category': ge(2)},
+    {'amount': lt(300)},
+    {'expense_date': between(date(2023, 2, 1), date(2023, 5, 1))},
+    {'expense_date': in_range(date(2023, 2, 1), datetime(2023, 5, 1, 12))},
+    {'comment': 'кофе', 'amount': ge(500)},
+    {'pk': isin([1, 5, 7, 1000])},
+])
+def test_get_all_matches_memory(pair, where):
+    store, memory = pair
+    assert store.get_all(where) == memory.get_all(where)
+
+
+@pytest.mark.parametrize('order_by', ['amount', '-amount', 'category', '-category',
+                                      '-expense_date', 'comment', '-comment'])
+def test_order_matches_memory(pair, order_by):
+    store, memory = pair
+    assert store.get_all(order_by=order_by, limit=50, offset=10) == \
+        memory.get_all(order_by=order_by, limit=50, offset=10)
+
+
+@pytest.mark.parametrize('group_by', [None, 'category', 'day', 'week', 'month', 'year'])
+def test_sum_amount_matches_memory(pair, group_by):
+    store, memory = pair
+    where = {'expense_date': ge(date(2023, 1, 1))}
+    assert store.sum_amount(group_by=group_by) == memory.sum_amount(group_by=group_by)
+    assert store.sum_amount(where, group_by) == memory.sum_amount(where, group_by)
+    assert store.sum_amount({'amount': lt(0)}, group_by) == \
+        memory.sum_amount({'amount': lt(0)}, group_by)
+
+
+def test_writes_match_memory(pair):
+    store, memory = pair
+    for repo in pair:
+        objs = repo.get_all({'category': 1})
+        for obj in objs:
+            obj.comment = 'обновлено ' + obj.comment
+            obj.amount += 1
+        repo.update_many(objs)
+        repo.delete_many([obj.pk for obj in repo.get_all({'comment': 'хлеб'})])
+    assert store.get_all() == memory.get_all()
+    assert list(store.iter_all(batch_size=7)) == memory.get_all()
+
+
+def test_comment_buffer_is_compacted(repo):
+    pk = repo.add(Expense(1, 1, comment='x' * 100))
+    for i in range(50):
+        repo.update(Expense(1, 1, comment=str(i) * 100, pk=pk))
+    assert repo.get(pk).comment == '49' * 100
+    # без уплотнения в буфере осталось бы 51 * 100 байт
+    assert repo.nbytes < 2000
+
+
+def test_memory_per_expense():
+    repo = ExpenseColumnStore()
+    repo.add_many(Expense(1, 1, comment='') for _ in range(10000))
+    assert repo.nbytes / 10000 < 100
@@ -0,0 +1,194 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from bookkeeper.repository.connection import ConnectionManager
+
+
+def test_same_connection_in_thread(manager):
+    assert manager.connection() is manager.connection()
+
+
+def test_connection_per_thread(manager):
+    other = []
+    t = threading.Thread(target=lambda: other.append(manager.connection()))
+    t.start()
+    t.join()
+    assert other[0] is not manager.connection()
+
+
+def test_pragmas(tmp_path):
+    with ConnectionManager(str(tmp_path / 'test.db'), journal_mode='wal',
+                           synchronous='off', cache_size=-1000) as manager:
+        con = manager.connection()
+        assert con.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert con.execute('PRAGMA synchronous').fetchone()[0] == 0
+        assert con.execute('PRAGMA cache_size').fetchone()[0] == -1000
+        assert con.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+
+
+def test_wrong_settings(tmp_path):
+    with pytest.raises(ValueError):
+        ConnectionManager(str(tmp_path / 'test.db'), journal_mode='fast')
+    with pytest.raises(ValueError):
+        ConnectionManager(str(tmp_path / 'test.db'), synchronous='sometimes')
+
+
+def test_close(manager):
+    con = manager.connection()
+    manager.close()
+    assert manager.closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute('SELECT 1')
+    with pytest.raises(sqlite3.ProgrammingError):
+        manager.connection()
+    manager.close()
+
+
+def test_for_database_is_shared(tmp_path):
+    db = str(tmp_path / 'test.db')
+    m1 = ConnectionManager.for_database(db)
+    assert ConnectionManager.for_database(db) is m1
+    m1.close()
+    m2 = ConnectionManager.for_database(db)
+    assert m2 is not m1
+    m2.close()
+
+
+def test_release_closes_with_last_reference(tmp_path):
+    db = str(tmp_path / 'test.db')
+    manager = ConnectionManager.for_database(db)
+    ConnectionManager.for_database(db)
+    manager.release()
+    assert not manager.closed
+    manager.release()
+    assert manager.closed
+
+
+@pytest.fixture
+def table(manager):
+    con = manager.connection()
+    con.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER)')
+    return manager
+
+
+def insert(manager, v, rows=1):
+    with manager.write(rows) as con:
+        con.execute('INSERT INTO t (v) VALUES (?)', (v,))
+
+
+def committed(manager):
+    with sqlite3.connect(manager.database) as con:
+        return [row[0] for row in con.execute('SELECT v FROM t ORDER BY id')]
+
+
+def test_write_commits_immediately(table):
+    insert(table, 1)
+    assert committed(table) == [1]
+
+
+def test_group_commit_by_rows(table):
+    table.commit_every_rows = 3
+    insert(table, 1)
+    insert(table, 2)
+    assert committed(table) == []
+    assert table.connection().execute('SELECT COUNT(*) FROM t').fetchone() == (2,)
+    insert(table, 3)
+    assert committed(table) == [1, 2, 3]
+    insert(table, 4)
+    table.flush()
+    assert committed(table) == [1, 2, 3, 4]
+
+
+def wait_committed(manager, expected, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while committed(manager) != expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return committed(manager)
+
+
+def test_group_commit_by_time(table):
+    table.commit_every_ms = 100
+    insert(table, 1)
+    assert committed(table) == []
+    assert wait_committed(table, [1]) == [1]
+    insert(table, 2)
+    insert(table, 3)
+    assert wait_committed(table, [1, 2, 3]) == [1, 2, 3]
+
+
+def test_group_commit_from_two_threads(table):
+    table.commit_every_rows = 100
+    insert(table, 1)
+    errors = []
+
+    def other():
+        try:
+            insert(table, 2)
+            with table.transaction():
+                insert(table, 3)
+            insert(table, 4)
+            table.flush()
+        except sqlite3.Error as error:
+            errors.append(error)
+
+    start = time.monotonic()
+    thread = threading.Thread(target=other)
+    thread.start()
+    thread.join()
+    assert errors == []
+    assert time.monotonic() - start < 1
+    assert committed(table) == [1, 2, 3, 4]
+    insert(table, 5)
+    table.flush()
+    assert committed(table) == [1, 2, 3, 4, 5]
+
+
+def test_group_commit_failed_write(table):
+    table.commit_every_rows = 100
+    insert(table, 1)
+    with pytest.raises(RuntimeError):
+        with table.write() as con:
+            con.execute('INSERT INTO t (v) VALUES (2)')
+            raise RuntimeError
+    insert(table, 3)
+    table.flush()
+    assert committed(table) == [1, 3]
+
+
+def test_close_flushes(table):
+    table.commit_every_rows = 100
+    insert(table, 1)
+    table.close()
+    assert committed(table) == [1]
+
+
+def test_transaction(table):
+    table.commit_every_rows = 100
+    insert(table, 1)
+    with table.transaction():
+        assert committed(table) == [1]
+        insert(table, 2)
+        insert(table, 3)
+        assert committed(table) == [1]
+    assert committed(table) == [1, 2, 3]
+    with pytest.raises(RuntimeError):
+        with table.transaction():
+            insert(table, 4)
+            raise RuntimeError
+    table.flush()
+    assert committed(table) == [1, 2, 3]
+
+
+def test_nested_transaction(table):
+    with table.transaction():
+        insert(table, 1)
+        with pytest.raises(RuntimeError):
+            with table.transaction():
+                insert(table, 2)
+                raise RuntimeError
+        insert(table, 3)
+    assert committed(table) == [1, 3]
+    assert not table.connection().in_transaction
@@ -1,4 +1,9 @@
+from datetime import date, datetime
+from inspect import isgenerator
+
+from bookkeeper.models.expense import Expense
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import isin, lt, gt, ge, between
 
 import pytest
 
@@ -69,3 +74,118 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(2)]
+    objects[1].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    pks = repo.add_many([custom_class() for i in range(3)])
+    new = [custom_class() for i in range(3)]
+    for o, pk in zip(new, pks):
+        o.pk = pk
+    repo.update_many(new)
+    assert repo.get_all() == new
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[:2])
+    assert repo.get_all() == objects[2:]
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[2], 100])
+    assert repo.get_all() == objects[2:]
+
+
+@pytest.fixture
+def items():
+    class Item:
+        def __init__(self, name, value):
+            self.name = name
+            self.value = value
+            self.pk = 0
+    return [Item(str(i), i % 4) for i in range(12)]
+
+
+@pytest.mark.parametrize('indexes', [(), ('value',), ('value', 'name')])
+def test_get_all_with_operators(items, indexes):
+    repo = MemoryRepository(indexes=indexes)
+    repo.add_many(items)
+    names = lambda objs: [o.name for o in objs]
+    assert names(repo.get_all({'value': lt(1)})) == ['0', '4', '8']
+    assert names(repo.get_all({'value': between(1, 2), 'name': isin(['1', '2', '3'])})) \
+        == ['1', '2']
+    assert names(repo.get_all({'value': ge(3)})) == ['3', '7', '11']
+    assert names(repo.get_all({'value': 2})) == ['2', '6', '10']
+    assert names(repo.get_all(order_by='-value', limit=4)) == ['3', '7', '11', '2']
+    assert names(repo.get_all({'value': isin([0, 1])}, order_by='name',
+                              limit=2, offset=1)) == ['1', '4']
+
+
+def test_index_is_maintained(items):
+    repo = MemoryRepository(indexes=('value',))
+    repo.add_many(items[:4])
+    items[0].value = 3
+    repo.update(items[0])
+    repo.delete(items[1].pk)
+    assert repo.get_all({'value': 0}) == []
+    assert repo.get_all({'value': isin([1, 3])}) == [items[0], items[3]]
+    assert repo.get_all({'value': gt(2)}) == [items[0], items[3]]
+
+
+def test_iter_all(items):
+    repo = MemoryRepository(indexes=('value',))
+    repo.add_many(items)
+    gen = repo.iter_all({'value': 1})
+    assert isgenerator(gen)
+    first = next(gen)
+    repo.delete(items[5].pk)
+    repo.add(custom := type(first)('new', 1))
+    assert [first, *gen] == [items[1], items[9]]
+    assert repo.get_all({'value': 1}) == [items[1], items[9], custom]
+
+
+def test_sum_amount_totals_are_maintained():
+    repo = MemoryRepository()
+    expenses = [Expense(100 * i, i % 3, datetime(2023, 1 + i % 2, 1 + i))
+                for i in range(10)]
+    repo.add_many(expenses[:6])
+    assert repo.sum_amount(group_by='category') == {0: 300, 1: 500, 2: 700}
+    assert repo.sum_amount(group_by='month') == {date(2023, 1, 1): 600,
+                                                  date(2023, 2, 1): 900}
+    repo.add_many(expenses[6:])
+    expenses[0].category = 1
+    expenses[0].amount = 50
+    repo.update(expenses[0])
+    repo.delete(expenses[3].pk)
+    repo.delete_many([expenses[6].pk, expenses[9].pk])
+    scanned = [e for e in expenses if e.pk not in (expenses[3].pk, expenses[6].pk,
+                                                   expenses[9].pk)]
+    for group_by in (None, 'category', 'day', 'month'):
+        fold = MemoryRepository()
+        fold.add_many([Expense(e.amount, e.category, e.expense_date) for e in scanned])
+        assert repo.sum_amount(group_by=group_by) == \
+            fold.sum_amount({'amount': ge(0)}, group_by)
+    assert 0 not in repo.sum_amount(group_by='category')
+
+
+def test_sum_amount_empty():
+    repo = MemoryRepository()
+    assert repo.sum_amount() == {None: 0}
+    pk = repo.add(Expense(100, 1))
+    repo.delete(pk)
+    assert repo.sum_amount() == {None: 0}
+    assert repo.sum_amount(group_by='category') == {}
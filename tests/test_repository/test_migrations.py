@@ -0,0 +1,124 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.migrations import (
+    MIGRATIONS, SCHEMA_VERSION, Migration, migrate, schema_version
+)
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+
+
+def repos(manager):
+    return [SqliteRepository(manager.database, cls, manager, ensure_schema=False)
+            for cls in (Category, Expense, Budget)]
+
+
+def test_migrate_fresh_database(manager):
+    assert migrate(manager) == SCHEMA_VERSION
+    con = manager.connection()
+    assert schema_version(con) == SCHEMA_VERSION
+    names = {row[0] for row in con.execute('SELECT name FROM sqlite_master')}
+    assert {'category', 'expense', 'budget', 'schema_version',
+            'expense_expense_date_idx', 'expense_category_idx',
+            'category_parent_idx', 'category_name_key_idx'} <= names
+    cat_repo, exp_repo, bud_repo = repos(manager)
+    cat = Category('food')
+    cat_repo.add(cat)
+    cat_repo.add(Category('food', cat.pk))
+    with pytest.raises(sqlite3.IntegrityError):
+        cat_repo.add(Category('food', cat.pk))
+    with pytest.raises(sqlite3.IntegrityError):
+        cat_repo.add(Category('food'))
+    exp = Expense(100, cat.pk, datetime(2023, 3, 1, 12), datetime(2023, 3, 1), 'x')
+    exp_repo.add(exp)
+    bud_repo.add(Budget(10, 'День'))
+    assert exp_repo.get(exp.pk) == exp
+
+
+def test_current_version_skips_ddl(manager):
+    migrate(manager)
+    statements = []
+    con = manager.connection()
+    con.set_trace_callback(statements.append)
+    assert migrate(manager) == SCHEMA_VERSION
+    SqliteRepository(manager.database, Expense, manager, ensure_schema=False)
+    con.set_trace_callback(None)
+    assert statements == ['SELECT MAX(version) FROM schema_version']
+
+
+def test_foreign_keys(manager):
+    migrate(manager)
+    cat_repo, exp_repo, _ = repos(manager)
+    parent = Category('parent')
+    cat_repo.add(parent)
+    child = Category('child', parent.pk)
+    cat_repo.add(child)
+    exp = Expense(100, child.pk)
+    exp_repo.add(exp)
+    with pytest.raises(sqlite3.IntegrityError):
+        exp_repo.add(Expense(100, 1000))
+    cat_repo.delete(child.pk)
+    assert exp_repo.get(exp.pk).category is None
+    cat_repo.delete(parent.pk)
+    assert cat_repo.get_all() == []
+
+
+def test_migrate_legacy_database(manager):
+    con = manager.connection()
+    con.executescript('''
+        CREATE TABLE category (id INTEGER PRIMARY KEY, name TEXT, parent INTEGER);
+        CREATE TABLE expense (id INTEGER PRIMARY KEY, amount TEXT, category TEXT,
+                              expense_date TEXT, added_date TEXT, comment TEXT);
+        CREATE TABLE budget (id INTEGER PRIMARY KEY, amount TEXT, period TEXT);
+        INSERT INTO category VALUES (1, 'food', NULL), (2, 'meat', 1), (3, 'lost', 7),
+                                    (4, 'meat', 1), (5, 'food', NULL);
+        INSERT INTO expense VALUES (1, '100', '2', '2023-03-01 12:30:00',
+                                    '2023-03-01 12:31:00', 'a');
+        INSERT INTO expense VALUES (2, '50', '9', '2023-03-02', '2023-03-02', '');
+        INSERT INTO budget VALUES (1, '1000', 'День');
+    ''')
+    assert migrate(manager) == SCHEMA_VERSION
+    cat_repo, exp_repo, bud_repo = repos(manager)
+    assert cat_repo.get(2) == Category('meat', 1, 2)
+    assert cat_repo.get(3).parent is None
+    assert cat_repo.get(4).name == 'meat (4)'
+    assert cat_repo.get(5).name == 'food (5)'
+    assert exp_repo.get_all() == [
+        Expense(100, 2, datetime(2023, 3, 1, 12, 30), datetime(2023, 3, 1, 12, 31),
+                'a', 1),
+        Expense(50, None, datetime(2023, 3, 2), datetime(2023, 3, 2), '', 2),
+    ]
+    assert bud_repo.get_all() == [Budget(1000, 'День', 1)]
+    assert con.execute('PRAGMA foreign_key_list(expense)').fetchall()
+
+
+def test_unique_names_without_migrations(manager):
+    con = manager.connection()
+    con.executescript('''
+        CREATE TABLE category (id INTEGER PRIMARY KEY, name TEXT, parent INTEGER);
+        INSERT INTO category VALUES (1, 'food', NULL), (2, 'food', NULL);
+    ''')
+    repo = SqliteRepository(manager.database, Category, manager)
+    assert repo.get(2).name == 'food (2)'
+    with pytest.raises(sqlite3.IntegrityError):
+        repo.add(Category('food'))
+    repo.add(Category('food', 1))
+    assert Category.get_by_name('food', repo).pk == 1
+
+
+def test_failed_step_is_rolled_back(manager):
+    def broken(con):
+        con.execute('CREATE TABLE half_done (id INTEGER)')
+        raise RuntimeError('broken step')
+
+    with pytest.raises(RuntimeError):
+        migrate(manager, [*MIGRATIONS, Migration(SCHEMA_VERSION + 1, 'broken', broken)])
+    con = manager.connection()
+    assert schema_version(con) == SCHEMA_VERSION
+    assert con.execute("SELECT 1 FROM sqlite_master "
+                       "WHERE name = 'half_done'").fetchone() is None
+    assert con.execute('PRAGMA foreign_keys').fetchone() == (1,)
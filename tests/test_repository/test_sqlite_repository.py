@@ -0,0 +1,371 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from inspect import isgenerator
+
+import pytest
+
+from bookkeeper.repository.connection import ConnectionManager
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import isin, lt, ge, between, in_range
+from bookkeeper.repository.sqlite_repository import SqliteRepository, make_row_factory
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+
+
+@dataclass
+class Custom:
+    name: str = ''
+    value: int = 0
+    pk: int = 0
+
+
+@pytest.fixture
+def repo(tmp_path, manager):
+    return SqliteRepository(str(tmp_path / 'test'), Custom, manager)
+
+
+def test_add(repo):
+    obj = Custom('a', 1)
+    pk = repo.add(obj)
+    assert obj.pk == pk
+    assert pk > 0
+
+
+def test_cannot_add_with_pk(repo):
+    with pytest.raises(ValueError):
+        repo.add(Custom('a', 1, pk=1))
+
+
+def test_repositories_share_connection(tmp_path, manager):
+    db = str(tmp_path / 'test')
+    r1 = SqliteRepository(db, Custom, manager)
+    r2 = SqliteRepository(db, Custom, manager)
+    assert r1.manager.connection() is r2.manager.connection()
+
+
+def test_default_manager_is_shared(tmp_path):
+    db = str(tmp_path / 'shared')
+    with SqliteRepository(db, Custom) as r1:
+        r2 = SqliteRepository(db, Custom)
+        assert r1.manager is r2.manager
+    assert not r2.manager.closed
+    r2.add(Custom('a', 1))
+    r1.close()
+    assert not r2.manager.closed
+    r2.close()
+    assert r2.manager.closed
+
+
+def test_close_keeps_passed_manager(tmp_path, manager):
+    with SqliteRepository(str(tmp_path / 'test'), Custom, manager) as repo:
+        repo.add(Custom('a', 1))
+    assert not manager.closed
+    assert manager.connection().execute('SELECT name FROM custom').fetchall() == [('a',)]
+
+
+def rows(repo):
+    return repo.manager.connection().execute(
+        f'SELECT id, name, value FROM {repo.table_name}').fetchall()
+
+
+def test_add_many(repo):
+    repo.add(Custom('first', 0))
+    objs = [Custom(str(i), i) for i in range(5)]
+    pks = repo.add_many(objs)
+    assert pks == [obj.pk for obj in objs]
+    assert pks == list(range(2, 7))
+    assert rows(repo)[1:] == [(o.pk, o.name, o.value) for o in objs]
+
+
+def test_add_many_with_pk(repo):
+    with pytest.raises(ValueError):
+        repo.add_many([Custom('a'), Custom('b', pk=1)])
+    assert rows(repo) == []
+
+
+def test_update_many(repo):
+    objs = [Custom(str(i), i) for i in range(3)]
+    repo.add_many(objs)
+    for obj in objs:
+        obj.name = f"it's {obj.value}"
+    repo.update_many(objs)
+    assert [r[1] for r in rows(repo)] == ["it's 0", "it's 1", "it's 2"]
+
+
+def test_update_many_unexistent(repo):
+    objs = [Custom(str(i), i) for i in range(3)]
+    repo.add_many(objs)
+    objs[0].name = 'new'
+    with pytest.raises(ValueError):
+        repo.update_many([objs[0], Custom('x', pk=100)])
+    assert rows(repo)[0][1] == '0'
+
+
+def test_delete_many(repo):
+    pks = repo.add_many([Custom(str(i), i) for i in range(4)])
+    repo.delete_many(pks[1:3])
+    assert [r[0] for r in rows(repo)] == [pks[0], pks[3]]
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[0], 100])
+    assert len(rows(repo)) == 2
+
+
+def test_get_all_with_text_condition(repo):
+    repo.add_many([Custom("it's", 1), Custom('other', 2), Custom("it's", 3)])
+    assert len(repo.get_all({'name': "it's"})) == 2
+    assert len(repo.get_all({'name': "it's", 'value': 3})) == 1
+    assert repo.get_all({'name': 'none'}) == []
+
+
+def test_get_all_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.get_all({'name; DROP TABLE custom': 1})
+
+
+def test_where_queries_are_cached(repo):
+    repo.get_all({'name': 'a'})
+    repo.get_all({'name': 'b'})
+    assert len(repo._where_queries) == 1
+
+
+def test_update_text(repo):
+    obj = Custom('a', 1)
+    repo.add(obj)
+    obj.name = "it's new"
+    repo.update(obj)
+    assert rows(repo) == [(obj.pk, "it's new", 1)]
+
+
+def test_cannot_update_unexistent(repo):
+    with pytest.raises(ValueError):
+        repo.update(Custom('a', 1, pk=10))
+
+
+def test_delete(repo):
+    pk = repo.add(Custom('a', 1))
+    assert repo.get(pk) is not None
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+
+
+def test_get_all_with_operators(repo):
+    repo.add_many([Custom(str(i), i) for i in range(10)])
+    values = lambda objs: [o.value for o in objs]
+    assert values(repo.get_all({'value': lt(3)})) == [0, 1, 2]
+    assert values(repo.get_all({'value': between(3, 5)})) == [3, 4, 5]
+    assert values(repo.get_all({'value': isin([1, 8, 20])})) == [1, 8]
+    assert values(repo.get_all({'value': isin([])})) == []
+    assert values(repo.get_all({'value': ge(7), 'name': '9'})) == [9]
+
+
+def test_get_all_order_and_limit(repo):
+    repo.add_many([Custom(str(i), i % 3) for i in range(6)])
+    names = lambda objs: [o.name for o in objs]
+    assert names(repo.get_all(order_by='-value')) == ['2', '5', '1', '4', '0', '3']
+    assert names(repo.get_all(order_by='value', limit=2)) == ['0', '3']
+    assert names(repo.get_all(order_by='value', limit=2, offset=3)) == ['4', '2']
+    assert names(repo.get_all(offset=4)) == ['4', '5']
+    with pytest.raises(ValueError):
+        repo.get_all(order_by='unknown')
+
+
+def test_indexes(tmp_path, manager):
+    repo = SqliteRepository(str(tmp_path / 'test'), Custom, manager, indexes=['value'])
+    indexes = manager.connection().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'custom'"
+    ).fetchall()
+    assert indexes == [('custom_value_idx',)]
+    plan = manager.connection().execute(
+        'EXPLAIN QUERY PLAN ' + repo._select_where(
+            [('value', between(1, 2))], None, False), [1, 2]).fetchall()
+    assert 'custom_value_idx' in plan[0][-1]
+
+
+def test_iter_all(repo):
+    repo.add_many([Custom(str(i), i) for i in range(10)])
+    gen = repo.iter_all({'value': ge(2)}, order_by='-value', batch_size=3)
+    assert isgenerator(gen)
+    assert next(gen).value == 9
+    assert [o.value for o in gen] == [8, 7, 6, 5, 4, 3, 2]
+    assert [o.value for o in repo.iter_all(batch_size=4)] == list(range(10))
+
+
+def test_iter_all_with_writes(repo):
+    repo.add_many([Custom(str(i), i) for i in range(5)])
+    seen = []
+    for obj in repo.iter_all(batch_size=2):
+        seen.append(obj.value)
+        obj.value += 10
+        repo.update(obj)
+    assert seen == list(range(5))
+    assert [o.value for o in repo.get_all()] == list(range(10, 15))
+
+
+def test_models_round_trip(tmp_path, manager):
+    db = str(tmp_path / 'test')
+    exp_repo = SqliteRepository(db, Expense, manager)
+    cat_repo = SqliteRepository(db, Category, manager)
+    bud_repo = SqliteRepository(db, Budget, manager)
+    e = Expense(100, 1, expense_date=datetime(2023, 3, 1, 12, 30),
+                added_date=datetime(2023, 3, 2), comment="it's")
+    exp_repo.add(e)
+    got = exp_repo.get(e.pk)
+    assert got == e
+    assert isinstance(got.expense_date, datetime)
+    assert isinstance(got.amount, int)
+    c = Category('name')
+    cat_repo.add(c)
+    assert cat_repo.get(c.pk) == c
+    assert cat_repo.get(c.pk) is not cat_repo.get(c.pk)
+    b = Budget(1000, 'День')
+    bud_repo.add(b)
+    assert bud_repo.get_all() == [b]
+
+
+def test_dates_from_form(tmp_path, manager):
+    repo = SqliteRepository(str(tmp_path / 'test'), Expense, manager)
+    repo.add(Expense(100, 1, expense_date=date(2023, 3, 1)))
+    assert repo.get_all()[0].expense_date == datetime(2023, 3, 1)
+
+
+def test_row_factory_plain_class():
+    class Plain:
+        name: str
+        value: int
+        pk: int = 0
+
+    factory = make_row_factory(Plain, ['name', 'value'])
+    obj = factory((5, 'a', '3'))
+    assert isinstance(obj, Plain)
+    assert (obj.pk, obj.name, obj.value) == (5, 'a', 3)
+
+
+@pytest.fixture
+def expenses(tmp_path, manager):
+    repo = SqliteRepository(str(tmp_path / 'test'), Expense, manager)
+    repo.add_many([
+        Expense(100, 1, expense_date=datetime(2023, 2, 26, 10)),  # воскресенье
+        Expense(200, 2, expense_date=date(2023, 2, 27)),          # понедельник
+        Expense(300, 1, expense_date=datetime(2023, 3, 1, 9)),
+        Expense(400, 2, expense_date=datetime(2023, 3, 1, 23)),
+    ])
+    return repo
+
+
+def test_sum_amount(expenses):
+    assert expenses.sum_amount() == {None: 1000}
+    assert expenses.sum_amount({'category': 3}) == {None: 0}
+    in_february = {'expense_date': in_range(date(2023, 2, 27), date(2023, 3, 1))}
+    assert expenses.sum_amount(in_february) == {None: 200}
+    assert expenses.sum_amount(group_by='category') == {1: 400, 2: 600}
+    assert expenses.sum_amount(group_by='day') == {
+        date(2023, 2, 26): 100, date(2023, 2, 27): 200, date(2023, 3, 1): 700}
+    assert expenses.sum_amount(group_by='week') == {
+        date(2023, 2, 20): 100, date(2023, 2, 27): 900}
+    assert expenses.sum_amount({'category': 2}, group_by='month') == {
+        date(2023, 2, 1): 200, date(2023, 3, 1): 400}
+    with pytest.raises(ValueError):
+        expenses.sum_amount(group_by='quarter')
+
+
+def test_sum_amount_matches_memory(expenses):
+    memory = MemoryRepository(indexes=('expense_date',))
+    memory.add_many([Expense(e.amount, e.category, e.expense_date)
+                     for e in expenses.get_all()])
+    where = {'expense_date': in_range(date(2023, 2, 26), datetime(2023, 3, 1, 12))}
+    for group_by in (None, 'category', 'day', 'week', 'month', 'year'):
+        assert memory.sum_amount(group_by=group_by) == \
+            expenses.sum_amount(group_by=group_by)
+        assert memory.sum_amount(where, group_by) == expenses.sum_amount(where, group_by)
+
+
+@pytest.mark.parametrize('where', [
+    {'category': None},
+    {'category': 1},
+    {'category': isin([None])},
+    {'category': isin([2, None])},
+    {'category': isin([1, 2])},
+    {'category': isin([])},
+])
+def test_null_conditions_match_memory(tmp_path, manager, where):
+    sqlite = SqliteRepository(str(tmp_path / 'test'), Expense, manager)
+    memory = MemoryRepository(indexes=('category',))
+    for repo in (sqlite, memory):
+        repo.add_many([Expense(100, 1), Expense(200, None), Expense(300, 2)])
+    assert [e.amount for e in sqlite.get_all(where, order_by='pk')] == \
+        [e.amount for e in memory.get_all(where, order_by='pk')]
+    assert sqlite.sum_amount(where) == memory.sum_amount(where)
+
+
+def test_null_condition_query_cache(tmp_path, manager):
+    repo = SqliteRepository(str(tmp_path / 'test'), Expense, manager)
+    repo.add_many([Expense(100, 1), Expense(200, None)])
+    assert [e.amount for e in repo.get_all({'category': 1})] == [100]
+    assert [e.amount for e in repo.get_all({'category': None})] == [200]
+    assert [e.amount for e in repo.get_all({'category': isin([1])})] == [100]
+    assert [e.amount for e in repo.get_all({'category': isin([None])})] == [200]
+
+
+def test_typed_columns(expenses):
+    con = expenses.manager.connection()
+    types = {row[1]: row[2] for row in con.execute('PRAGMA table_info(expense)')}
+    assert types == {'id': 'INTEGER', 'amount': 'INTEGER', 'category': 'INTEGER',
+                     'expense_date': 'INTEGER', 'added_date': 'INTEGER',
+                     'comment': 'TEXT'}
+    stored = con.execute('SELECT typeof(expense_date), expense_date FROM expense '
+                         'ORDER BY id').fetchone()
+    assert stored == ('integer', 1677405600000000)
+
+
+def test_migrate_legacy_text_columns(tmp_path, manager):
+    con = manager.connection()
+    con.execute('CREATE TABLE expense (id INTEGER PRIMARY KEY, amount TEXT, '
+                'category TEXT, expense_date TEXT, added_date TEXT, comment TEXT)')
+    con.executemany('INSERT INTO expense VALUES (?, ?, ?, ?, ?, ?)', [
+        (1, '100', '1', '2023-03-01 12:30:00', '2023-03-02 10:00:00.250000', 'a'),
+        (5, '200', None, '2023-03-02', '2023-03-02', ''),
+    ])
+    con.commit()
+    repo = SqliteRepository(str(tmp_path / 'test'), Expense, manager)
+    assert repo.get_all() == [
+        Expense(100, 1, datetime(2023, 3, 1, 12, 30),
+                datetime(2023, 3, 2, 10, 0, 0, 250000), 'a', 1),
+        Expense(200, None, datetime(2023, 3, 2), datetime(2023, 3, 2), '', 5),
+    ]
+    assert repo.get_all({'expense_date': lt(date(2023, 3, 2))})[0].pk == 1
+    assert repo.sum_amount(group_by='day') == {date(2023, 3, 1): 100,
+                                               date(2023, 3, 2): 200}
+    assert con.execute("SELECT name FROM sqlite_master "
+                       "WHERE name = 'expense_old'").fetchone() is None
+    # повторное открытие не пересоздает таблицу
+    SqliteRepository(str(tmp_path / 'test'), Expense, manager)
+    assert repo.add(Expense(1, 1)) == 6
+
+
+def test_repository_transaction(tmp_path, manager):
+    db = str(tmp_path / 'test')
+    cat_repo = SqliteRepository(db, Category, manager)
+    exp_repo = SqliteRepository(db, Expense, manager)
+    with pytest.raises(ValueError):
+        with cat_repo.transaction():
+            cat = Category('food')
+            cat_repo.add(cat)
+            exp_repo.add(Expense(100, cat.pk))
+            exp_repo.update(Expense(100, cat.pk, pk=1000))
+    assert cat_repo.get_all() == exp_repo.get_all() == []
+
+
+def test_repository_group_commit(tmp_path):
+    db = str(tmp_path / 'test')
+    with ConnectionManager(db, commit_every_rows=10) as manager:
+        repo = SqliteRepository(db, Custom, manager)
+        repo.add_many([Custom('a', i) for i in range(5)])
+        repo.add(Custom('b', 5))
+        assert len(repo.get_all()) == 6
+        with ConnectionManager(db) as reader:
+            assert SqliteRepository(db, Custom, reader).get_all() == []
+            repo.flush()
+            assert len(SqliteRepository(db, Custom, reader).get_all()) == 6
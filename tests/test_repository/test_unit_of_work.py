@@ -0,0 +1,106 @@
+import pytest
+
+from bookkeeper.repository.connection import ConnectionManager
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+
+
+@pytest.fixture
+def repos(tmp_path, manager):
+    db = str(tmp_path / 'test')
+    cat_repo = SqliteRepository(db, Category, manager)
+    exp_repo = SqliteRepository(db, Expense, manager)
+    cat_repo.add_many([Category('food'), Category('meat', 1), Category('fish', 1)])
+    exp_repo.add_many([Expense(100, 1), Expense(200, 2), Expense(300, 2)])
+    return cat_repo, exp_repo
+
+
+def test_identity_map(repos):
+    with UnitOfWork(repos) as uow:
+        cat = uow.get(Category, 2)
+        assert uow.get(Category, 2) is cat
+        assert cat in uow.get_all(Category, {'parent': 1})
+        assert uow.get(Category, 100) is None
+
+
+def test_flush_dirty_on_commit(repos, monkeypatch):
+    cat_repo, exp_repo = repos
+    calls = []
+    update_many = exp_repo.update_many
+    monkeypatch.setattr(exp_repo, 'update_many',
+                        lambda objs: calls.append(objs) or update_many(objs))
+    monkeypatch.setattr(exp_repo, 'update', None)
+    with UnitOfWork(repos) as uow:
+        expenses = uow.get_all(Expense)
+        expenses[0].amount = 150
+        expenses[2].comment = 'sale'
+    assert len(calls) == 1
+    assert [e.pk for e in calls[0]] == [1, 3]
+    assert [e.amount for e in exp_repo.get_all()] == [150, 200, 300]
+    assert exp_repo.get(3).comment == 'sale'
+
+
+def test_no_changes_no_writes(repos, monkeypatch):
+    monkeypatch.setattr(repos[1], 'update_many', None)
+    with UnitOfWork(repos) as uow:
+        uow.get_all(Expense)
+
+
+def test_delete_and_reassign(repos):
+    cat_repo, exp_repo = repos
+    with UnitOfWork(repos) as uow:
+        for expense in uow.get_all(Expense, {'category': 2}):
+            expense.category = 1
+        cat = uow.get(Category, 2)
+        uow.delete(cat)
+        assert uow.get(Category, 2) is None
+        assert uow.get_all(Category, {'parent': 1}) == [Category('fish', 1, 3)]
+        new = Category('milk')
+        assert uow.add(new) == new.pk
+        assert uow.get(Category, new.pk) is new
+    assert [c.pk for c in cat_repo.get_all()] == [1, 3, 4]
+    assert [e.category for e in exp_repo.get_all()] == [1, 1, 1]
+
+
+def test_rollback_on_error(repos):
+    cat_repo, exp_repo = repos
+    with pytest.raises(ZeroDivisionError):
+        with UnitOfWork(repos) as uow:
+            uow.get(Expense, 1).amount = 0
+            uow.delete(uow.get(Category, 3))
+            uow.add(Category('milk'))
+            uow.flush()
+            1 / 0
+    assert len(cat_repo.get_all()) == 3
+    assert exp_repo.get(1).amount == 100
+
+
+def test_rollback_on_flush_error(repos):
+    cat_repo, exp_repo = repos
+    with pytest.raises(KeyError):
+        with UnitOfWork(repos) as uow:
+            uow.get(Expense, 1).amount = 0
+            uow.delete(Expense(1, 1, pk=1000))
+    assert exp_repo.get(1).amount == 100
+    # единицу работы можно использовать повторно
+    with UnitOfWork(repos) as uow:
+        uow.get(Expense, 1).amount = 50
+    assert exp_repo.get(1).amount == 50
+
+
+def test_wrong_usage(tmp_path, repos):
+    uow = UnitOfWork(repos)
+    with pytest.raises(RuntimeError):
+        uow.get(Category, 1)
+    with uow:
+        with pytest.raises(ValueError):
+            uow.add(Budget(100, 'day'))
+        with pytest.raises(RuntimeError):
+            uow.__enter__()
+    with ConnectionManager(str(tmp_path / 'test')) as other:
+        budget_repo = SqliteRepository(str(tmp_path / 'test'), Budget, other)
+        with pytest.raises(ValueError):
+            UnitOfWork([*repos, budget_repo])
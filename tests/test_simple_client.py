@@ -0,0 +1,44 @@
+import io
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SqliteRepository
+from bookkeeper.simple_client import add_expenses, parse_command
+
+
+def test_parse_command():
+    assert parse_command('1500 мясо') == (1500, 'мясо')
+    assert parse_command(' 10  сырое мясо\n') == (10, 'сырое мясо')
+    assert parse_command('мясо 1500') is None
+    assert parse_command('1500') is None
+    assert parse_command('-5 мясо') is None
+
+
+def test_add_expenses():
+    cat_repo = MemoryRepository()
+    exp_repo = MemoryRepository()
+    cat_repo.add_many([Category('мясо'), Category('книги')])
+    errors = io.StringIO()
+    lines = ['100 мясо\n', '\n', '200 книги\n', 'abc\n', '5 хлеб\n', '300 мясо']
+    stats = add_expenses(lines, cat_repo, exp_repo, batch_size=2, errors=errors)
+    assert (stats.added, stats.skipped) == (3, 2)
+    assert [(e.amount, e.category) for e in exp_repo.get_all()] == \
+        [(100, 1), (200, 2), (300, 1)]
+    assert errors.getvalue().splitlines() == [
+        "строка 4: не удалось разобрать 'abc'",
+        'строка 5: категория хлеб не найдена',
+    ]
+
+
+def test_add_expenses_sqlite(tmp_path):
+    db = str(tmp_path / 'test')
+    cat_repo = SqliteRepository(db, Category)
+    exp_repo = SqliteRepository(db, Expense)
+    cat_repo.add(Category('мясо'))
+    stats = add_expenses((f'{i} мясо' for i in range(1, 2501)), cat_repo, exp_repo)
+    assert stats.added == 2500
+    assert stats.rate > 0
+    assert exp_repo.sum_amount() == {None: 2500 * 2501 // 2}
+    cat_repo.close()
+    exp_repo.close()
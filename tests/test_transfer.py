@@ -0,0 +1,176 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from bookkeeper import transfer
+from bookkeeper.__main__ import main
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+
+@pytest.fixture
+def cat_repo():
+    repo = MemoryRepository()
+    Category.create_from_tree([('food', None), ('meat', 'food'), ('books', None)], repo)
+    return repo
+
+
+@pytest.fixture
+def exp_repo():
+    repo = MemoryRepository()
+    repo.add_many([
+        Expense(100, 2, datetime(2023, 3, 1, 12, 30), datetime(2023, 3, 2), 'a, "b"'),
+        Expense(200, None, datetime(2023, 3, 2), datetime(2023, 3, 2)),
+        Expense(300, 3, datetime(2023, 3, 3), datetime(2023, 3, 3), 'мясо'),
+    ])
+    return repo
+
+
+def test_guess_format():
+    assert transfer.guess_format('data.CSV') == 'csv'
+    assert transfer.guess_format('dir.v2/data.jsonl') == 'jsonl'
+    with pytest.raises(ValueError):
+        transfer.guess_format('data.xml')
+
+
+@pytest.mark.parametrize('fmt', transfer.FORMATS)
+def test_expenses_round_trip(fmt, cat_repo, exp_repo):
+    file = io.StringIO()
+    progress = []
+    assert transfer.export_expenses(exp_repo, cat_repo, file, fmt, 2,
+                                    progress.append) == 3
+    assert progress == [2, 3]
+    file.seek(0)
+    new_cats, new_exps = MemoryRepository(), MemoryRepository()
+    new_cats.add(Category('books'))
+    assert transfer.import_expenses(new_exps, new_cats, file, fmt, 2) == 3
+    names = {cat.pk: cat.name for cat in new_cats.get_all()}
+    assert sorted(names.values()) == ['books', 'food', 'meat']
+    assert Category.get_by_name('meat', new_cats).parent == \
+        Category.get_by_name('food', new_cats).pk
+    assert [(e.amount, names.get(e.category), e.expense_date, e.added_date, e.comment)
+            for e in new_exps.get_all()] == \
+        [(e.amount, e.category and cat_repo.get(e.category).name, e.expense_date,
+          e.added_date, e.comment) for e in exp_repo.get_all()]
+
+
+def test_import_csv_defaults():
+    file = io.StringIO('category,amount\nfood,10\n,20\n')
+    cat_repo, exp_repo = MemoryRepository(), MemoryRepository()
+    before = datetime.now()
+    assert transfer.import_expenses(exp_repo, cat_repo, file, 'csv') == 2
+    first, second = exp_repo.get_all()
+    assert (first.amount, first.category, first.comment) == (10, 1, '')
+    assert first.expense_date >= before
+    assert second.category is None
+
+
+@pytest.mark.parametrize('fmt, text', [
+    ('csv', 'amount,category\n10,food/meat\n,books\n20,food/fish\n'),
+    ('jsonl', '{"amount": 10, "category": "food/meat"}\n{"category": "books"}\n'
+              '{"amount": 20, "category": "food/fish"}\n'),
+])
+def test_import_skips_rows_without_amount(fmt, text):
+    cat_repo, exp_repo = MemoryRepository(), MemoryRepository()
+    assert transfer.import_expenses(exp_repo, cat_repo, io.StringIO(text), fmt) == 2
+    paths = transfer.CategoryPaths(cat_repo)
+    assert [(e.amount, paths.path(e.category)) for e in exp_repo.get_all()] == \
+        [(10, 'food/meat'), (20, 'food/fish')]
+    assert sorted(paths.path(cat.pk) for cat in cat_repo.get_all()) == \
+        ['food', 'food/fish', 'food/meat']
+
+
+@pytest.mark.parametrize('fmt', transfer.FORMATS)
+def test_categories_round_trip(fmt, cat_repo):
+    cat_repo.add(Category('steak', Category.get_by_name('meat', cat_repo).pk))
+    groceries = Category('groceries')
+    cat_repo.add(groceries)
+    food = Category.get_by_name('food', cat_repo)
+    food.parent = groceries.pk  # родитель добавлен позже потомка
+    cat_repo.update(food)
+    file = io.StringIO()
+    assert transfer.export_categories(cat_repo, file, fmt) == 5
+    file.seek(0)
+    new_repo = MemoryRepository()
+    new_repo.add(Category('books'))
+    assert transfer.import_categories(new_repo, file, fmt, batch_size=1) == 4
+    by_name = {cat.name: cat for cat in new_repo.get_all()}
+    assert by_name['groceries'].parent is None
+    assert by_name['food'].parent == by_name['groceries'].pk
+    assert by_name['meat'].parent == by_name['food'].pk
+    assert by_name['steak'].parent == by_name['meat'].pk
+    assert len(by_name) == 5
+
+
+@pytest.mark.parametrize('fmt', transfer.FORMATS)
+def test_duplicate_names_round_trip(fmt):
+    cat_repo, exp_repo = MemoryRepository(), MemoryRepository()
+    Category.create_from_tree(
+        [('food', None), ('books', None), ('other', None)], cat_repo)
+    food, books, other = (cat.pk for cat in cat_repo.get_all())
+    food_other, books_other = Category('other', food), Category('other', books)
+    cat_repo.add_many([food_other, books_other])
+    cat_repo.add(Category('x', other))
+    cat_repo.add(Category('a/b\\c', books_other.pk))
+    exp_repo.add_many([Expense(1, food_other.pk), Expense(2, books_other.pk),
+                       Expense(3, other)])
+    cat_file, exp_file = io.StringIO(), io.StringIO()
+    transfer.export_categories(cat_repo, cat_file, fmt)
+    transfer.export_expenses(exp_repo, cat_repo, exp_file, fmt)
+    cat_file.seek(0)
+    exp_file.seek(0)
+
+    new_cats, new_exps = MemoryRepository(), MemoryRepository()
+    assert transfer.import_categories(new_cats, cat_file, fmt) == 7
+    assert transfer.import_expenses(new_exps, new_cats, exp_file, fmt) == 3
+    assert len(new_cats.get_all()) == 7
+    paths = transfer.CategoryPaths(new_cats)
+    assert sorted(paths.path(cat.pk) for cat in new_cats.get_all()) == [
+        'books', 'books/other', 'books/other/a\\/b\\\\c', 'food', 'food/other',
+        'other', 'other/x']
+    assert [paths.path(exp.category) for exp in new_exps.get_all()] == \
+        ['food/other', 'books/other', 'other']
+
+
+def test_paths():
+    assert transfer.split_path(transfer.join_path(['a/b', 'c\\', ''])) == \
+        ['a/b', 'c\\', '']
+
+
+def test_import_by_name():
+    file = io.StringIO('name,parent\nfood,\nmeat,food\nsteak,meat\n')
+    repo = MemoryRepository()
+    assert transfer.import_categories(repo, file, 'csv') == 3
+    paths = transfer.CategoryPaths(repo)
+    assert paths.path(Category.get_by_name('steak', repo).pk) == 'food/meat/steak'
+    assert paths.get('steak', by_name=True).name == 'steak'
+    assert paths.get('steak') is None
+
+
+def test_budgets_round_trip():
+    repo = MemoryRepository()
+    repo.add_many([Budget(1000, 'День'), Budget(7000, 'Неделя')])
+    file = io.StringIO()
+    assert transfer.export_budgets(repo, file, 'jsonl') == 2
+    assert file.getvalue().splitlines()[0] == '{"amount": 1000, "period": "День"}'
+    file.seek(0)
+    new_repo = MemoryRepository()
+    assert transfer.import_budgets(new_repo, file, 'jsonl') == 2
+    assert new_repo.get_all() == [Budget(1000, 'День', 1), Budget(7000, 'Неделя', 2)]
+
+
+def test_cli(tmp_path, capsys):
+    database = str(tmp_path / 'test')
+    source = tmp_path / 'expenses.csv'
+    source.write_text('amount,category,expense_date\n100,food,2023-03-01\n'
+                      '200,books,2023-03-02 10:00:00\n', encoding='utf-8')
+    main(['import', str(source), '--database', database])
+    assert 'expense: 2 записей' in capsys.readouterr().err
+    target = tmp_path / 'out.data'
+    main(['export', str(target), '--database', database, '--format', 'jsonl',
+          '--entity', 'category'])
+    assert target.read_text(encoding='utf-8').splitlines() == [
+        '{"name": "food", "parent": null}', '{"name": "books", "parent": null}']
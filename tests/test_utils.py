@@ -1,9 +1,13 @@
 import tempfile
+from datetime import date, datetime
 from textwrap import dedent
+from inspect import isgenerator
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.utils import (
+    read_tree, iter_tree, period_start, index_children, to_microseconds, from_microseconds
+)
 
 
 def test_create_tree():
@@ -71,3 +75,73 @@ def test_with_file():
             ('child2', 'parent1'),
             ('parent2', None)
         ]
+
+
+def test_period_start():
+    d = datetime(2023, 3, 1, 15, 30)    # среда
+    assert period_start(d, 'day') == date(2023, 3, 1)
+    assert period_start(d, 'week') == date(2023, 2, 27)
+    assert period_start('2023-03-19', 'week') == date(2023, 3, 13)
+    assert period_start(date(2023, 3, 19), 'month') == date(2023, 3, 1)
+    assert period_start(d, 'year') == date(2023, 1, 1)
+    with pytest.raises(ValueError):
+        period_start(d, 'quarter')
+
+
+def test_index_children():
+    nodes = [('3', '2'), ('1', '0'), ('2', '1'), ('4', '1')]
+    children, orphans = index_children(nodes, '0')
+    assert children == {'0': ['1'], '1': ['2', '4'], '2': ['3'], '3': [], '4': []}
+    assert orphans == []
+
+
+def test_index_children_orphans_and_cycles():
+    nodes = [('1', '0'), ('2', '100'), ('3', '2'), ('4', '5'), ('5', '4'), ('6', '6')]
+    children, orphans = index_children(nodes, '0')
+    # '2' - потерянный родитель, из цикла 4 <-> 5 переносится один узел
+    assert orphans[0] == '2'
+    assert orphans[-1] == '6'
+    assert len(orphans) == 3
+    # каждый узел достижим из корня ровно один раз
+    seen = []
+    stack = ['0']
+    while stack:
+        for child in children[stack.pop()]:
+            seen.append(child)
+            stack.append(child)
+    assert sorted(seen) == ['1', '2', '3', '4', '5', '6']
+    assert children['2'] == ['3']
+
+
+def test_index_children_deep():
+    n = 100000
+    children, orphans = index_children(((i, i - 1) for i in range(1, n)), 0)
+    assert orphans == []
+    assert children[n - 2] == [n - 1]
+
+
+def test_iter_tree_is_lazy():
+    def lines():
+        yield 'parent'
+        yield '    child'
+        raise AssertionError('read too far')
+
+    gen = iter_tree(lines())
+    assert isgenerator(gen)
+    assert next(gen) == ('parent', None)
+    assert next(gen) == ('child', 'parent')
+
+
+def test_iter_tree_deep():
+    text = [' ' * i + str(i) for i in range(5000)]
+    tree = list(iter_tree(text))
+    assert tree[0] == ('0', None)
+    assert tree[-1] == ('4999', '4998')
+
+
+def test_microseconds_round_trip():
+    moment = datetime(2023, 3, 1, 12, 30, 15, 123456)
+    assert from_microseconds(to_microseconds(moment)) == moment
+    assert to_microseconds(date(1970, 1, 2)) == 86_400_000_000
+    assert to_microseconds('2023-03-01 12:30:15.123456') == to_microseconds(moment)
+    assert from_microseconds(-1) == datetime(1969, 12, 31, 23, 59, 59, 999999)